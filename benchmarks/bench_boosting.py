@@ -0,0 +1,97 @@
+"""
+Benchmark of the histogram gradient boosting family against the
+ grid-searched random forest of the training ``run``.
+Both searches cross-validate their grid with 5 folds on the processed train
+ set (the unimputed one for boosting, which handles missing values itself)
+ and refit the best candidate; the refitted models are scored on the
+ matching processed test set. Prints search wall time, number of fits and
+ test RMSE of each family, and the boosting time as a fraction of the
+ forest time.
+
+Usage:
+python src/ingest_data.py --format npy --unimputed
+python benchmarks/bench_boosting.py --train data/processed/housing_train \
+    --test data/processed/housing_test \
+    --boosting-train data/processed/housing_train_unimputed \
+    --boosting-test data/processed/housing_test_unimputed
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from house_pricing.boosting import search_boosting
+from house_pricing.dataset_io import load_xy
+from house_pricing.logger import FOREST_PARAM_GRID
+from house_pricing.search import BudgetedSearchCV
+from house_pricing.shared_data import SharedDataset
+
+
+def rmse(model, X, y):
+    """Root mean squared error of the model's predictions."""
+    return float(np.sqrt(np.mean((model.predict(X) - y) ** 2)))
+
+
+def bench_forest(X, y, path, n_jobs):
+    search = BudgetedSearchCV(
+        RandomForestRegressor(random_state=42),
+        FOREST_PARAM_GRID,
+        n_jobs=n_jobs,
+    )
+    with SharedDataset.from_xy(X, y, path) as data:
+        search.fit(data)
+    return search.best_estimator_, search
+
+
+def bench_boosting(X, y, path, n_jobs):
+    with SharedDataset.from_xy(X, y, path) as data:
+        return search_boosting(data, n_jobs=n_jobs)
+
+
+def bench(args):
+    results = {}
+    for name, func, train, test in (
+        ("forest", bench_forest, args.train, args.test),
+        ("boosting", bench_boosting, args.boosting_train, args.boosting_test),
+    ):
+        X, y = load_xy(train)
+        X_test, y_test = load_xy(test)
+        y_test = np.asarray(y_test, dtype=float)
+        start = time.perf_counter()
+        model, search = func(X, y, train, args.n_jobs)
+        wall = time.perf_counter() - start
+        results[name] = {
+            "wall_s": wall,
+            "fits": search.n_fits_,
+            "rmse": rmse(model, X_test, y_test),
+            "best": search.best_params_,
+        }
+        print(
+            f"{name:>10} {wall:>9.2f} {search.n_fits_:>6} "
+            f"{results[name]['rmse']:>10.0f}  {search.best_params_}",
+            flush=True,
+        )
+    ratio = results["boosting"]["wall_s"] / results["forest"]["wall_s"]
+    print(
+        f"Boosting searched in {ratio:.1%} of the forest time, test RMSE "
+        f"{results['boosting']['rmse'] - results['forest']['rmse']:+.0f}."
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--train", default="data/processed/housing_train")
+    parser.add_argument("--test", default="data/processed/housing_test")
+    parser.add_argument(
+        "--boosting-train", default="data/processed/housing_train_unimputed"
+    )
+    parser.add_argument(
+        "--boosting-test", default="data/processed/housing_test_unimputed"
+    )
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    print(f"{'family':>10} {'wall s':>9} {'fits':>6} {'test RMSE':>10}  best")
+    bench(args)
@@ -0,0 +1,75 @@
+"""
+Benchmark of the flattened tree-ensemble predictor of ``flat_trees``
+ against scikit-learn's ``predict`` on a fitted tree or forest.
+Batches of 1 row up to 1M rows are drawn from the processed test set
+ (repeated as needed). For each size, prints the best-of-repeat time of
+ both predictors, per row, the speed-up, and checks the predictions are
+ bit-identical.
+
+Usage:
+python benchmarks/bench_flat_trees.py --model artifacts/RandomForestRegressor.pkl \
+    --data data/processed/housing_test
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from house_pricing.dataset_io import load_xy
+from house_pricing.flat_trees import flatten
+from house_pricing.model_io import read_model
+
+SIZES = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+def best_time(func, X, repeat):
+    """Best wall time of repeat calls, and the last result."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(X)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench(args):
+    model = read_model(args.model)
+    start = time.perf_counter()
+    flat = flatten(model)
+    export = time.perf_counter() - start
+    print(
+        f"{type(model).__name__}: {flat.n_trees} trees, {len(flat.value)} "
+        f"nodes, depth {flat.max_depth}, exported in {export * 1e3:.0f} ms"
+    )
+
+    X, _ = load_xy(args.data)
+    X = X.to_numpy()
+    # both predictors get arrays, the columns are already in model order
+    warnings.filterwarnings(
+        "ignore", "X does not have valid feature names", UserWarning
+    )
+    print(
+        f"{'rows':>9} {'sklearn ms':>11} {'flat ms':>9} {'sklearn us/row':>15} "
+        f"{'flat us/row':>12} {'speed-up':>9} identical"
+    )
+    for n_rows in args.sizes:
+        batch = np.resize(X, (n_rows, X.shape[1]))
+        # fewer repeats for large batches, so the run stays short
+        repeat = max(1, min(args.repeat, 10**6 // (10 * n_rows)))
+        sklearn_s, expected = best_time(model.predict, batch, repeat)
+        flat_s, predictions = best_time(flat.predict, batch, repeat)
+        print(
+            f"{n_rows:>9} {sklearn_s * 1e3:>11.3f} {flat_s * 1e3:>9.3f} "
+            f"{sklearn_s / n_rows * 1e6:>15.2f} {flat_s / n_rows * 1e6:>12.2f} "
+            f"{sklearn_s / flat_s:>9.2f} {np.array_equal(expected, predictions)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=50)
+    bench(parser.parse_args())
@@ -0,0 +1,91 @@
+"""
+Benchmark of the compiled scorer of ``linear_scorer`` against scikit-learn
+ for a fitted linear model.
+Prints the latency of one row through ``score.score_model``'s path (a
+ labelled dataframe, ``drop`` and ``predict``), through ``predict`` on an
+ array, and through the scorer from a dict and from a NumPy row. Then, for
+ batches of 1 row up to 1M rows drawn from the processed test set
+ (repeated as needed), prints the best-of-repeat time of ``predict`` and of
+ the scorer writing into a preallocated buffer, and checks the predictions
+ are bit-identical.
+
+Usage:
+python benchmarks/bench_linear_scorer.py --model artifacts/LinearRegression.pkl \
+    --data data/processed/housing_test
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from house_pricing.dataset_io import LABEL, load_xy
+from house_pricing.linear_scorer import compile_linear
+from house_pricing.model_io import read_model
+
+SIZES = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+def best_time(func, repeat, *args):
+    """Best wall time of repeat calls, and the last result."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench(args):
+    model = read_model(args.model)
+    start = time.perf_counter()
+    scorer = compile_linear(model)
+    compile_s = time.perf_counter() - start
+    print(
+        f"{type(model).__name__}: {scorer.n_features} {scorer.dtype} "
+        f"coefficients, compiled in {compile_s * 1e6:.0f} us"
+    )
+
+    X, y = load_xy(args.data)
+    labelled = X.iloc[:1].assign(**{LABEL: y[:1]})
+    array_row = X.to_numpy()[0]
+    dict_row = X.iloc[0].to_dict()
+    X = X.to_numpy()
+    # arrays are predicted, the columns are already in model order
+    warnings.filterwarnings(
+        "ignore", "X does not have valid feature names", UserWarning
+    )
+    single_rows = {
+        "score_model path": lambda: model.predict(labelled.drop(LABEL, axis=1)),
+        "predict array": lambda: model.predict(array_row[None]),
+        "scorer dict": lambda: scorer.predict_row(dict_row),
+        "scorer array": lambda: scorer.predict_row(array_row),
+    }
+    for name, func in single_rows.items():
+        seconds, _ = best_time(func, args.repeat * 20)
+        print(f"one row, {name:<16} {seconds * 1e6:>9.2f} us")
+
+    print(
+        f"{'rows':>9} {'sklearn ms':>11} {'scorer ms':>10} {'speed-up':>9} "
+        "identical"
+    )
+    out = np.empty(max(args.sizes), dtype=scorer.dtype)
+    for n_rows in args.sizes:
+        batch = np.resize(X, (n_rows, X.shape[1]))
+        # fewer repeats for large batches, so the run stays short
+        repeat = max(1, min(args.repeat, 10**7 // (10 * n_rows)))
+        sklearn_s, expected = best_time(model.predict, repeat, batch)
+        scorer_s, predictions = best_time(scorer.predict, repeat, batch, out)
+        print(
+            f"{n_rows:>9} {sklearn_s * 1e3:>11.3f} {scorer_s * 1e3:>10.3f} "
+            f"{sklearn_s / scorer_s:>9.2f} {np.array_equal(expected, predictions)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=50)
+    bench(parser.parse_args())
@@ -0,0 +1,295 @@
+"""
+End-to-end benchmark of the ingest, training and scoring entry points.
+Synthetic raw data of each size is generated with ``synthesize`` (learned
+ from the real housing data), then every stage runs in a fresh process:
+ ``ingest_data.run``, the training ``run`` of ``logger``, ``train.main``
+ and ``score.main``, in memory and streamed in chunks ("score_stream").
+ Wall time, CPU time (including worker processes), peak RSS and rows/sec
+ are recorded per stage and size.
+
+Every run is appended to a JSON history file together with the library
+ versions. With ``--check`` the run fails (exit code 1) when the wall time
+ or peak RSS of a stage exceeds the stored baseline by more than the
+ tolerance, e.g. after upgrading pandas or scikit-learn. Baselines are only
+ comparable on the machine they were recorded on.
+
+Usage:
+python benchmarks/bench_pipeline.py --rows 20000 200000 --update-baseline
+python benchmarks/bench_pipeline.py --rows 20000 200000 --check
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from house_pricing import ingest_data, score, synthesize, train
+from house_pricing import logger as training
+from house_pricing.data_cache import cached_fetch, open_csv_member
+from house_pricing.dataset_io import dataset_path, read_manifest
+
+STAGES = ("ingest", "train_run", "train_main", "score", "score_stream")
+# rows per chunk of the streaming scoring stage when --chunksize is not set
+SCORE_CHUNKSIZE = 10000
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# absolute slack on top of the relative tolerance, so millisecond stages
+# are not failed by timer noise
+GATED = {"wall_s": 0.25, "peak_rss_mib": 16.0}
+
+
+def _usage():
+    """Wall clock, CPU seconds and peak RSS (MiB) of this process and its
+    finished children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    unit = 1 if sys.platform == "darwin" else 1024
+    peak = max(own.ru_maxrss, children.ru_maxrss) * unit / 2**20
+    return time.perf_counter(), cpu, peak
+
+
+def _n_rows(path):
+    if os.path.isdir(path):
+        return read_manifest(path)["n_rows"]
+    with open(path) as file:
+        return sum(1 for _ in file) - 1
+
+
+def _run_stage(stage, paths, fmt, chunksize):
+    """Runs one stage; called in a fresh process so peak RSS is its own."""
+    logger = logging.getLogger("bench_pipeline")
+    logger.setLevel(logging.WARNING)
+    train_path = dataset_path(paths["processed"], "housing_train", fmt)
+    test_path = dataset_path(paths["processed"], "housing_test", fmt)
+
+    inputs = {
+        "ingest": paths["raw_csv"],
+        "train_run": train_path,
+        "train_main": train_path,
+        "score": test_path,
+        "score_stream": test_path,
+    }
+    if stage not in inputs:
+        raise ValueError(f"Unknown stage {stage!r}, expected {STAGES}.")
+
+    start_wall, start_cpu, _ = _usage()
+    if stage == "ingest":
+        args = Namespace(
+            url=paths["raw_csv"],
+            raw=paths["cache"],
+            sha256=None,
+            processed=paths["processed"],
+            chunksize=chunksize,
+            format=fmt,
+            incremental=False,
+            refit_threshold=0.05,
+            unimputed=False,
+        )
+        ingest_data.run(args, logger)
+    elif stage == "train_run":
+        args = Namespace(
+            dataset=train_path,
+            boosting_dataset="",
+            models=paths["models"],
+            n_jobs=-1,
+            search="grid",
+            max_fits=None,
+            max_time=None,
+            warm_start=False,
+            journal=None,
+            queue=None,
+            queue_workers=0,
+            model_format="pickle",
+            cache_dir=None,
+        )
+        training.run(args, logger)
+    elif stage == "train_main":
+        train.main(train_path, paths["models"], "WARNING", os.devnull, False)
+    elif stage == "score":
+        model_path = os.path.join(paths["models"], "model.pkl")
+        score.main(
+            model_path, test_path, paths["models"], "WARNING", os.devnull, False
+        )
+    else:
+        model_path = os.path.join(paths["models"], "model.pkl")
+        score.main(
+            model_path,
+            test_path,
+            paths["models"],
+            "WARNING",
+            os.devnull,
+            False,
+            chunksize=chunksize or SCORE_CHUNKSIZE,
+            predictions_path=os.path.join(paths["models"], "predictions.csv"),
+        )
+    wall, cpu, peak = _usage()
+
+    wall -= start_wall
+    rows = _n_rows(inputs[stage])
+    return {
+        "rows": rows,
+        "wall_s": wall,
+        "cpu_s": cpu - start_cpu,
+        "peak_rss_mib": peak,
+        "rows_per_s": rows / wall if wall else float("inf"),
+    }
+
+
+def measure(stage, paths, fmt, chunksize):
+    """Runs a stage in a new spawned process and returns its metrics."""
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_run_stage, stage, paths, fmt, chunksize).result()
+
+
+def make_raw_csv(model, n_rows, path):
+    """Writes n_rows synthetic raw rows unless the file already exists."""
+    if not os.path.exists(path):
+        synthesize.write_raw_csv(synthesize.generate(model, n_rows), path)
+    return path
+
+
+def bench(args):
+    """Runs the selected stages at every size.
+    Returns ``{"<stage>@<rows>": metrics}``, best of args.repeat runs."""
+    source = cached_fetch(args.source, args.raw)
+    with open_csv_member(source) as file:
+        model = synthesize.learn_distribution(pd.read_csv(file))
+
+    results = {}
+    for n_rows in args.rows:
+        directory = os.path.join(args.workdir, str(n_rows))
+        paths = {
+            "raw_csv": make_raw_csv(
+                model, n_rows, os.path.join(directory, "housing.csv")
+            ),
+            "cache": os.path.join(directory, "cache"),
+            "processed": os.path.join(directory, "processed"),
+            "models": os.path.join(directory, "models"),
+        }
+        os.makedirs(paths["models"], exist_ok=True)
+        for stage in args.stages:
+            runs = [
+                measure(stage, paths, args.format, args.chunksize)
+                for _ in range(args.repeat)
+            ]
+            best = min(runs, key=lambda r: r["wall_s"])
+            best["peak_rss_mib"] = min(r["peak_rss_mib"] for r in runs)
+            results[f"{stage}@{n_rows}"] = best
+            print(
+                f"{stage:>10} {n_rows:>10} {best['wall_s']:>9.2f} "
+                f"{best['cpu_s']:>9.2f} {best['peak_rss_mib']:>9.1f} "
+                f"{best['rows_per_s']:>12.0f}",
+                flush=True,
+            )
+    return results
+
+
+def environment():
+    """Versions that the results depend on."""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def append_history(path, record):
+    """Appends a run to the JSON history file."""
+    history = []
+    if os.path.exists(path):
+        with open(path) as file:
+            history = json.load(file)
+    history.append(record)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(history, file, indent=2)
+
+
+def regressions(results, baseline, tolerance):
+    """Stage metrics worse than the baseline by more than tolerance (or
+    the absolute slack in GATED). Stages missing from the baseline are
+    not checked."""
+    failures = []
+    for key, metrics in results.items():
+        if key not in baseline:
+            continue
+        for metric, slack in GATED.items():
+            limit = max(
+                baseline[key][metric] * (1 + tolerance),
+                baseline[key][metric] + slack,
+            )
+            if metrics[metric] > limit:
+                failures.append(
+                    f"{key} {metric}: {metrics[metric]:.2f} > {limit:.2f} "
+                    f"(baseline {baseline[key][metric]:.2f})"
+                )
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20000, 200000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--format", choices=("csv", "npy"), default="npy")
+    parser.add_argument("--chunksize", type=int, default=0)
+    parser.add_argument("--source", default=ingest_data.HOUSING_URL)
+    parser.add_argument("--raw", default="data/raw/")
+    parser.add_argument("--workdir", default="")
+    parser.add_argument(
+        "--history", default=os.path.join(RESULTS_DIR, "history.json")
+    )
+    parser.add_argument(
+        "--baseline", default=os.path.join(RESULTS_DIR, "baseline.json")
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'stage':>10} {'rows':>10} {'wall s':>9} {'cpu s':>9} "
+          f"{'rss MiB':>9} {'rows/s':>12}")
+    if args.workdir:
+        results = bench(args)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            args.workdir = workdir
+            results = bench(args)
+
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "format": args.format,
+        "chunksize": args.chunksize,
+        "results": results,
+    }
+    append_history(args.history, record)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(record, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif args.check:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        failures = regressions(results, baseline["results"], args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"No stage regressed by more than {args.tolerance:.0%}.")
@@ -0,0 +1,69 @@
+"""
+Benchmark of the fitted ``HousingPreprocessor`` against
+ ``ingest_data.pre_process_data``.
+Prints the time to preprocess a train and a test set of each size with both,
+ and the time to transform a small scoring batch.
+
+Usage (from the repository root, which holds the shared test fixtures):
+python -m benchmarks.bench_preprocessing --rows 20000 200000 2000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from house_pricing.ingest_data import pre_process_data
+from house_pricing.preprocessing import HousingPreprocessor
+from tests.helpers import make_raw
+
+
+def best_of(func, repeat):
+    """Best wall time of repeat calls, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench(n_rows, repeat):
+    train = make_raw(n_rows, seed=1, missing=0.01)
+    test = make_raw(n_rows // 4, seed=2, missing=0.01)
+    batch = test.drop("median_house_value", axis=1).head(64)
+
+    def legacy():
+        _, imputer = pre_process_data(train)
+        pre_process_data(test, imputer)
+
+    def fitted():
+        preprocessor = HousingPreprocessor().fit(train)
+        preprocessor.transform(train)
+        preprocessor.transform(test)
+
+    preprocessor = HousingPreprocessor().fit(train)
+    out = np.empty((len(batch), len(preprocessor.feature_names_)))
+    return {
+        "rows": n_rows,
+        "pre_process_data_s": best_of(legacy, repeat),
+        "preprocessor_s": best_of(fitted, repeat),
+        "batch64_us": 1e6 * best_of(
+            lambda: preprocessor.transform(batch, out=out), repeat * 10
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20000, 200000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy s':>10} {'fitted s':>10} {'speedup':>8} "
+          f"{'batch64 us':>11}")
+    for n_rows in args.rows:
+        result = bench(n_rows, args.repeat)
+        speedup = result["pre_process_data_s"] / result["preprocessor_s"]
+        print(f"{n_rows:>10} {result['pre_process_data_s']:>10.3f} "
+              f"{result['preprocessor_s']:>10.3f} {speedup:>7.1f}x "
+              f"{result['batch64_us']:>11.1f}")
@@ -0,0 +1,107 @@
+"""
+Load generator for the prediction service of ``serve``.
+Client processes, each with a keep-alive connection, post raw housing rows
+ sampled from the raw data back to back for a fixed duration (closed loop:
+ every client waits for its reply before sending the next request). Prints
+ throughput and latency percentiles. Clients run in separate processes so
+ their own overhead does not share an interpreter lock with each other.
+
+Usage:
+python src/serve.py --models artifacts/LinearRegression.pkl \
+    --preprocessor data/processed/preprocessor.pkl --no-console-log &
+python benchmarks/bench_serve.py --data data/raw/housing.tgz --clients 8
+"""
+import argparse
+import http.client
+import json
+import time
+from multiprocessing import get_context
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from house_pricing.data_cache import open_csv_member
+from house_pricing.schema import read_raw_csv
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def client(url, bodies, duration, seed):
+    """Posts bodies in random order until the duration has elapsed.
+    Returns the latency of every request in seconds, the error count and
+    the seconds spent."""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port)
+    headers = {"Content-Type": "application/json"}
+    rng = np.random.default_rng(seed)
+    latencies, errors = [], 0
+    begin = time.perf_counter()
+    stop = begin + duration
+    while time.perf_counter() < stop:
+        body = bodies[rng.integers(len(bodies))]
+        start = time.perf_counter()
+        connection.request("POST", parts.path, body, headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        errors += response.status != 200
+    connection.close()
+    return latencies, errors, time.perf_counter() - begin
+
+
+def request_bodies(path, rows_per_request, n_bodies=1000, seed=0):
+    """JSON bodies of rows sampled from the raw data, nulls for NaNs."""
+    with open_csv_member(path) as file:
+        raw = read_raw_csv(file)
+    rows = json.loads(raw.to_json(orient="records"))
+    rng = np.random.default_rng(seed)
+    return [
+        json.dumps(
+            {"rows": [rows[i] for i in rng.integers(len(rows), size=rows_per_request)]}
+        )
+        for _ in range(n_bodies)
+    ]
+
+
+def bench(args):
+    bodies = request_bodies(args.data, args.rows_per_request)
+    # a few requests first, so connections and caches are warm
+    client(args.url, bodies, 0.5, seed=args.clients)
+    with get_context("spawn").Pool(args.clients) as pool:
+        results = pool.starmap(
+            client,
+            [(args.url, bodies, args.duration, seed) for seed in range(args.clients)],
+        )
+    latencies = np.concatenate([r for r, _, _ in results]) * 1e3
+    errors = sum(e for _, e, _ in results)
+    # clients start at different times, their own timings exclude startup
+    wall = np.mean([seconds for _, _, seconds in results])
+    print(
+        f"{len(latencies)} requests of {args.rows_per_request} rows from "
+        f"{args.clients} clients in {wall:.1f} s, {errors} errors"
+    )
+    print(
+        f"throughput: {len(latencies) / wall:.0f} requests/s, "
+        f"{len(latencies) * args.rows_per_request / wall:.0f} rows/s"
+    )
+    print(
+        "latency ms: "
+        + ", ".join(
+            f"p{p:g} {np.percentile(latencies, p):.2f}" for p in PERCENTILES
+        )
+        + f", max {latencies.max():.2f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/predict")
+    parser.add_argument(
+        "--data",
+        default="data/raw/housing.tgz",
+        help="Raw housing csv or archive the rows are sampled from.",
+    )
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rows-per-request", type=int, default=1)
+    bench(parser.parse_args())
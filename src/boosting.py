@@ -0,0 +1,80 @@
+"""
+This module contains the histogram gradient boosting model family.
+Every fit bins the features into at most 255 quantile bins per column,
+ learned from the rows it is fitted on, so in a cross-validated search the
+ bins of each fold come from its training rows only. The boosting rounds
+ then work on the small integer bin codes instead of the raw floats.
+ Scikit-learn takes no pre-binned features, so every candidate bins the
+ training rows of each of its folds again, which is 3 to 15% of a fit on
+ the housing data. Missing values are kept as missing and handled
+ natively by the boosting trees (each split learns which side they go
+ to), so the model is trained on the unimputed datasets of
+ ``ingest_data``. Boosting stops early when the score on a held-out part
+ of the training rows stops improving.
+"""
+from typing import Optional
+
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from house_pricing.search import BudgetedSearchCV
+from house_pricing.shared_data import SharedDataset
+
+MAX_ITER = 1000
+PARAM_GRID = {
+    "learning_rate": [0.05, 0.1, 0.2],
+    "max_leaf_nodes": [15, 31, 63],
+    "min_samples_leaf": [10, 40],
+}
+
+
+def make_booster(
+    random_state: Optional[int] = None, **params
+) -> HistGradientBoostingRegressor:
+    """Unfitted boosting model with early stopping, for features that may
+    contain NaN.
+    Parameters
+    ----------
+    random_state : int, optional
+        Seed of the held-out rows, by default None.
+    **params
+        Other hyperparameters of ``HistGradientBoostingRegressor``.
+    Returns
+    -------
+    HistGradientBoostingRegressor
+        The model, boosting at most MAX_ITER rounds unless given max_iter.
+    """
+    params.setdefault("max_iter", MAX_ITER)
+    return HistGradientBoostingRegressor(
+        early_stopping=True, random_state=random_state, **params
+    )
+
+
+def search_boosting(
+    data: SharedDataset,
+    param_grid: dict = PARAM_GRID,
+    random_state: int = 42,
+    **search_params,
+) -> tuple[HistGradientBoostingRegressor, BudgetedSearchCV]:
+    """Searches the boosting hyperparameters. Every candidate bins the
+    training rows of each fold itself, so no test fold leaks into the bins.
+    Parameters
+    ----------
+    data : SharedDataset
+        Features, may contain NaN, and labels.
+    param_grid : dict, optional
+        Candidates, by default PARAM_GRID.
+    random_state : int, optional
+        Seed of the early stopping rows, by default 42.
+    **search_params
+        Other arguments of BudgetedSearchCV (cv, n_jobs, strategy, budgets,
+        journal...).
+    Returns
+    -------
+    tuple[HistGradientBoostingRegressor, BudgetedSearchCV]
+        Index 0 is the best model refitted on all rows.
+        Index 1 is the fitted search.
+    """
+    estimator = make_booster(random_state)
+    search = BudgetedSearchCV(estimator, param_grid, **search_params)
+    search.fit(data)
+    return search.best_estimator_, search
@@ -0,0 +1,165 @@
+"""
+This module contains a local, content-addressed cache for downloaded data.
+Artifacts are stored under their sha256 digest in "<cache>/objects/" and
+ every fetched url is recorded in "<cache>/urls/", so repeated fetches of
+ the same url or the same content skip the download.
+Local paths and file:// urls are read in place, which allows air-gapped runs
+ from a local mirror.
+"""
+import hashlib
+import json
+import os
+import tarfile
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+from urllib.parse import urlparse
+
+from six.moves import urllib
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Computes the sha256 digest of a file without loading it in memory.
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+    block_size : int, optional
+        Number of bytes read at a time, by default 1 MiB.
+    Returns
+    -------
+    str
+        Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def local_path(source: str) -> Optional[str]:
+    """Returns the filesystem path of a local source.
+    Parameters
+    ----------
+    source : str
+        Url or path.
+    Returns
+    -------
+    Optional[str]
+        Path for file:// urls and plain paths, None for remote urls.
+    """
+    parsed = urlparse(source)
+    if parsed.scheme == "file":
+        return urllib.request.url2pathname(parsed.path)
+    if len(parsed.scheme) <= 1:
+        # no scheme, or a windows drive letter
+        return source
+    return None
+
+
+def _check_digest(path: str, digest: str, sha256: Optional[str]) -> None:
+    if sha256 is not None and digest != sha256.lower():
+        raise ValueError(
+            f"Checksum mismatch for {path}: expected {sha256}, got {digest}."
+        )
+
+
+def cached_fetch(
+    url: str, cache_dir: str, sha256: Optional[str] = None
+) -> str:
+    """Returns a local copy of the artifact at url, downloading it only if
+    it is not cached yet.
+    Parameters
+    ----------
+    url : str
+        http(s) or file:// url, or a local path.
+    cache_dir : str
+        Cache directory.
+    sha256 : str, optional
+        Expected hex digest of the artifact, by default None.
+        If given, the cached or downloaded artifact must match it.
+    Returns
+    -------
+    str
+        Path of the artifact on the local filesystem.
+    Raises
+    ------
+    ValueError
+        If the artifact does not match the expected checksum.
+    """
+    path = local_path(url)
+    if path is not None:
+        if sha256 is not None:
+            _check_digest(path, file_sha256(path), sha256)
+        return path
+
+    objects_dir = os.path.join(cache_dir, "objects")
+    urls_dir = os.path.join(cache_dir, "urls")
+    url_key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    url_record = os.path.join(urls_dir, f"{url_key}.json")
+
+    digest = sha256.lower() if sha256 is not None else None
+    if digest is None and os.path.exists(url_record):
+        with open(url_record) as file:
+            digest = json.load(file)["sha256"]
+    if digest is not None:
+        cached = os.path.join(objects_dir, digest)
+        if os.path.exists(cached):
+            return cached
+
+    os.makedirs(objects_dir, exist_ok=True)
+    os.makedirs(urls_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=objects_dir, suffix=".part")
+    os.close(fd)
+    try:
+        urllib.request.urlretrieve(url, tmp_path)
+        digest = file_sha256(tmp_path)
+        _check_digest(url, digest, sha256)
+        cached = os.path.join(objects_dir, digest)
+        os.replace(tmp_path, cached)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    with open(url_record, "w") as file:
+        json.dump({"url": url, "sha256": digest}, file)
+    return cached
+
+
+@contextmanager
+def open_csv_member(path: str, member: str = "housing.csv") -> Iterator[IO]:
+    """Opens a csv file, or a csv member of a tar archive without
+    extracting it to disk.
+    Parameters
+    ----------
+    path : str
+        Path to a csv file or a (compressed) tar archive.
+    member : str, optional
+        Name of the csv inside the archive, by default "housing.csv".
+        Falls back to the first csv member of the archive.
+    Yields
+    ------
+    IO
+        Binary file object positioned at the start of the csv.
+    """
+    if not tarfile.is_tarfile(path):
+        with open(path, "rb") as file:
+            yield file
+        return
+
+    with tarfile.open(path, "r:*") as archive:
+        # iterate lazily so the archive is not decompressed twice
+        found = None
+        for info in archive:
+            if not info.isfile():
+                continue
+            if os.path.basename(info.name) == member:
+                found = info
+                break
+            if found is None and info.name.endswith(".csv"):
+                found = info
+        if found is None:
+            raise FileNotFoundError(f"No csv member in archive {path}.")
+        with archive.extractfile(found) as file:
+            yield file
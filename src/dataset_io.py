@@ -0,0 +1,365 @@
+"""
+This module contains helper functions to store and load processed datasets.
+Two formats are supported:
+ "csv" - a single csv file, the index in the first column.
+ "npy" - a directory with the features as one row-major binary matrix,
+ the labels and the index as binary vectors and a "manifest.json"
+ describing columns, dtypes and shape. The feature matrix can be
+ memory-mapped, so loading it is zero-copy.
+"""
+import json
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from house_pricing.schema import FEATURE_DTYPE, processed_dtypes
+
+FORMATS = ("csv", "npy")
+LABEL = "median_house_value"
+MANIFEST = "manifest.json"
+FEATURES_FILE = "features.bin"
+LABELS_FILE = "labels.bin"
+INDEX_FILE = "index.bin"
+# ingest_data.py also stores every split with missing values kept, for the
+# model families that handle them natively
+UNIMPUTED_SUFFIX = "_unimputed"
+
+
+def _csv_columns(path: str) -> list[str]:
+    return list(pd.read_csv(path, index_col=0, nrows=0).columns)
+
+
+def dataset_path(directory: str, name: str, fmt: str = "csv") -> str:
+    """Builds the path of a dataset stored in the given format.
+    Parameters
+    ----------
+    directory : str
+        Directory holding the dataset.
+    name : str
+        Name of the dataset, e.g. "housing_train".
+    fmt : str, optional
+        One of FORMATS, by default "csv".
+    Returns
+    -------
+    str
+        Path of the csv file or of the npy dataset directory.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown dataset format {fmt!r}, expected {FORMATS}.")
+    if fmt == "csv":
+        return os.path.join(directory, f"{name}.csv")
+    return os.path.join(directory, name)
+
+
+def unimputed_path(path: str) -> str:
+    """Path of the unimputed copy of a processed dataset, e.g.
+    "housing_train_unimputed.csv" for "housing_train.csv".
+    Parameters
+    ----------
+    path : str
+        Csv file or npy dataset directory.
+    Returns
+    -------
+    str
+        Path of the copy, in the same format.
+    """
+    root, ext = os.path.splitext(os.path.normpath(path))
+    return root + UNIMPUTED_SUFFIX + ext
+
+
+def is_npy_dataset(path: str) -> bool:
+    """Checks if the given path holds a dataset in "npy" format.
+    Parameters
+    ----------
+    path : str
+        Path to check.
+    Returns
+    -------
+    bool
+        True if path is a directory with a manifest.
+    """
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def read_manifest(path: str) -> dict:
+    """Reads the manifest of an "npy" dataset.
+    Parameters
+    ----------
+    path : str
+        Path to the dataset directory.
+    Returns
+    -------
+    dict
+        Manifest contents.
+    """
+    with open(os.path.join(path, MANIFEST)) as file:
+        return json.load(file)
+
+
+class DatasetWriter:
+    """Writes a dataset chunk by chunk in "csv" or "npy" format.
+    Every chunk must have the same columns. Use as a context manager
+    or call ``close`` after the last chunk.
+    Parameters
+    ----------
+    path : str
+        Csv file or dataset directory, see :func:`dataset_path`.
+    fmt : str, optional
+        One of FORMATS, by default "csv".
+    label : str, optional
+        Label column, stored separately from the features in "npy" format,
+        by default LABEL.
+    dtype : str, optional
+        dtype of features and labels in "npy" format,
+        by default FEATURE_DTYPE.
+    append : bool, optional
+        Append to an existing dataset instead of overwriting it,
+        by default False.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fmt: str = "csv",
+        label: str = LABEL,
+        dtype: str = FEATURE_DTYPE,
+        append: bool = False,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(
+                f"Unknown dataset format {fmt!r}, expected {FORMATS}."
+            )
+        self.path = path
+        self.fmt = fmt
+        self.label = label
+        self.dtype = np.dtype(dtype)
+        self.columns = None
+        self.n_rows = 0
+        self._files = {}
+        self._header = True
+        if append and fmt == "npy" and is_npy_dataset(path):
+            manifest = read_manifest(path)
+            self.columns = manifest["columns"]
+            self.n_rows = manifest["n_rows"]
+            self.dtype = np.dtype(manifest["dtype"])
+            self._open("ab")
+        elif append and fmt == "csv" and os.path.exists(path):
+            self.columns = _csv_columns(path)
+            self._header = False
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Appends a chunk to the dataset.
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Chunk to append.
+        """
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self._open("wb")
+        elif list(df.columns) != self.columns:
+            raise ValueError("All chunks must have the same columns.")
+
+        if self.fmt == "csv":
+            df.to_csv(self.path, mode="a", header=self._header)
+            self._header = False
+        else:
+            features = [c for c in self.columns if c != self.label]
+            values = np.ascontiguousarray(df[features], dtype=self.dtype)
+            self._files["features"].write(values.tobytes())
+            if self.label in self.columns:
+                labels = df[self.label].to_numpy(dtype=self.dtype)
+                self._files["labels"].write(labels.tobytes())
+            index = df.index.to_numpy(dtype=np.int64)
+            self._files["index"].write(index.tobytes())
+        self.n_rows += len(df)
+
+    def _open(self, mode: str) -> None:
+        if self.fmt == "csv":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._files["features"] = open(
+            os.path.join(self.path, FEATURES_FILE), mode
+        )
+        self._files["index"] = open(os.path.join(self.path, INDEX_FILE), mode)
+        if self.label in self.columns:
+            self._files["labels"] = open(
+                os.path.join(self.path, LABELS_FILE), mode
+            )
+
+    def close(self) -> None:
+        """Flushes the data and writes the manifest of an "npy" dataset."""
+        for file in self._files.values():
+            file.close()
+        self._files = {}
+        if self.fmt != "npy" or self.columns is None:
+            return
+        label = self.label if self.label in self.columns else None
+        manifest = {
+            "format": "npy",
+            "version": 1,
+            "n_rows": self.n_rows,
+            "columns": self.columns,
+            "features": [c for c in self.columns if c != label],
+            "label": label,
+            "dtype": self.dtype.str,
+            "index_dtype": np.dtype(np.int64).str,
+        }
+        with open(os.path.join(self.path, MANIFEST), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def write_dataset(df: pd.DataFrame, path: str, fmt: str = "csv") -> None:
+    """Writes a whole dataframe in the given format.
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataset to write.
+    path : str
+        Csv file or dataset directory, see :func:`dataset_path`.
+    fmt : str, optional
+        One of FORMATS, by default "csv".
+    """
+    with DatasetWriter(path, fmt) as writer:
+        writer.write(df)
+
+
+def load_arrays(
+    path: str, mmap_mode: Optional[str] = "r"
+) -> tuple[np.ndarray, Optional[np.ndarray], np.ndarray, list[str]]:
+    """Loads the raw arrays of an "npy" dataset.
+    Parameters
+    ----------
+    path : str
+        Path to the dataset directory.
+    mmap_mode : str, optional
+        Memory-map mode passed to ``np.memmap``, by default "r".
+        If None, the arrays are read into memory.
+    Returns
+    -------
+    tuple[np.ndarray, Optional[np.ndarray], np.ndarray, list[str]]
+        Features matrix, labels (None if the dataset has none),
+        index and feature names.
+    """
+    manifest = read_manifest(path)
+    n_rows = manifest["n_rows"]
+    features = manifest["features"]
+
+    def _load(name, dtype, shape):
+        file_path = os.path.join(path, name)
+        if n_rows == 0:
+            return np.empty(shape, dtype=dtype)
+        if mmap_mode is None:
+            return np.fromfile(file_path, dtype=dtype).reshape(shape)
+        return np.memmap(file_path, dtype=dtype, mode=mmap_mode, shape=shape)
+
+    X = _load(FEATURES_FILE, manifest["dtype"], (n_rows, len(features)))
+    y = None
+    if manifest["label"] is not None:
+        y = _load(LABELS_FILE, manifest["dtype"], (n_rows,))
+    index = _load(INDEX_FILE, manifest["index_dtype"], (n_rows,))
+    return (X, y, index, features)
+
+
+def load_xy(
+    path: str, label: str = LABEL, mmap_mode: Optional[str] = "r"
+) -> tuple[pd.DataFrame, pd.Series]:
+    """Loads a dataset and splits features and labels.
+    For "npy" datasets the features dataframe wraps the memory-mapped
+    matrix without copying it.
+    Parameters
+    ----------
+    path : str
+        Csv file or dataset directory.
+    label : str, optional
+        Label column, by default LABEL.
+    mmap_mode : str, optional
+        Memory-map mode for "npy" datasets, by default "r".
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.Series]
+        Index 0 is the features dataframe.
+        Index 1 is the labels series.
+    """
+    if not is_npy_dataset(path):
+        df = read_dataset(path)
+        y = df[label].copy(deep=True)
+        X = df.drop([label], axis=1)
+        return (X, y)
+
+    X, y, index, features = load_arrays(path, mmap_mode)
+    index = pd.Index(index)
+    X = pd.DataFrame(X, columns=features, index=index, copy=False)
+    y = pd.Series(y, index=index, name=label, copy=False)
+    return (X, y)
+
+
+def read_dataset(path: str, mmap_mode: Optional[str] = "r") -> pd.DataFrame:
+    """Reads a whole dataset, whatever its format.
+    Parameters
+    ----------
+    path : str
+        Csv file or dataset directory.
+    mmap_mode : str, optional
+        Memory-map mode for "npy" datasets, by default "r".
+    Returns
+    -------
+    pd.DataFrame
+        The dataset, columns in the order they were written.
+    """
+    if not is_npy_dataset(path):
+        return pd.read_csv(
+            path, index_col=0, dtype=processed_dtypes(_csv_columns(path))
+        )
+
+    X, y, index, features = load_arrays(path, mmap_mode)
+    df = pd.DataFrame(X, columns=features, index=pd.Index(index))
+    manifest = read_manifest(path)
+    if y is not None:
+        df[manifest["label"]] = y
+    return df[manifest["columns"]]
+
+
+def iter_dataset(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Reads a dataset chunk by chunk, whatever its format.
+    Parameters
+    ----------
+    path : str
+        Csv file or dataset directory.
+    chunksize : int
+        Number of rows per chunk.
+    Yields
+    ------
+    pd.DataFrame
+        Consecutive chunks of the dataset.
+    """
+    if not is_npy_dataset(path):
+        yield from pd.read_csv(
+            path,
+            index_col=0,
+            dtype=processed_dtypes(_csv_columns(path)),
+            chunksize=chunksize,
+        )
+        return
+
+    X, y, index, features = load_arrays(path)
+    manifest = read_manifest(path)
+    for start in range(0, len(index), chunksize):
+        stop = start + chunksize
+        df = pd.DataFrame(
+            X[start:stop], columns=features, index=pd.Index(index[start:stop])
+        )
+        if y is not None:
+            df[manifest["label"]] = y[start:stop]
+        yield df[manifest["columns"]]
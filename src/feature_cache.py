@@ -0,0 +1,223 @@
+"""
+This module contains an on-disk cache of prepared feature matrices.
+An entry is an "npy" dataset (see ``dataset_io``) stored under a key that
+ hashes the contents of the input file together with the preparation
+ configuration, so a changed file or a changed preparation never reads a
+ stale entry. Repeat runs on unchanged data memory-map the ready features
+ and labels instead of parsing and preparing the input again.
+When the entries outgrow the size limit, the least recently used ones are
+ removed.
+"""
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from house_pricing.data_cache import file_sha256
+from house_pricing.dataset_io import is_npy_dataset, read_dataset, write_dataset
+from house_pricing.schema import FEATURE_DTYPE
+
+CACHE_VERSION = 1
+MAX_BYTES = 1 << 30
+
+
+def _dir_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class FeatureCache:
+    """Directory of prepared datasets with least recently used eviction.
+    Parameters
+    ----------
+    directory : str
+        Cache directory, created if missing.
+    max_bytes : int, optional
+        Total size of the entries above which the least recently used are
+        removed, by default MAX_BYTES (1 GiB). The newest entry is always
+        kept.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, path: str, config: Optional[dict] = None) -> str:
+        """Key of an input file prepared with a configuration.
+        Parameters
+        ----------
+        path : str
+            Input file.
+        config : dict, optional
+            Json-serialisable description of the preparation,
+            by default None.
+        Returns
+        -------
+        str
+            Hex sha256 digest.
+        """
+        text = json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "data": file_sha256(path),
+                "config": config,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of a cached entry, marked as just used.
+        Parameters
+        ----------
+        key : str
+            Key from :meth:`key`.
+        Returns
+        -------
+        Optional[str]
+            Path of the "npy" dataset, None if it is not cached.
+        """
+        path = os.path.join(self.directory, key)
+        if not is_npy_dataset(path):
+            return None
+        os.utime(path)
+        return path
+
+    def put(self, key: str, df: pd.DataFrame) -> str:
+        """Stores a prepared dataset, then evicts entries over the limit.
+        Parameters
+        ----------
+        key : str
+            Key from :meth:`key`.
+        df : pd.DataFrame
+            Prepared dataset.
+        Returns
+        -------
+        str
+            Path of the "npy" dataset.
+        """
+        path = os.path.join(self.directory, key)
+        tmp_path = tempfile.mkdtemp(prefix=".tmp_", dir=self.directory)
+        dataset = os.path.join(tmp_path, "dataset")
+        write_dataset(df, dataset, "npy")
+        try:
+            os.replace(dataset, path)
+        except OSError:
+            # another process stored the same entry meanwhile
+            pass
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.utime(path)
+        self.evict()
+        return path
+
+    def entries(self) -> list[tuple[str, int, float]]:
+        """Cached entries, least recently used first.
+        Returns
+        -------
+        list[tuple[str, int, float]]
+            Path, size in bytes and last use time of every entry.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.startswith(".") and is_npy_dataset(path):
+                entries.append((path, _dir_size(path), os.stat(path).st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self) -> list[str]:
+        """Removes least recently used entries until the total size fits.
+        Returns
+        -------
+        list[str]
+            Paths of the removed entries.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for path, size, _ in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed.append(path)
+        return removed
+
+    def prepared(
+        self,
+        path: str,
+        prepare: Callable[[str], pd.DataFrame] = read_dataset,
+        config: Optional[dict] = None,
+    ) -> str:
+        """Path of the prepared dataset of an input file, preparing and
+        caching it on a miss.
+        Parameters
+        ----------
+        path : str
+            Input file.
+        prepare : Callable[[str], pd.DataFrame], optional
+            Reads and prepares the input file, by default read_dataset.
+        config : dict, optional
+            Describes what prepare does. Must change whenever its output
+            would, by default None.
+        Returns
+        -------
+        str
+            Path of the "npy" dataset.
+        """
+        key = self.key(path, config)
+        return self.get(key) or self.put(key, prepare(path))
+
+
+def source_digest(*functions: Callable) -> str:
+    """Hashes the source code of functions, so a preparation configuration
+    can change whenever the code computing the prepared data does.
+    Parameters
+    ----------
+    *functions : Callable
+        Functions whose source is hashed, in order.
+    Returns
+    -------
+    str
+        Hex sha256 digest.
+    """
+    digest = hashlib.sha256()
+    for function in functions:
+        digest.update(inspect.getsource(function).encode())
+    return digest.hexdigest()
+
+
+def cached_path(
+    path: str, cache_dir: Optional[str], max_bytes: int = MAX_BYTES
+) -> str:
+    """Path to read a processed dataset from: its cached "npy" copy if a
+    cache directory is given and the dataset is a csv file.
+    Parameters
+    ----------
+    path : str
+        Csv file or npy dataset directory.
+    cache_dir : str, optional
+        Cache directory, None disables the cache.
+    max_bytes : int, optional
+        Size limit of the cache, by default MAX_BYTES.
+    Returns
+    -------
+    str
+        Path of the cached "npy" dataset, or path itself.
+    """
+    if not cache_dir or is_npy_dataset(path):
+        return path
+    cache = FeatureCache(cache_dir, max_bytes)
+    return cache.prepared(
+        path,
+        config={"prepare": "read_dataset", "dtype": np.dtype(FEATURE_DTYPE).str},
+    )
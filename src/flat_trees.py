@@ -0,0 +1,219 @@
+"""
+This module contains a flattened, vectorized predictor for fitted decision
+ trees and random forests.
+Every tree is exported into shared contiguous node arrays (feature,
+ threshold, interleaved children, value, missing-value direction). A batch
+ is then predicted by walking all trees together one level at a time: each
+ step is a handful of NumPy gathers over the (tree, row) pairs still
+ descending, instead of one validated ``predict`` call per tree. Leaves
+ point to themselves, so pairs that reached one are only dropped every
+ COMPACT_EVERY levels, which costs less than filtering at every level.
+The fixed cost of a call is a few dozen NumPy operations, so small batches
+ are predicted several times faster than by scikit-learn; large batches
+ are still faster in scikit-learn's compiled traversal.
+Comparisons are made on float32 features against the float64 thresholds,
+ and trees are summed in estimator order before dividing by their count,
+ exactly as scikit-learn does, so predictions are bit-identical to those
+ of the exported model (when it predicts with n_jobs=1, the default).
+The exported predictor only holds numpy arrays, so ``model_io``'s "flat"
+ format stores trees and forests as one and memory-maps all its nodes.
+"""
+from typing import Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+# (trees x rows) node indices processed at once, bounds the work memory
+BLOCK_SIZE = 1 << 20
+# levels walked between two removals of the pairs that reached a leaf
+COMPACT_EVERY = 4
+
+
+class FlatForest:
+    """Tree ensemble stored as flat node arrays.
+    Use :func:`flatten` to build it from a fitted model.
+    Parameters
+    ----------
+    feature : np.ndarray
+        Feature tested by each node, 0 for leaves.
+    threshold : np.ndarray
+        float64 threshold of each node, rows go left if feature <= threshold.
+    children : np.ndarray
+        Global index of the left and right child of each node, interleaved
+        (node ``i`` has children ``2 * i`` and ``2 * i + 1``), the node
+        itself for leaves.
+    missing_left : np.ndarray
+        Whether rows with a missing feature go left at each node.
+    value : np.ndarray
+        float64 prediction of each node.
+    roots : np.ndarray
+        Index of the root node of each tree.
+    max_depth : int
+        Depth of the deepest tree.
+    feature_names : np.ndarray, optional
+        Feature names seen by the exported model, by default None.
+    n_features : int, optional
+        Number of features seen by the exported model, by default None.
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        missing_left: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        feature_names: Optional[np.ndarray] = None,
+        n_features: Optional[int] = None,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        if feature_names is not None:
+            self.feature_names_in_ = feature_names
+        self.n_features_in_ = n_features
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _check_X(self, X) -> np.ndarray:
+        names = getattr(self, "feature_names_in_", None)
+        if names is not None and hasattr(X, "columns"):
+            X = X[names]
+        # scikit-learn's trees compare float32 features
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or (
+            self.n_features_in_ is not None and X.shape[1] != self.n_features_in_
+        ):
+            raise ValueError(
+                f"X has shape {X.shape}, expected {self.n_features_in_} "
+                "features."
+            )
+        return X
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf reached by each row in each tree.
+        Parameters
+        ----------
+        X : array-like
+            Features, columns in the order seen by the exported model (or a
+            dataframe with its feature names).
+        Returns
+        -------
+        np.ndarray
+            (trees, rows) global leaf indices.
+        """
+        X = self._check_X(X)
+        n_rows, n_features = X.shape
+        leaves = np.empty((self.n_trees, n_rows), dtype=np.intp)
+        step = max(1, BLOCK_SIZE // self.n_trees)
+        for start in range(0, n_rows, step):
+            block = X[start : start + step]
+            leaves[:, start : start + step] = self._walk(block)
+        return leaves
+
+    def _walk(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        has_missing = np.isnan(flat).any()
+        # one entry per (tree, row) pair still descending
+        nodes = np.repeat(self.roots, n_rows)
+        offsets = np.tile(np.arange(n_rows) * n_features, self.n_trees)
+        pairs = np.arange(self.n_trees * n_rows)
+        leaves = np.empty(self.n_trees * n_rows, dtype=np.intp)
+        for depth in range(1, self.max_depth + 1):
+            values = flat[offsets + self.feature[nodes]]
+            # NaNs fail the comparison, they go right unless missing_left
+            go_right = ~(values <= self.threshold[nodes])
+            if has_missing:
+                go_right &= ~(np.isnan(values) & self.missing_left[nodes])
+            nodes = self.children[2 * nodes + go_right]
+            if depth % COMPACT_EVERY == 0 or depth == self.max_depth:
+                done = nodes == self.children[2 * nodes]
+                leaves[pairs[done]] = nodes[done]
+                keep = ~done
+                nodes, offsets, pairs = nodes[keep], offsets[keep], pairs[keep]
+        if self.max_depth == 0:
+            leaves[:] = nodes
+        return leaves.reshape(self.n_trees, n_rows)
+
+    def predict(self, X) -> np.ndarray:
+        """Predicts labels, the mean of the trees' predictions.
+        Parameters
+        ----------
+        X : array-like
+            Features, columns in the order seen by the exported model (or a
+            dataframe with its feature names).
+        Returns
+        -------
+        np.ndarray
+            float64 predictions, identical to the exported model's.
+        """
+        leaves = self.apply(X)
+        predictions = np.zeros(leaves.shape[1], dtype=np.float64)
+        # summed tree by tree in estimator order, like scikit-learn
+        for tree_leaves in leaves:
+            predictions += self.value[tree_leaves]
+        predictions /= self.n_trees
+        return predictions
+
+
+def flatten(model) -> FlatForest:
+    """Exports a fitted tree or forest into flat node arrays.
+    Parameters
+    ----------
+    model : DecisionTreeRegressor or RandomForestRegressor
+        Fitted single-output model.
+    Returns
+    -------
+    FlatForest
+        Predictor giving the same predictions as the model.
+    """
+    if isinstance(model, DecisionTreeRegressor):
+        trees = [model.tree_]
+    elif isinstance(model, RandomForestRegressor):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+    else:
+        raise TypeError(
+            f"Cannot flatten {type(model).__name__}, expected a "
+            "DecisionTreeRegressor or RandomForestRegressor."
+        )
+    if model.n_outputs_ != 1:
+        raise ValueError("Only single-output models can be flattened.")
+
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+    parts = {"feature": [], "threshold": [], "children": []}
+    parts.update(missing_left=[], value=[])
+    for offset, tree in zip(offsets, trees):
+        nodes = np.arange(tree.node_count) + offset
+        leaf = tree.children_left == -1
+        parts["feature"].append(np.where(leaf, 0, tree.feature))
+        parts["threshold"].append(tree.threshold)
+        children = np.empty(2 * tree.node_count, dtype=np.intp)
+        children[0::2] = np.where(leaf, nodes, tree.children_left + offset)
+        children[1::2] = np.where(leaf, nodes, tree.children_right + offset)
+        parts["children"].append(children)
+        parts["missing_left"].append(tree.missing_go_to_left.astype(bool))
+        parts["value"].append(tree.value[:, 0, 0])
+    arrays = {
+        name: np.ascontiguousarray(np.concatenate(values))
+        for name, values in parts.items()
+    }
+    arrays["feature"] = arrays["feature"].astype(np.intp)
+    arrays["threshold"] = arrays["threshold"].astype(np.float64)
+    arrays["value"] = arrays["value"].astype(np.float64)
+    return FlatForest(
+        roots=offsets[:-1].astype(np.intp),
+        max_depth=max(tree.max_depth for tree in trees),
+        feature_names=getattr(model, "feature_names_in_", None),
+        n_features=model.n_features_in_,
+        **arrays,
+    )
@@ -4,25 +4,63 @@ Running this standalone downloads the housing data and stores
  preprocessed copies of it in the specified folders.
 """
 import os
-import tarfile
+import shutil
 from argparse import ArgumentParser, Namespace
 from logging import Logger
+from typing import Iterator, Optional
 
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
+from house_pricing.data_cache import cached_fetch, open_csv_member
+from house_pricing.dataset_io import (
+    FORMATS,
+    DatasetWriter,
+    dataset_path,
+    iter_dataset,
+    unimputed_path,
+)
+from house_pricing.ingest_manifest import (
+    SPLITS,
+    IngestManifest,
+    RowKeys,
+    assign_splits,
+    isin_sorted,
+    row_fingerprints,
+    update_sketches,
+)
 from house_pricing.logger import configure_logger
-from six.moves import urllib
+from house_pricing.preprocessing import (
+    HousingPreprocessor,
+    load_preprocessor,
+    save_preprocessor,
+)
+from house_pricing.schema import memory_report, read_raw_csv
 from sklearn.impute import SimpleImputer
 from sklearn.model_selection import StratifiedShuffleSplit
 
 
+PREPROCESSOR_FILE = "preprocessor.pkl"
+HOUSING_URL = (
+    "https://raw.githubusercontent.com/ageron/handson-ml/master/"
+    "datasets/housing/housing.tgz"
+)
+
+
 def parse_args() -> Namespace:
     """Commandline argument parser for standalone run.
     Returns
     -------
     arparse.Namespace
         Commandline arguments. Contains keys: ["raw": str,
+         "url": str,
+         "sha256": str,
          "processed": str,
+         "chunksize": int,
+         "format": str,
+         "incremental": bool,
+         "refit_threshold": float,
+         "unimputed": bool,
          "log_level": str,
          "no_console_log": bool,
          "log_path": str]
@@ -33,7 +71,21 @@ def parse_args() -> Namespace:
         "--raw",
         type=str,
         default="data/raw/",
-        help="Path to raw dataset.",
+        help="Download cache directory of the raw dataset.",
+    )
+    parser.add_argument(
+        "-u",
+        "--url",
+        type=str,
+        default=HOUSING_URL,
+        help="Raw dataset source: http(s) or file:// url, or a local path "
+        "to a tar archive or csv file.",
+    )
+    parser.add_argument(
+        "--sha256",
+        type=str,
+        default=None,
+        help="Expected sha256 checksum of the raw dataset.",
     )
     parser.add_argument(
         "-p",
@@ -42,34 +94,73 @@ def parse_args() -> Namespace:
         default="data/processed/",
         help="Path to processed dataset.",
     )
+    parser.add_argument(
+        "-c",
+        "--chunksize",
+        type=int,
+        default=0,
+        help="Rows per chunk for streaming ingest. 0 loads the whole dataset.",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=FORMATS,
+        default="csv",
+        help="Storage format of the processed datasets.",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Only process rows not ingested yet, see run_incremental.",
+    )
+    parser.add_argument(
+        "--refit-threshold",
+        type=float,
+        default=0.05,
+        help="Relative median drift that triggers a refit, keeping every row "
+        "in its split, in incremental mode.",
+    )
+    parser.add_argument(
+        "--unimputed",
+        action="store_true",
+        help="Also store every split with missing values kept (e.g. "
+        "housing_train_unimputed.csv), for the boosting family of logger.py.",
+    )
     parser.add_argument("--log-level", type=str, default="DEBUG")
     parser.add_argument("--no-console-log", action="store_true")
     parser.add_argument("--log-path", type=str, default="")
     return parser.parse_args()
 
 
-def fetch_housing_data(housing_url: str, housing_path: str) -> None:
-    """Function to download and extract housing data.
+def fetch_housing_data(
+    housing_url: str, housing_path: str, sha256: Optional[str] = None
+) -> str:
+    """Function to fetch the housing data into the local download cache.
+    Nothing is downloaded if the data is already cached, and local paths
+    or file:// urls are used in place.
     Parameters
     ----------
     housing_url : str
-        Url to download the housing data from.
+        Url or local path to fetch the housing data from.
     housing_path : str
-        Path to store the raw csv files after extraction.
+        Download cache directory.
+    sha256 : str, optional
+        Expected checksum of the housing data, by default None.
+    Returns
+    -------
+    str
+        Local path of the housing archive (or csv file).
     """
-    os.makedirs(housing_path, exist_ok=True)
-    tgz_path = os.path.join(housing_path, "housing.tgz")
-    urllib.request.urlretrieve(housing_url, tgz_path)
-    housing_tgz = tarfile.open(tgz_path)
-    housing_tgz.extractall(path=housing_path)
-    housing_tgz.close()
-    os.remove(tgz_path)
+    return cached_fetch(housing_url, housing_path, sha256)
 
 
 def stratified_shuffle_split(
     base_df: pd.DataFrame,
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Does stratified shuffle split on "income_cat" attribute of housing data.
+    The given dataframe is not modified.
     Parameters
     ----------
     base_df : pd.DataFrame
@@ -79,21 +170,55 @@ def stratified_shuffle_split(
     tuple[pd.DataFrame, pd.DataFrame]
         [train_dataset, test_dataset]
     """
-    base_df["income_cat"] = pd.cut(
-        base_df["median_income"],
-        bins=[0.0, 1.5, 3.0, 4.5, 6.0, np.inf],
-        labels=[1, 2, 3, 4, 5],
-    )
+    strata = income_strata(base_df["median_income"])
+    train_index, test_index = _split_once(strata, 0.2, 42)
+    return (base_df.iloc[train_index], base_df.iloc[test_index])
 
-    split = StratifiedShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
-    for train_index, test_index in split.split(base_df, base_df["income_cat"]):
-        strat_train_set = base_df.loc[train_index]
-        strat_test_set = base_df.loc[test_index]
 
-    for set_ in (strat_test_set, strat_train_set):
-        set_.drop("income_cat", axis=1, inplace=True)
+def _split_once(
+    strata: np.ndarray, test_size: float, seed: int
+) -> tuple[np.ndarray, np.ndarray]:
+    split = StratifiedShuffleSplit(
+        n_splits=1, test_size=test_size, random_state=seed
+    )
+    return next(split.split(np.empty((len(strata), 0)), strata))
 
-    return (strat_train_set, strat_test_set)
+
+def stratified_split_indices(
+    median_income: pd.Series,
+    n_splits: int = 1,
+    test_size: float = 0.2,
+    random_state: int = 42,
+    n_jobs: Optional[int] = None,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Generates stratified shuffle splits on income as positional index
+    arrays only, for repeated-split analysis without copying the data.
+    Split i is seeded from ``np.random.SeedSequence(random_state)``, so
+    results do not depend on n_jobs or on the other splits.
+    Parameters
+    ----------
+    median_income : pd.Series
+        "median_income" column of housing data.
+    n_splits : int, optional
+        Number of splits, by default 1.
+    test_size : float, optional
+        Fraction of rows assigned to test, by default 0.2.
+    random_state : int, optional
+        Seed of the per-split seeds, by default 42.
+    n_jobs : int, optional
+        Number of parallel jobs, by default None (one). Splits run in
+        threads unless a joblib backend is set by the caller.
+    Returns
+    -------
+    list[tuple[np.ndarray, np.ndarray]]
+        (train_positions, test_positions) per split, usable with ``iloc``.
+    """
+    strata = income_strata(median_income)
+    seeds = np.random.SeedSequence(random_state).generate_state(n_splits)
+    # threads: the strata and the returned indices are shared, not pickled
+    return Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(_split_once)(strata, test_size, int(seed)) for seed in seeds
+    )
 
 
 def pre_process_data(
@@ -131,42 +256,605 @@ def pre_process_data(
     return (df, imputer)
 
 
-def run(args: Namespace, logger: Logger) -> None:
-    """Does all the ingesting work (fetching, splitting, preprocessing).
-    Gets called if this module is run standalone.
+def income_strata(median_income: pd.Series) -> np.ndarray:
+    """Maps median income to the "income_cat" strata used for splitting.
     Parameters
     ----------
-    args : Namespace
-        Commandline arguments from parse_args.
+    median_income : pd.Series
+        "median_income" column of housing data.
+    Returns
+    -------
+    np.ndarray
+        Stratum code per row, 0 to 4. Rows outside the bins get 5.
+    """
+    codes = pd.cut(
+        median_income,
+        bins=[0.0, 1.5, 3.0, 4.5, 6.0, np.inf],
+        labels=[1, 2, 3, 4, 5],
+    ).cat.codes.to_numpy()
+    return np.where(codes < 0, 5, codes)
+
+
+def stream_stratified_split(
+    csv_path: str,
+    chunksize: int,
+    test_size: float = 0.2,
+    random_state: int = 42,
+) -> Iterator[tuple[pd.DataFrame, pd.DataFrame]]:
+    """Reads a housing csv in chunks and splits every chunk into train and test
+    rows, stratified on income. Per stratum, the running number of test rows
+    is kept at ``round(test_size * rows_seen)``, so the proportions match
+    the in-memory split whatever the chunk size. The same arguments always
+    give the same split.
+    Parameters
+    ----------
+    csv_path : str
+        Path to the raw housing csv, or to an archive holding it.
+    chunksize : int
+        Number of rows read at a time.
+    test_size : float, optional
+        Fraction of rows assigned to test, by default 0.2.
+    random_state : int, optional
+        Seed for picking the test rows, by default 42.
+    Yields
+    ------
+    tuple[pd.DataFrame, pd.DataFrame]
+        [train_chunk, test_chunk]
+    """
+    rng = np.random.default_rng(random_state)
+    seen = np.zeros(6, dtype=np.int64)
+    assigned = np.zeros(6, dtype=np.int64)
+
+    with open_csv_member(csv_path) as file:
+        for chunk in read_raw_csv(file, chunksize=chunksize):
+            strata = income_strata(chunk["median_income"])
+            is_test = np.zeros(len(chunk), dtype=bool)
+            for stratum in np.unique(strata):
+                rows = np.flatnonzero(strata == stratum)
+                seen[stratum] += rows.size
+                target = int(seen[stratum] * test_size + 0.5)
+                picked = rng.choice(
+                    rows, target - assigned[stratum], replace=False
+                )
+                is_test[picked] = True
+                assigned[stratum] = target
+            yield (chunk[~is_test], chunk[is_test])
+
+
+def fit_streaming_imputer(
+    csv_path: str, chunksize: int
+) -> HousingPreprocessor:
+    """Learns imputation medians and "ocean_proximity" categories from the
+    train rows of :func:`stream_stratified_split`, one chunk at a time.
+    Medians come from a :class:`QuantileSketch` per column.
+    Parameters
+    ----------
+    csv_path : str
+        Path to the raw housing csv, or to an archive holding it.
+    chunksize : int
+        Number of rows read at a time.
+    Returns
+    -------
+    HousingPreprocessor
+        Preprocessor fitted on the train rows.
+    """
+    sketches = {}
+    categories = set()
+    for train_chunk, _ in stream_stratified_split(csv_path, chunksize):
+        update_sketches(sketches, train_chunk)
+        categories.update(train_chunk["ocean_proximity"].dropna().unique())
+
+    medians = {column: sketch.median() for column, sketch in sketches.items()}
+    return HousingPreprocessor.from_statistics(medians, sorted(categories))
+
+
+def processed_paths(
+    processed: str, split: str, fmt: str, unimputed: bool = False
+) -> dict[bool, str]:
+    """Paths of the imputed and, if asked for, of the unimputed dataset of
+    a split.
+    Parameters
+    ----------
+    processed : str
+        Directory of the preprocessed datasets.
+    split : str
+        "train" or "test".
+    fmt : str
+        Storage format of the processed datasets.
+    unimputed : bool, optional
+        Include the unimputed dataset, by default False.
+    Returns
+    -------
+    dict[bool, str]
+        Dataset path by whether its missing values are imputed.
+    """
+    path = dataset_path(processed, f"housing_{split}", fmt)
+    if unimputed:
+        return {True: path, False: unimputed_path(path)}
+    return {True: path}
+
+
+def _remove_unimputed(processed: str, fmt: str) -> None:
+    # unimputed copies of an earlier ingest no longer match the datasets
+    for split in SPLITS:
+        path = unimputed_path(dataset_path(processed, f"housing_{split}", fmt))
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+class ProcessedWriter:
+    """Preprocesses raw rows of one split chunk by chunk into its imputed
+    dataset, and its unimputed one if paths has one. Use as a context
+    manager.
+    Parameters
+    ----------
+    preprocessor : HousingPreprocessor
+        Fitted preprocessor.
+    paths : dict[bool, str]
+        Dataset paths from :func:`processed_paths`.
+    fmt : str
+        Storage format of the processed datasets.
+    append : bool, optional
+        Append to the existing datasets, by default False.
+    """
+
+    def __init__(
+        self,
+        preprocessor: HousingPreprocessor,
+        paths: dict[bool, str],
+        fmt: str,
+        append: bool = False,
+    ):
+        self.preprocessor = preprocessor
+        self.writers = {
+            impute: DatasetWriter(path, fmt, append=append)
+            for impute, path in paths.items()
+        }
+
+    def write(self, rows: pd.DataFrame) -> None:
+        """Preprocesses and appends raw rows.
+        Parameters
+        ----------
+        rows : pd.DataFrame
+            Raw rows of the split.
+        """
+        for impute, writer in self.writers.items():
+            writer.write(self.preprocessor.transform_frame(rows, impute))
+
+    def close(self) -> None:
+        """Closes every dataset."""
+        for writer in self.writers.values():
+            writer.close()
+
+    def __enter__(self) -> "ProcessedWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def run_streaming(
+    csv_path: str,
+    processed: str,
+    chunksize: int,
+    logger: Logger,
+    fmt: str = "csv",
+    unimputed: bool = False,
+) -> HousingPreprocessor:
+    """Out-of-core version of the split and preprocessing in :func:`run`.
+    The raw csv is read twice, chunk by chunk: once to fit the imputer
+    and once to write the preprocessed train and test sets.
+    Peak memory depends on ``chunksize``, not on the dataset size.
+    Parameters
+    ----------
+    csv_path : str
+        Path to the raw housing csv, or to an archive holding it.
+    processed : str
+        Directory to store the preprocessed datasets in.
+    chunksize : int
+        Number of rows read at a time.
+    logger : Logger
+        Logger to log the state while running.
+    fmt : str, optional
+        Storage format of the processed datasets, by default "csv".
+    unimputed : bool, optional
+        Also store the splits with missing values kept, by default False.
+    Returns
+    -------
+    HousingPreprocessor
+        The fitted preprocessor.
+    """
+    logger.debug(f"Fitting imputer on chunks of {chunksize} rows...")
+    preprocessor = fit_streaming_imputer(csv_path, chunksize)
+    logger.debug(f"Imputer fitted. Medians: {preprocessor.medians_}.")
+
+    os.makedirs(processed, exist_ok=True)
+    save_preprocessor(
+        preprocessor, os.path.join(processed, PREPROCESSOR_FILE)
+    )
+    _remove_unimputed(processed, fmt)
+    train_paths = processed_paths(processed, "train", fmt, unimputed)
+    test_paths = processed_paths(processed, "test", fmt, unimputed)
+
+    logger.debug("Preprocessing and saving datasets chunk by chunk...")
+    with ProcessedWriter(
+        preprocessor, train_paths, fmt
+    ) as train_writer, ProcessedWriter(
+        preprocessor, test_paths, fmt
+    ) as test_writer:
+        for train_chunk, test_chunk in stream_stratified_split(
+            csv_path, chunksize
+        ):
+            train_writer.write(train_chunk)
+            test_writer.write(test_chunk)
+    logger.debug(
+        f"Preprocessed train datasets stored at {list(train_paths.values())}."
+    )
+    logger.debug(
+        f"Preprocessed test datasets stored at {list(test_paths.values())}."
+    )
+    return preprocessor
+
+
+def run_in_memory(
+    housing_path: str,
+    processed: str,
+    logger: Logger,
+    fmt: str = "csv",
+    unimputed: bool = False,
+) -> tuple[pd.DataFrame, pd.DataFrame, HousingPreprocessor]:
+    """Splits and preprocesses the whole dataset at once.
+    Parameters
+    ----------
+    housing_path : str
+        Path to the raw housing csv, or to an archive holding it.
+    processed : str
+        Directory to store the preprocessed datasets in.
     logger : Logger
         Logger to log the state while running.
+    fmt : str, optional
+        Storage format of the processed datasets, by default "csv".
+    unimputed : bool, optional
+        Also store the splits with missing values kept, by default False.
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame, HousingPreprocessor]
+        Raw train set, raw test set and the fitted preprocessor.
     """
-    DOWNLOAD_ROOT = (
-        "https://raw.githubusercontent.com/ageron/handson-ml/master/"
+    with open_csv_member(housing_path) as file:
+        housing_df = read_raw_csv(file)
+    logger.debug(f"Loaded raw housing data. {memory_report(housing_df)}")
+    train_raw, test_raw = stratified_shuffle_split(housing_df)
+
+    preprocessor = HousingPreprocessor().fit(train_raw)
+    os.makedirs(processed, exist_ok=True)
+
+    preprocessor_path = os.path.join(processed, PREPROCESSOR_FILE)
+    save_preprocessor(preprocessor, preprocessor_path)
+    logger.debug(f"Fitted preprocessor stored at {preprocessor_path}.")
+
+    logger.debug("Preprocessing and saving datasets...")
+    _remove_unimputed(processed, fmt)
+    for split, rows in (("train", train_raw), ("test", test_raw)):
+        paths = processed_paths(processed, split, fmt, unimputed)
+        with ProcessedWriter(preprocessor, paths, fmt) as writer:
+            writer.write(rows)
+        logger.debug(
+            f"Preprocessed {split} datasets stored at {list(paths.values())}."
+        )
+    return (train_raw, test_raw, preprocessor)
+
+
+def _full_ingest_with_manifest(
+    housing_path: str,
+    processed: str,
+    chunksize: int,
+    logger: Logger,
+    fmt: str,
+    unimputed: bool,
+) -> None:
+    if chunksize:
+        preprocessor = run_streaming(
+            housing_path, processed, chunksize, logger, fmt, unimputed
+        )
+        splits = stream_stratified_split(housing_path, chunksize)
+    else:
+        train_raw, test_raw, preprocessor = run_in_memory(
+            housing_path, processed, logger, fmt, unimputed
+        )
+        splits = [(train_raw, test_raw)]
+    medians = dict(zip(preprocessor.numeric_columns_, preprocessor.medians_))
+    manifest = IngestManifest.from_splits(
+        splits, medians, preprocessor.categories_, fmt
     )
-    HOUSING_PATH = args.raw
-    HOUSING_URL = DOWNLOAD_ROOT + "datasets/housing/housing.tgz"
-    fetch_housing_data(HOUSING_URL, HOUSING_PATH)
-    logger.debug("Fetched housing data.")
+    manifest.state["unimputed"] = unimputed
+    manifest.save(processed)
+    logger.debug("Ingest manifest saved.")
 
-    housing_df = pd.read_csv(os.path.join(args.raw, "housing.csv"))
-    train_set, test_set = stratified_shuffle_split(housing_df)
 
-    logger.debug("Preprocessing...")
-    train_set, imputer = pre_process_data(train_set)
-    test_set, _ = pre_process_data(test_set, imputer)
-    logger.debug("Preprocessing finished.")
+def _split_source(
+    housing_path: str,
+    chunksize: int,
+    stored: dict[str, np.ndarray],
+    test_size: float,
+) -> Iterator[tuple[pd.DataFrame, np.ndarray, np.ndarray, np.ndarray]]:
+    # raw chunks of the source (all of it at once without chunksize) with
+    # their row keys, test mask and new-row mask, see assign_splits
+    row_keys = RowKeys()
+    with open_csv_member(housing_path) as file:
+        if chunksize:
+            chunks = read_raw_csv(file, chunksize=chunksize)
+        else:
+            chunks = [read_raw_csv(file)]
+        for chunk in chunks:
+            fingerprints = row_fingerprints(chunk)
+            keys = row_keys.update(fingerprints)
+            is_test, is_new = assign_splits(
+                fingerprints, keys, stored, test_size
+            )
+            yield (chunk, keys, is_test, is_new)
 
-    logger.debug("Saving datasets.")
-    os.makedirs(args.processed, exist_ok=True)
 
-    train_path = os.path.join(args.processed, "housing_train.csv")
-    train_set.to_csv(train_path)
-    logger.debug(f"Preprocessed train datasets stored at {train_path}.")
+def _replace(tmp_path: str, path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+def _compact(path: str, fmt: str, keep: np.ndarray, chunksize: int) -> None:
+    tmp_path = path + ".tmp"
+    start = 0
+    with DatasetWriter(tmp_path, fmt) as writer:
+        for chunk in iter_dataset(path, chunksize):
+            writer.write(chunk[keep[start : start + len(chunk)]])
+            start += len(chunk)
+    _replace(tmp_path, path)
+
+
+def _refit_with_manifest(
+    housing_path: str,
+    processed: str,
+    manifest: IngestManifest,
+    categories: set,
+    chunksize: int,
+    logger: Logger,
+    fmt: str,
+    unimputed: bool,
+) -> None:
+    # every row stays in the split it is stored in (new rows go by
+    # fingerprint), only the statistics are fitted again and all rows
+    # preprocessed with them. The medians are those of the sketches the
+    # drift is measured on, rebuilt from the current train rows.
+    medians = {
+        column: sketch.median() for column, sketch in manifest.sketches.items()
+    }
+    preprocessor = HousingPreprocessor.from_statistics(
+        medians, sorted(categories)
+    )
+    paths = {
+        split: processed_paths(processed, split, fmt, unimputed)
+        for split in SPLITS
+    }
+    tmp_paths = {
+        split: {impute: path + ".tmp" for impute, path in split_paths.items()}
+        for split, split_paths in paths.items()
+    }
+    keys = {split: [] for split in SPLITS}
+    n_rows = 0
+    with ProcessedWriter(
+        preprocessor, tmp_paths["train"], fmt
+    ) as train_writer, ProcessedWriter(
+        preprocessor, tmp_paths["test"], fmt
+    ) as test_writer:
+        for chunk, chunk_keys, is_test, _ in _split_source(
+            housing_path, chunksize, manifest.sorted_keys(),
+            manifest.state["test_size"],
+        ):
+            train_writer.write(chunk[~is_test])
+            test_writer.write(chunk[is_test])
+            keys["train"].append(chunk_keys[~is_test])
+            keys["test"].append(chunk_keys[is_test])
+            n_rows += len(chunk)
+    for split in SPLITS:
+        for impute, path in paths[split].items():
+            _replace(tmp_paths[split][impute], path)
+    save_preprocessor(preprocessor, os.path.join(processed, PREPROCESSOR_FILE))
+
+    manifest.fingerprints = {
+        split: np.concatenate(parts) for split, parts in keys.items()
+    }
+    manifest.state["next_index"] = n_rows
+    manifest.state["fitted_medians"] = dict(
+        zip(preprocessor.numeric_columns_, preprocessor.medians_)
+    )
+    manifest.state["categories"] = list(preprocessor.categories_)
+    manifest.save(processed)
+    logger.debug(f"Refitted. Medians: {preprocessor.medians_}.")
+
+
+def run_incremental(
+    housing_path: str,
+    processed: str,
+    logger: Logger,
+    fmt: str = "csv",
+    chunksize: int = 0,
+    refit_threshold: float = 0.05,
+    unimputed: bool = False,
+) -> None:
+    """Ingests only the rows of a new data drop that are not processed yet.
+
+    Rows are identified by a key made of a fingerprint of their raw values
+    and, for repeated identical rows, their occurrence number, kept in an
+    :class:`IngestManifest` next to the processed datasets. New rows (and
+    new versions of changed rows) go to train or test based on their
+    fingerprint, are preprocessed with the saved preprocessor and appended
+    to the processed datasets. Rows missing from the drop are dropped from
+    the processed datasets. The train median sketches are rebuilt from the
+    rows of the drop while reading it, so removed rows no longer count.
+    When a new category shows up or the train medians drift more than
+    refit_threshold from the fitted ones, the statistics are fitted again
+    and every row preprocessed again, each staying in its split. A full
+    ingest is done instead when there is no manifest, or the datasets were
+    stored in another format or with(out) the unimputed copies.
+    Parameters
+    ----------
+    housing_path : str
+        Path to the raw housing csv, or to an archive holding it.
+    processed : str
+        Directory of the preprocessed datasets.
+    logger : Logger
+        Logger to log the state while running.
+    fmt : str, optional
+        Storage format of the processed datasets, by default "csv".
+    chunksize : int, optional
+        Rows read at a time, 0 to read the drop at once, by default 0.
+    refit_threshold : float, optional
+        Relative median drift that triggers a refit, by default 0.05.
+    unimputed : bool, optional
+        Also store the splits with missing values kept, by default False.
+    """
+    manifest = IngestManifest.load(processed)
+    paths = {
+        split: processed_paths(processed, split, fmt, unimputed)
+        for split in SPLITS
+    }
+    if (
+        manifest is None
+        or manifest.state["format"] != fmt
+        or manifest.state.get("unimputed", False) != unimputed
+        or not all(
+            os.path.exists(path)
+            for split_paths in paths.values()
+            for path in split_paths.values()
+        )
+    ):
+        logger.info("No ingest manifest for these datasets, full ingest.")
+        _full_ingest_with_manifest(
+            housing_path, processed, chunksize, logger, fmt, unimputed
+        )
+        return
+
+    sketches, categories = {}, set()
+    current, delta, delta_keys, delta_is_test = [], [], [], []
+    for chunk, keys, is_test, is_new in _split_source(
+        housing_path,
+        chunksize,
+        manifest.sorted_keys(),
+        manifest.state["test_size"],
+    ):
+        current.append(keys)
+        train = chunk[~is_test]
+        update_sketches(sketches, train)
+        categories.update(train["ocean_proximity"].dropna().unique())
+        if is_new.any():
+            delta.append(chunk[is_new])
+            delta_keys.append(keys[is_new])
+            delta_is_test.append(is_test[is_new])
+    current = np.sort(np.concatenate(current))
+    retired = {
+        split: ~isin_sorted(manifest.fingerprints[split], current)
+        for split in SPLITS
+    }
+    n_retired = sum(int(mask.sum()) for mask in retired.values())
+    logger.info(
+        f"{sum(len(d) for d in delta)} new or changed rows, "
+        f"{n_retired} rows removed since the last ingest."
+    )
+    if not delta and not n_retired:
+        logger.info("Processed datasets are up to date.")
+        return
+
+    manifest.sketches = sketches
+    drift = manifest.median_drift()
+    new_categories = set()
+    if delta:
+        delta = pd.concat(delta)
+        delta_keys = np.concatenate(delta_keys)
+        is_test = np.concatenate(delta_is_test)
+        new_categories = set(delta["ocean_proximity"].dropna()) - set(
+            manifest.state["categories"]
+        )
+    logger.debug(f"Median drift {drift:.4f}.")
+    if drift > refit_threshold or new_categories:
+        logger.info("Imputation statistics drifted, refit.")
+        _refit_with_manifest(
+            housing_path,
+            processed,
+            manifest,
+            categories,
+            chunksize,
+            logger,
+            fmt,
+            unimputed,
+        )
+        return
+
+    for split, mask in retired.items():
+        if mask.any():
+            for path in paths[split].values():
+                _compact(path, fmt, ~mask, chunksize or 100_000)
+            manifest.fingerprints[split] = manifest.fingerprints[split][~mask]
+
+    if len(delta):
+        preprocessor = load_preprocessor(
+            os.path.join(processed, PREPROCESSOR_FILE)
+        )
+        start = manifest.state["next_index"]
+        delta.index = pd.RangeIndex(start, start + len(delta))
+        manifest.state["next_index"] = start + len(delta)
+        for split, rows in (("train", ~is_test), ("test", is_test)):
+            with ProcessedWriter(
+                preprocessor, paths[split], fmt, append=True
+            ) as writer:
+                writer.write(delta[rows])
+            manifest.fingerprints[split] = np.concatenate(
+                [manifest.fingerprints[split], delta_keys[rows]]
+            )
+            logger.debug(
+                f"Appended {int(rows.sum())} rows to "
+                f"{list(paths[split].values())}."
+            )
+    manifest.save(processed)
+
+
+def run(args: Namespace, logger: Logger) -> None:
+    """Does all the ingesting work (fetching, splitting, preprocessing).
+    Gets called if this module is run standalone.
+    Parameters
+    ----------
+    args : Namespace
+        Commandline arguments from parse_args.
+    logger : Logger
+        Logger to log the state while running.
+    """
+    housing_path = fetch_housing_data(args.url, args.raw, args.sha256)
+    logger.debug(f"Fetched housing data to {housing_path}.")
 
-    test_path = os.path.join(args.processed, "housing_test.csv")
-    test_set.to_csv(test_path)
-    logger.debug(f"Preprocessed test datasets stored at {test_path}.")
+    if args.incremental:
+        run_incremental(
+            housing_path,
+            args.processed,
+            logger,
+            args.format,
+            args.chunksize,
+            args.refit_threshold,
+            args.unimputed,
+        )
+    elif args.chunksize:
+        run_streaming(
+            housing_path,
+            args.processed,
+            args.chunksize,
+            logger,
+            args.format,
+            args.unimputed,
+        )
+    else:
+        run_in_memory(
+            housing_path, args.processed, logger, args.format, args.unimputed
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,350 @@
+"""
+This module contains the manifest kept next to processed datasets by the
+ incremental ingest mode.
+It remembers a key for every raw row already ingested (in the order the
+ rows are stored in the processed train and test sets), the medians the
+ preprocessor was fitted with and quantile sketches of the train rows,
+ so new data drops only need their new or changed rows processed.
+A row's key is the fingerprint of its raw values, mixed with how many
+ identical rows precede it in the source, so duplicated rows are each
+ tracked on their own.
+"""
+import json
+import os
+import pickle
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from house_pricing.sketch import QuantileSketch
+
+MANIFEST_DIR = "ingest_manifest"
+STATE_FILE = "state.json"
+SKETCHES_FILE = "sketches.pkl"
+SPLITS = ("train", "test")
+
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """Hashes every row of a raw dataframe.
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Raw rows.
+    Returns
+    -------
+    np.ndarray
+        uint64 fingerprint per row, independent of the index.
+    """
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def fingerprint_is_test(fingerprints: np.ndarray, test_size: float) -> np.ndarray:
+    """Assigns rows to the test set from their fingerprint alone, so a row
+    always lands in the same split whichever drop it arrives in.
+    Parameters
+    ----------
+    fingerprints : np.ndarray
+        Row fingerprints from :func:`row_fingerprints`.
+    test_size : float
+        Fraction of rows to assign to test.
+    Returns
+    -------
+    np.ndarray
+        True for test rows.
+    """
+    return (fingerprints % np.uint64(10_000)) < int(test_size * 10_000)
+
+
+def occurrence_keys(
+    fingerprints: np.ndarray, occurrences: np.ndarray
+) -> np.ndarray:
+    """Keys rows by fingerprint and occurrence number. The first occurrence
+    of a row is keyed by its fingerprint alone.
+    Parameters
+    ----------
+    fingerprints : np.ndarray
+        Row fingerprints from :func:`row_fingerprints`.
+    occurrences : np.ndarray
+        Number of identical rows before each row, 0 for the first one.
+    Returns
+    -------
+    np.ndarray
+        uint64 key per row.
+    """
+    keys = fingerprints.copy()
+    repeats = occurrences > 0
+    if repeats.any():
+        keys[repeats] = pd.util.hash_pandas_object(
+            pd.DataFrame(
+                {
+                    "fingerprint": fingerprints[repeats],
+                    "occurrence": occurrences[repeats],
+                }
+            ),
+            index=False,
+        ).to_numpy()
+    return keys
+
+
+class RowKeys:
+    """Counts the fingerprints seen so far in a source, to key its rows
+    chunk by chunk with :func:`occurrence_keys`.
+    Rows must be passed in source order.
+    """
+
+    def __init__(self):
+        self.seen = np.empty(0, np.uint64)
+        # counts of the fingerprints seen more than once, usually few
+        self.repeats = pd.Series(dtype=np.int64, index=pd.Index([], np.uint64))
+
+    def update(self, fingerprints: np.ndarray) -> np.ndarray:
+        """Keys the next rows of the source.
+        Parameters
+        ----------
+        fingerprints : np.ndarray
+            Fingerprints of the next rows.
+        Returns
+        -------
+        np.ndarray
+            uint64 key per row.
+        """
+        unique, positions, counts = np.unique(
+            fingerprints, return_inverse=True, return_counts=True
+        )
+        seen = isin_sorted(unique, self.seen)
+        before = seen.astype(np.int64)
+        before[seen] = self.repeats.reindex(unique[seen], fill_value=1)
+        occurrences = (
+            pd.Series(positions).groupby(positions).cumcount().to_numpy()
+            + before[positions]
+        )
+        total = before + counts
+        repeated = total > 1
+        self.repeats = pd.concat(
+            [
+                self.repeats.drop(unique[seen & repeated], errors="ignore"),
+                pd.Series(total[repeated], index=unique[repeated]),
+            ]
+        )
+        new = unique[~seen]
+        self.seen = np.insert(self.seen, np.searchsorted(self.seen, new), new)
+        return occurrence_keys(fingerprints, occurrences)
+
+
+def assign_splits(
+    fingerprints: np.ndarray,
+    keys: np.ndarray,
+    stored: dict[str, np.ndarray],
+    test_size: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Splits source rows: ingested rows stay in the split they are stored
+    in, new rows go by :func:`fingerprint_is_test`.
+    Parameters
+    ----------
+    fingerprints : np.ndarray
+        Row fingerprints from :func:`row_fingerprints`.
+    keys : np.ndarray
+        Row keys from :class:`RowKeys`.
+    stored : dict[str, np.ndarray]
+        Sorted keys of the ingested rows per split, from
+        :meth:`IngestManifest.sorted_keys`.
+    test_size : float
+        Fraction of new rows to assign to test.
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        True for test rows, and True for new rows.
+    """
+    in_test = isin_sorted(keys, stored["test"])
+    is_new = ~in_test & ~isin_sorted(keys, stored["train"])
+    is_test = in_test | (is_new & fingerprint_is_test(fingerprints, test_size))
+    return (is_test, is_new)
+
+
+def isin_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """``np.isin`` for a sorted reference array, without sorting it again.
+    Parameters
+    ----------
+    values : np.ndarray
+        Values to look up.
+    sorted_values : np.ndarray
+        Sorted reference values.
+    Returns
+    -------
+    np.ndarray
+        True where the value is in sorted_values.
+    """
+    if sorted_values.size == 0:
+        return np.zeros(values.shape, dtype=bool)
+    positions = np.searchsorted(sorted_values, values)
+    positions = np.minimum(positions, sorted_values.size - 1)
+    return sorted_values[positions] == values
+
+
+class IngestManifest:
+    """State of the processed datasets for incremental ingest.
+    Parameters
+    ----------
+    fingerprints : dict[str, np.ndarray]
+        Row keys (see :class:`RowKeys`) per split, in the order rows are
+        stored.
+    sketches : dict[str, QuantileSketch]
+        Quantile sketch per numeric column over the raw train rows.
+    state : dict
+        Everything else: "format", "unimputed" (whether the splits are
+        also stored with missing values kept), "test_size", "next_index",
+        "fitted_medians" and "categories".
+    """
+
+    def __init__(
+        self,
+        fingerprints: dict[str, np.ndarray],
+        sketches: dict[str, QuantileSketch],
+        state: dict,
+    ):
+        self.fingerprints = fingerprints
+        self.sketches = sketches
+        self.state = state
+
+    @classmethod
+    def from_splits(
+        cls,
+        splits: Iterable[tuple[pd.DataFrame, pd.DataFrame]],
+        fitted_medians: dict[str, float],
+        categories: list[str],
+        fmt: str,
+        test_size: float = 0.2,
+    ) -> "IngestManifest":
+        """Builds the manifest of a full ingest.
+        Parameters
+        ----------
+        splits : Iterable[tuple[pd.DataFrame, pd.DataFrame]]
+            Raw (train, test) frames, in the order they were stored. The
+            index of the rows is their position in the source.
+        fitted_medians : dict[str, float]
+            Medians the preprocessor was fitted with.
+        categories : list[str]
+            Categories the preprocessor was fitted with.
+        fmt : str
+            Storage format of the processed datasets.
+        test_size : float, optional
+            Fraction of new rows to assign to test, by default 0.2.
+        Returns
+        -------
+        IngestManifest
+            The new manifest.
+        """
+        fingerprints = {split: [] for split in SPLITS}
+        sketches = {}
+        row_keys = RowKeys()
+        n_rows = 0
+        for train, test in splits:
+            # rows are keyed in source order, whatever order they are stored in
+            rows = pd.concat([train, test]).sort_index()
+            keys = pd.Series(
+                row_keys.update(row_fingerprints(rows)), index=rows.index
+            )
+            fingerprints["train"].append(keys[train.index].to_numpy())
+            fingerprints["test"].append(keys[test.index].to_numpy())
+            update_sketches(sketches, train)
+            n_rows += len(train) + len(test)
+        fingerprints = {
+            split: np.concatenate(parts) if parts else np.empty(0, np.uint64)
+            for split, parts in fingerprints.items()
+        }
+        state = {
+            "format": fmt,
+            "test_size": test_size,
+            "next_index": n_rows,
+            "fitted_medians": fitted_medians,
+            "categories": list(categories),
+        }
+        return cls(fingerprints, sketches, state)
+
+    @classmethod
+    def load(cls, processed: str) -> Optional["IngestManifest"]:
+        """Loads the manifest stored next to processed datasets.
+        Parameters
+        ----------
+        processed : str
+            Directory of the processed datasets.
+        Returns
+        -------
+        Optional[IngestManifest]
+            The manifest, None if there is none.
+        """
+        directory = os.path.join(processed, MANIFEST_DIR)
+        if not os.path.isfile(os.path.join(directory, STATE_FILE)):
+            return None
+        with open(os.path.join(directory, STATE_FILE)) as file:
+            state = json.load(file)
+        with open(os.path.join(directory, SKETCHES_FILE), "rb") as file:
+            sketches = pickle.load(file)
+        fingerprints = {
+            split: np.load(os.path.join(directory, f"{split}.npy"))
+            for split in SPLITS
+        }
+        return cls(fingerprints, sketches, state)
+
+    def save(self, processed: str) -> None:
+        """Saves the manifest next to processed datasets.
+        Parameters
+        ----------
+        processed : str
+            Directory of the processed datasets.
+        """
+        directory = os.path.join(processed, MANIFEST_DIR)
+        os.makedirs(directory, exist_ok=True)
+        for split in SPLITS:
+            np.save(os.path.join(directory, f"{split}.npy"), self.fingerprints[split])
+        with open(os.path.join(directory, SKETCHES_FILE), "wb") as file:
+            pickle.dump(self.sketches, file)
+        # state last: a manifest without state is ignored by load
+        with open(os.path.join(directory, STATE_FILE), "w") as file:
+            json.dump(self.state, file, indent=2)
+
+    def sorted_keys(self) -> dict[str, np.ndarray]:
+        """Sorted keys of the ingested rows per split.
+        Returns
+        -------
+        dict[str, np.ndarray]
+            Sorted uint64 keys per split.
+        """
+        return {split: np.sort(self.fingerprints[split]) for split in SPLITS}
+
+    def median_drift(self) -> float:
+        """Largest relative change between the fitted medians and the medians
+        of the sketched train rows.
+        Returns
+        -------
+        float
+            max over columns of ``|current - fitted| / |fitted|``.
+        """
+        drift = 0.0
+        for column, fitted in self.state["fitted_medians"].items():
+            current = self.sketches[column].median()
+            scale = abs(fitted) if fitted else 1.0
+            drift = max(drift, abs(current - fitted) / scale)
+        return drift
+
+
+def update_sketches(
+    sketches: dict[str, QuantileSketch], df: pd.DataFrame
+) -> dict[str, QuantileSketch]:
+    """Adds the numeric columns of raw rows to per-column sketches.
+    Parameters
+    ----------
+    sketches : dict[str, QuantileSketch]
+        Sketch per column, missing ones are created.
+    df : pd.DataFrame
+        Raw rows.
+    Returns
+    -------
+    dict[str, QuantileSketch]
+        The updated sketches.
+    """
+    for column in df.columns:
+        if column != "ocean_proximity":
+            sketches.setdefault(column, QuantileSketch()).update(df[column])
+    return sketches
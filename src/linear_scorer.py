@@ -0,0 +1,153 @@
+"""
+This module contains a compiled scorer for fitted linear models.
+The coefficients, intercept and feature order are extracted once, so a
+ prediction is a single dot product: no dataframe, no ``drop`` of the
+ label, no feature-name or dtype validation per call. Single rows are
+ scored from a dict of feature values or a NumPy row; batches are written
+ into a caller-supplied output buffer. Batches are computed in the dtype
+ of the model's coefficients (float32 for models fitted on the processed
+ datasets), exactly like scikit-learn, so their predictions are
+ bit-identical. Rows of that dtype are multiplied in place, others are cast
+ chunk by chunk into a work buffer the scorer allocates once, so a batch
+ allocates nothing either way. Rows given as dicts are summed in float64,
+ which only differs from the model's in the last float32 digits.
+"""
+import operator
+from typing import Optional
+
+import numpy as np
+
+# rows cast at once to the coefficients' dtype, the work buffer stays in
+# the L2 cache
+CHUNK_ROWS = 4096
+
+
+class LinearScorer:
+    """Linear model reduced to its coefficients.
+    Use :func:`compile_linear` to build it from a fitted model. The work
+    buffer is shared, so one scorer should not predict batches of another
+    dtype than its own from several threads at once.
+    Parameters
+    ----------
+    coef : np.ndarray
+        Coefficient of each feature, its dtype is that of the predictions.
+    intercept : float
+        Intercept added to every prediction.
+    feature_names : list[str], optional
+        Feature names in coefficient order, required to score dicts and
+        dataframes by name, by default None.
+    """
+
+    def __init__(
+        self,
+        coef: np.ndarray,
+        intercept: float,
+        feature_names: Optional[list[str]] = None,
+    ):
+        coef = np.asarray(coef)
+        if not np.issubdtype(coef.dtype, np.floating):
+            coef = coef.astype(np.float64)
+        self.coef = np.ascontiguousarray(coef)
+        self.dtype = self.coef.dtype
+        self.intercept = self.dtype.type(intercept)
+        self.feature_names = (
+            None if feature_names is None else [str(f) for f in feature_names]
+        )
+        self.n_features = len(self.coef)
+        # python floats multiply python floats faster than numpy scalars
+        self._coef_list = self.coef.tolist()
+        self._intercept_float = float(intercept)
+        self._work = None
+
+    def predict_row(self, row) -> float:
+        """Predicts a single row.
+        Parameters
+        ----------
+        row : dict or np.ndarray
+            Feature name to value (other keys are ignored), or the feature
+            values in coefficient order.
+        Returns
+        -------
+        float
+            The prediction.
+        """
+        if isinstance(row, dict):
+            if self.feature_names is None:
+                raise ValueError(
+                    "The model was fitted without feature names, rows must "
+                    "be arrays."
+                )
+            values = map(row.__getitem__, self.feature_names)
+            products = map(operator.mul, self._coef_list, values)
+            return sum(products) + self._intercept_float
+        return float(np.dot(row, self.coef) + self.intercept)
+
+    def predict(self, X, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Predicts a batch of rows.
+        Parameters
+        ----------
+        X : array-like
+            2D features in coefficient order, or a dataframe holding the
+            model's feature names.
+        out : np.ndarray, optional
+            C-contiguous buffer of the scorer's dtype, of at least len(X)
+            values, receiving the predictions, allocated if None, by default
+            None.
+        Returns
+        -------
+        np.ndarray
+            The first len(X) values of out.
+        """
+        if hasattr(X, "columns"):
+            X = X[self.feature_names].to_numpy() if self.feature_names else X
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"X has shape {X.shape}, expected {self.n_features} features."
+            )
+        n_rows = len(X)
+        if out is None:
+            out = np.empty(n_rows, dtype=self.dtype)
+        elif out.dtype != self.dtype or not out.flags.c_contiguous:
+            raise ValueError(f"out must be a C-contiguous {self.dtype} array.")
+        elif len(out) < n_rows:
+            raise ValueError(f"out has {len(out)} values for {n_rows} rows.")
+        out = out[:n_rows]
+
+        if X.dtype == self.dtype:
+            np.dot(X, self.coef, out=out)
+        else:
+            if self._work is None:
+                self._work = np.empty((CHUNK_ROWS, self.n_features), self.dtype)
+            for start in range(0, n_rows, CHUNK_ROWS):
+                stop = min(start + CHUNK_ROWS, n_rows)
+                work = self._work[: stop - start]
+                np.copyto(work, X[start:stop])
+                np.dot(work, self.coef, out=out[start:stop])
+        out += self.intercept
+        return out
+
+
+def compile_linear(model) -> LinearScorer:
+    """Extracts the scorer of a fitted single-output linear model, such as
+    the ``LinearRegression`` saved by ``train.save_model``.
+    Parameters
+    ----------
+    model : sklearn.linear_model.LinearRegression
+        Fitted model with ``coef_`` and ``intercept_``.
+    Returns
+    -------
+    LinearScorer
+        Scorer giving the same predictions as the model.
+    """
+    if not hasattr(model, "coef_") or not hasattr(model, "intercept_"):
+        raise TypeError(
+            f"Cannot compile {type(model).__name__}, expected a fitted "
+            "linear model."
+        )
+    coef = np.asarray(model.coef_)
+    if coef.ndim != 1:
+        raise ValueError("Only single-output linear models can be compiled.")
+    return LinearScorer(
+        coef, model.intercept_, getattr(model, "feature_names_in_", None)
+    )
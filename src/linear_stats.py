@@ -0,0 +1,202 @@
+"""
+This module contains an out-of-core fit of ``LinearRegression``.
+Datasets are read chunk by chunk into mergeable sufficient statistics of
+ the least squares problem, so memory is O(features²) whatever the number
+ of rows. The statistic kept is the triangular factor R of the QR
+ decomposition of ``[1, X, y]`` (``R.T @ R`` is the Gram matrix of
+ ``[1, X, y]``, which holds the counts, sums, ``X.T @ X`` and ``X.T @ y``).
+ Unlike the Gram matrix itself, R does not square the condition number,
+ so the solution matches the in-memory fit, rank-deficient one-hot
+ columns included.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+import scipy.linalg
+from joblib import Parallel, delayed
+from sklearn.linear_model import LinearRegression
+
+from house_pricing.dataset_io import (
+    LABEL,
+    is_npy_dataset,
+    iter_dataset,
+    load_arrays,
+    read_manifest,
+)
+
+
+class LinearStats:
+    """Mergeable least squares statistics of ``y ~ 1 + X``.
+    Parameters
+    ----------
+    feature_names : list[str]
+        Names of the feature columns.
+    """
+
+    def __init__(self, feature_names: list[str]):
+        self.feature_names = list(feature_names)
+        self.n_rows = 0
+        self.R = np.zeros((0, len(self.feature_names) + 2))
+
+    def _absorb(self, block: np.ndarray) -> None:
+        stacked = np.vstack([self.R, block])
+        self.R = np.linalg.qr(stacked, mode="r")
+
+    def update(self, X, y) -> "LinearStats":
+        """Adds rows.
+        Parameters
+        ----------
+        X : array-like
+            Features of the rows, columns in feature_names order.
+        y : array-like
+            Labels of the rows.
+        Returns
+        -------
+        LinearStats
+            The statistics themselves.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return self
+        block = np.column_stack(
+            [np.ones(len(X)), X, np.asarray(y, dtype=np.float64)]
+        )
+        self._absorb(block)
+        self.n_rows += len(X)
+        return self
+
+    def merge(self, other: "LinearStats") -> "LinearStats":
+        """Merges statistics of other rows, e.g. computed by another process.
+        Parameters
+        ----------
+        other : LinearStats
+            Statistics over the same features.
+        Returns
+        -------
+        LinearStats
+            The statistics themselves.
+        """
+        if other.feature_names != self.feature_names:
+            raise ValueError("Cannot merge statistics of different features.")
+        self._absorb(other.R)
+        self.n_rows += other.n_rows
+        return self
+
+    def gram(self) -> np.ndarray:
+        """Gram matrix of ``[1, X, y]``.
+        Returns
+        -------
+        np.ndarray
+            ``[[n, sum(X), sum(y)], [., X.T @ X, X.T @ y], [., ., y.T @ y]]``.
+        """
+        return self.R.T @ self.R
+
+    def to_model(self) -> LinearRegression:
+        """Solves the least squares problem like ``LinearRegression.fit``:
+        the minimum-norm solution for the centered features, the intercept
+        from the means.
+        Returns
+        -------
+        LinearRegression
+            Fitted model, usable wherever an in-memory fitted one is.
+        """
+        if self.n_rows == 0:
+            raise ValueError("Cannot fit a linear model on zero rows.")
+        n_features = len(self.feature_names)
+        # first row of R is sqrt(n) times the means, up to a common sign
+        means = self.R[0, 1:] / self.R[0, 0]
+        # the remaining rows are the R factor of the centered [X, y]
+        centered = self.R[1:, 1:]
+        Rxx = centered[:, :n_features]
+        rxy = centered[:, n_features]
+        if Rxx.shape[0] == 0:
+            coef, rank = np.zeros(n_features), 0
+            singular = np.zeros(0)
+        else:
+            cond = np.finfo(np.float64).eps * max(self.n_rows, n_features)
+            coef, _, rank, singular = scipy.linalg.lstsq(
+                Rxx, rxy, cond=cond, lapack_driver="gelsd"
+            )
+
+        model = LinearRegression()
+        model.coef_ = coef
+        model.intercept_ = float(means[n_features] - means[:n_features] @ coef)
+        model.rank_ = int(rank)
+        model.singular_ = singular
+        model.n_features_in_ = n_features
+        model.feature_names_in_ = np.asarray(self.feature_names, dtype=object)
+        return model
+
+
+def fit_chunks(
+    chunks: Iterable[pd.DataFrame], label: str = LABEL
+) -> Optional[LinearStats]:
+    """Accumulates the statistics of dataframe chunks.
+    Parameters
+    ----------
+    chunks : Iterable[pd.DataFrame]
+        Chunks with features and the label column.
+    label : str, optional
+        Label column, by default LABEL.
+    Returns
+    -------
+    Optional[LinearStats]
+        The statistics, None if there were no chunks.
+    """
+    stats = None
+    for chunk in chunks:
+        X = chunk.drop(label, axis=1)
+        if stats is None:
+            stats = LinearStats(list(X.columns))
+        stats.update(X, chunk[label])
+    return stats
+
+
+def _npy_range_stats(
+    path: str, start: int, stop: int, chunksize: int
+) -> LinearStats:
+    X, y, _, features = load_arrays(path)
+    stats = LinearStats(features)
+    for begin in range(start, stop, chunksize):
+        end = min(begin + chunksize, stop)
+        stats.update(X[begin:end], y[begin:end])
+    return stats
+
+
+def stream_linear_stats(
+    path: str, chunksize: int, n_jobs: int = 1
+) -> LinearStats:
+    """Reads a processed dataset chunk by chunk into LinearStats.
+    Row ranges of an "npy" dataset are read by n_jobs processes in parallel
+    and their partial statistics merged; csv files are read sequentially.
+    Parameters
+    ----------
+    path : str
+        Csv file or npy dataset directory, with labels.
+    chunksize : int
+        Rows per chunk.
+    n_jobs : int, optional
+        Worker processes for npy datasets, by default 1.
+    Returns
+    -------
+    LinearStats
+        Statistics of every row.
+    """
+    if not is_npy_dataset(path):
+        stats = fit_chunks(iter_dataset(path, chunksize))
+        if stats is None:
+            raise ValueError(f"No rows in {path}.")
+        return stats
+
+    n_rows = read_manifest(path)["n_rows"]
+    n_parts = max(1, min(n_jobs, -(-n_rows // chunksize)))
+    bounds = np.linspace(0, n_rows, n_parts + 1).astype(int)
+    parts = Parallel(n_jobs=n_parts)(
+        delayed(_npy_range_stats)(path, start, stop, chunksize)
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    )
+    stats = parts[0]
+    for part in parts[1:]:
+        stats.merge(part)
+    return stats
@@ -3,18 +3,46 @@ This module contains helper functions to train models.
 Can be run standalone with commandline arguments for dataset path and models directory.
     """
 import os
-import pickle
+import time
 from argparse import ArgumentParser, Namespace
+from contextlib import ExitStack
 from logging import Logger
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 import sklearn
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import GridSearchCV
 from sklearn.tree import DecisionTreeRegressor
 
+from house_pricing.boosting import search_boosting
+from house_pricing.dataset_io import load_xy, unimputed_path
+from house_pricing.feature_cache import cached_path
 from house_pricing.logger import configure_logger
+from house_pricing.model_io import MODEL_FORMATS, model_path, write_model
+from house_pricing.scheduler import run_concurrently, split_cores
+from house_pricing.schema import memory_report
+from house_pricing.search import STRATEGIES, BudgetedSearchCV
+from house_pricing.search_journal import dataset_hash
+from house_pricing.shared_data import SharedDataset
+from house_pricing.work_queue import WorkQueue, start_workers
+
+FAMILIES = ("linear", "tree", "forest", "boosting")
+# estimated cost of each family in single-tree fits on all rows: the forest
+# grid grows 211 trees per fold, the boosting search takes about a quarter
+# of its time (benchmarks/bench_boosting.py)
+FAMILY_COSTS = {"linear": 1, "tree": 1, "forest": 1055, "boosting": 264}
+FOREST_PARAM_GRID = [
+    # try 12 (3×4) combinations of hyperparameters
+    {"n_estimators": [3, 10, 30], "max_features": [2, 4, 6, 8]},
+    # then try 6 (2×3) combinations with bootstrap set as False
+    {
+        "bootstrap": [False],
+        "n_estimators": [3, 10],
+        "max_features": [2, 3, 4],
+    },
+]
 
 
 def parse_args() -> Namespace:
@@ -24,6 +52,16 @@ def parse_args() -> Namespace:
     arparse.Namespace
         Commandline arguments. Contains keys: ["models": str,
          "dataset": str,
+         "boosting_dataset": str,
+         "n_jobs": int,
+         "search": str,
+         "max_fits": int,
+         "max_time": float,
+         "warm_start": bool,
+         "journal": str,
+         "queue": str,
+         "queue_workers": int,
+         "model_format": str,
          "log_level": str,
          "no_console_log": bool,
          "log_path": str]
@@ -35,7 +73,17 @@ def parse_args() -> Namespace:
         "--dataset",
         type=str,
         default="data/processed/housing_train.csv",
-        help="Path to training dataset csv file.",
+        help="Path to training dataset csv file or npy dataset directory.",
+    )
+
+    parser.add_argument(
+        "--boosting-dataset",
+        type=str,
+        default="",
+        help="Training dataset of the boosting family, which handles "
+        "missing values itself. By default the unimputed copy "
+        "ingest_data.py --unimputed writes beside --dataset (e.g. "
+        "housing_train_unimputed.csv), or --dataset if there is none.",
     )
 
     parser.add_argument(
@@ -46,6 +94,90 @@ def parse_args() -> Namespace:
         help="Directory to store model pickles.",
     )
 
+    parser.add_argument(
+        "-j",
+        "--n-jobs",
+        type=int,
+        default=-1,
+        help="Cores split between the model families and their searches, "
+        "-1 for all cores.",
+    )
+
+    parser.add_argument(
+        "--search",
+        type=str,
+        choices=STRATEGIES,
+        default="grid",
+        help="Full grid search, successive halving on growing subsamples, "
+        "or random search within the --max-time or --max-fits budget that "
+        "abandons candidates whose first folds score clearly worse than "
+        "the best so far.",
+    )
+
+    parser.add_argument(
+        "--max-fits",
+        type=int,
+        default=None,
+        help="Budget of (candidate, fold) fits of the hyperparameter search.",
+    )
+
+    parser.add_argument(
+        "--max-time",
+        type=float,
+        default=None,
+        help="Budget in seconds after which no new search fits start.",
+    )
+
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="Grow each forest across the n_estimators grid instead of "
+        "refitting it for every value.",
+    )
+
+    parser.add_argument(
+        "--journal",
+        type=str,
+        default="",
+        help="Directory journaling completed search fits, so a restarted "
+        "search on the same data and grid resumes where it stopped.",
+    )
+
+    parser.add_argument(
+        "--queue",
+        type=str,
+        default="",
+        help="SQLite file of a work queue the search fits are submitted to. "
+        "Workers started with work_queue.py on the same path, on this host "
+        "or on others, share the fits.",
+    )
+
+    parser.add_argument(
+        "--queue-workers",
+        type=int,
+        default=0,
+        help="Local worker processes to start on the queue.",
+    )
+
+    parser.add_argument(
+        "--model-format",
+        type=str,
+        choices=MODEL_FORMATS,
+        default="pickle",
+        help="Storage format of the models. \"mmap\" models load in "
+        "milliseconds with their arrays memory-mapped. \"flat\" models "
+        "too, with trees and forests stored as flattened predictors, which "
+        "only predict.",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default="",
+        help="Feature cache directory. A csv dataset is converted once to a "
+        "binary copy that later runs on the same file memory-map.",
+    )
+
     parser.add_argument("--log-level", type=str, default="DEBUG")
     parser.add_argument("--no-console-log", action="store_true")
     parser.add_argument("--log-path", type=str, default="")
@@ -53,34 +185,99 @@ def parse_args() -> Namespace:
     return parser.parse_args()
 
 
-def load_data(path: str) -> tuple[pd.DataFrame, pd.Series]:
+def load_data(
+    path: str, logger: Logger = None, cache_dir: Optional[str] = None
+) -> tuple[pd.DataFrame, pd.Series]:
     """Loads dataset and splits features and labels.
     Parameters
     ----------
     path : str
-        Path to training dataset csv file.
+        Path to training dataset csv file or npy dataset directory.
+        Features of npy datasets are memory-mapped, not copied.
+    logger : Logger, optional
+        Logs the memory usage of the features, by default None.
+    cache_dir : str, optional
+        Feature cache directory, see ``feature_cache``. Csv datasets are
+        read from their cached "npy" copy, by default None.
     Returns
     -------
     tuple[pd.DataFrame, pd.Series]
         Index 0 is the training features dataframe.
         Index 1 is the training labels series.
     """
-    df = pd.read_csv(path)
-    y = df["median_house_value"].copy(deep=True)
-    X = df.drop(["median_house_value"], axis=1)
+    X, y = load_xy(cached_path(path, cache_dir))
+    if logger is not None:
+        logger.debug(f"Loaded training features. {memory_report(X)}")
     return (X, y)
 
 
+def share_data(
+    path: str, logger: Logger = None, cache_dir: Optional[str] = None
+) -> SharedDataset:
+    """Maps a dataset into shared memory without keeping a parsed copy.
+    Parameters
+    ----------
+    path : str
+        Path to training dataset csv file or npy dataset directory.
+        Npy datasets are mapped in place, csv datasets streamed into a
+        shared copy.
+    logger : Logger, optional
+        Logs the memory usage of the features, by default None.
+    cache_dir : str, optional
+        Feature cache directory, see ``feature_cache``. Csv datasets are
+        read from their cached "npy" copy, by default None.
+    Returns
+    -------
+    SharedDataset
+        The handle, to be used as a context manager.
+    """
+    data = SharedDataset.from_dataset(cached_path(path, cache_dir))
+    if logger is not None:
+        logger.debug(f"Loaded training features. {memory_report(data.X)}")
+    return data
+
+
+def boosting_dataset_path(args: Namespace) -> str:
+    """Training dataset of the boosting family: --boosting-dataset if
+    given, otherwise the unimputed copy of --dataset if it exists, and
+    --dataset itself if not.
+    Parameters
+    ----------
+    args : Namespace
+        Commandline arguments from parse_args.
+    Returns
+    -------
+    str
+        Path to the dataset.
+    """
+    path = getattr(args, "boosting_dataset", None)
+    if path:
+        return path
+    path = unimputed_path(args.dataset)
+    return path if os.path.exists(path) else args.dataset
+
+
 def save_model(
-    model: sklearn.base.BaseEstimator, dir: str
+    model: sklearn.base.BaseEstimator,
+    dir: str,
+    fmt: str = "pickle",
+    data_hash: Optional[str] = None,
+    imputed: bool = True,
 ) -> tuple[str, str]:
-    """Saves the given model in given directory as pickle file.
+    """Saves the given model in given directory.
     Parameters
     ----------
     model : sklearn.base.BaseEstimator
         Estimator to save.
     dir : str
         Directory to save in.
+    fmt : str, optional
+        One of MODEL_FORMATS, by default "pickle".
+    data_hash : str, optional
+        Hash of the training data, kept in the metadata, by default None.
+    imputed : bool, optional
+        Whether the training features were imputed, kept in the metadata
+        so the model is served features alike, by default True.
     Returns
     -------
     tuple[str, str]
@@ -90,14 +287,127 @@ def save_model(
     os.makedirs(dir, exist_ok=True)
     model_name = type(model).__name__
 
-    path = os.path.join(dir, f"{model_name}.pkl")
-    with open(path, "wb") as file:
-        pickle.dump(model, file)
+    path = model_path(dir, model_name, fmt)
+    write_model(model, path, fmt, data_hash, imputed)
     return (model_name, path)
 
 
+def describe_search(search: BudgetedSearchCV) -> str:
+    """Summarises the fits of a finished search.
+    Parameters
+    ----------
+    search : BudgetedSearchCV
+        Fitted search.
+    Returns
+    -------
+    str
+        Fits made, resumed and avoided by abandoning candidates.
+    """
+    summary = (
+        f"Search made {search.n_fits_} fits "
+        f"({search.n_resumed_} resumed from journal)"
+    )
+    if search.n_aborted_:
+        summary += (
+            f", abandoned {search.n_aborted_} candidates early "
+            f"({search.n_fits_avoided_} fits avoided)"
+        )
+    if search.budget_exhausted_:
+        summary += ", budget exhausted"
+    return summary + "."
+
+
+def fit_family(
+    family: str,
+    data: SharedDataset,
+    args: Namespace,
+    n_jobs: int,
+    data_hash: Optional[str] = None,
+) -> tuple[str, str, str]:
+    """Fits the model (or searches the hyperparameters) of one family and
+    saves it. Runs in a worker process of the scheduler.
+    Parameters
+    ----------
+    family : str
+        One of FAMILIES.
+    data : SharedDataset
+        Training features and labels, unimputed for the boosting family.
+    args : Namespace
+        Commandline arguments from parse_args.
+    n_jobs : int
+        Cores given to the family.
+    data_hash : str, optional
+        Hash of the training data saved with the model, by default None.
+    Returns
+    -------
+    tuple[str, str, str]
+        Index 0 is the name of the model.
+        Index 1 is the path it is saved in.
+        Index 2 describes the search, empty for single fits.
+    """
+    X, y = data.X, data.y
+    details = ""
+    if family == "linear":
+        model = LinearRegression().fit(X, y)
+    elif family == "tree":
+        model = DecisionTreeRegressor(random_state=42).fit(X, y)
+    elif family == "forest":
+        # seeded so a resumed search refits the same best estimator
+        random_forest = RandomForestRegressor(random_state=42)
+        grid_search = BudgetedSearchCV(
+            random_forest,
+            param_grid=FOREST_PARAM_GRID,
+            scoring="neg_mean_squared_error",
+            cv=5,
+            n_jobs=n_jobs,
+            strategy=args.search,
+            max_fits=args.max_fits,
+            max_time=args.max_time,
+            warm_start=args.warm_start,
+            journal=args.journal or None,
+            queue=args.queue or None,
+            return_train_score=True,
+        )
+        grid_search.fit(data)
+        model = grid_search.best_estimator_
+        details = (
+            f"{describe_search(grid_search)} "
+            f"Best parameters: {grid_search.best_params_}."
+        )
+    elif family == "boosting":
+        # every candidate bins the training rows of each of its folds
+        model, boosting_search = search_boosting(
+            data,
+            scoring="neg_mean_squared_error",
+            cv=5,
+            n_jobs=n_jobs,
+            strategy=args.search,
+            max_fits=args.max_fits,
+            max_time=args.max_time,
+            journal=args.journal or None,
+            queue=args.queue or None,
+        )
+        details = (
+            f"{describe_search(boosting_search)} "
+            f"Best parameters: {boosting_search.best_params_}, "
+            f"stopped after {model.n_iter_} rounds."
+        )
+    else:
+        raise ValueError(f"Unknown model family {family!r}, expected {FAMILIES}.")
+    # the boosting family may be trained with missing values kept
+    imputed = not np.isnan(np.asarray(X)).any()
+    model_name, path = save_model(
+        model, args.models, args.model_format, data_hash, imputed
+    )
+    return (model_name, path, details)
+
+
 def run(args: Namespace, logger: Logger) -> None:
     """Runs the whole training process according to given commandline arguments.
+    The model families are fitted concurrently, each in its own process with
+    a share of the cores in proportion to its estimated cost, and saved as
+    soon as they are fitted. The boosting family is trained on the
+    unimputed dataset when one is given.
     Parameters
     ----------
     args : Namespace
@@ -106,42 +416,69 @@ def run(args: Namespace, logger: Logger) -> None:
         Logs the outputs.
     """
     logger.info("Started training.")
+    start = time.perf_counter()
+
+    n_cores = os.cpu_count() if args.n_jobs < 0 else args.n_jobs
+    cores = split_cores(FAMILY_COSTS, n_cores)
+    logger.debug(f"Cores per model family: {cores}.")
+    timings = []
+    # every family maps one shared copy of the data instead of each
+    # receiving a pickled one
+    with ExitStack() as stack:
+        data = stack.enter_context(
+            share_data(args.dataset, logger, args.cache_dir)
+        )
+        datasets = dict.fromkeys(FAMILIES, data)
+        hashes = dict.fromkeys(FAMILIES, dataset_hash(data.X, data.y))
+        boosting_dataset = boosting_dataset_path(args)
+        if boosting_dataset != args.dataset:
+            # boosting handles missing values itself, so it is trained on
+            # the features with missing values kept
+            boosting_data = stack.enter_context(
+                share_data(boosting_dataset, logger, args.cache_dir)
+            )
+            datasets["boosting"] = boosting_data
+            hashes["boosting"] = dataset_hash(boosting_data.X, boosting_data.y)
+        workers = []
+        if args.queue:
+            workers = start_workers(args.queue, args.queue_workers)
+            logger.debug(f"Started {len(workers)} workers on {args.queue}.")
+        jobs = {
+            family: (
+                fit_family,
+                family,
+                datasets[family],
+                args,
+                cores[family],
+                hashes[family],
+            )
+            for family in FAMILIES
+        }
+        for family, (model_name, path, details), seconds in run_concurrently(
+            jobs
+        ):
+            if details:
+                logger.debug(f"{model_name}: {details}")
+            logger.debug(f"{model_name} model saved in {path}.")
+            timings.append((family, model_name, seconds))
+
+    if args.queue:
+        queue = WorkQueue(args.queue)
+        queue.shutdown()
+        queue.close()
+        for worker in workers:
+            worker.join()
 
-    X, y = load_data(args.dataset)
-
-    lr = LinearRegression()
-    lr.fit(X, y)
-    model_name, path = save_model(lr, args.models)
-    logger.debug(f"{model_name} model saved in {path}.")
-
-    dtree = DecisionTreeRegressor(random_state=42)
-    dtree.fit(X, y)
-    model_name, path = save_model(dtree, args.models)
-    logger.debug(f"{model_name} model saved in {path}.")
-
-    random_forest = RandomForestRegressor()
-    param_grid = [
-        # try 12 (3×4) combinations of hyperparameters
-        {"n_estimators": [3, 10, 30], "max_features": [2, 4, 6, 8]},
-        # then try 6 (2×3) combinations with bootstrap set as False
-        {
-            "bootstrap": [False],
-            "n_estimators": [3, 10],
-            "max_features": [2, 3, 4],
-        },
-    ]
-    grid_search = GridSearchCV(
-        random_forest,
-        param_grid=param_grid,
-        scoring="neg_mean_squared_error",
-        cv=5,
-        return_train_score=True,
-    )
-    grid_search.fit(X, y)
-    model_name, path = save_model(grid_search.best_estimator_, args.models)
-    logger.debug(f"{model_name} model saved in {path}.")
-
-    logger.info("Done training.")
+    wall = time.perf_counter() - start
+    summary = "\n".join(
+        f"{family:>10} {cores[family]:>3} cores {seconds:>9.2f} s  {model_name}"
+        for family, model_name, seconds in timings
+    )
+    logger.info(
+        f"Training times (in completion order):\n{summary}\n"
+        f"Done training in {wall:.2f} s "
+        f"({sum(t[2] for t in timings):.2f} s of family fits run concurrently)."
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,262 @@
+"""
+This module contains helper functions to store and load fitted models.
+Four formats are supported:
+ "pickle" - a single pickle file, as written by earlier versions, and its
+ metadata header in a json file beside it ("model.json" for "model.pkl").
+ "mmap" - a directory with the estimator dumped by joblib with every
+ numpy array stored raw and aligned, and a "metadata.json" header with
+ the estimator class, feature names, whether the training features were
+ imputed, a hash of the training data and the library versions. Arrays
+ are memory-mapped when loading, so loading takes milliseconds and
+ processes loading the same model share one page-cache copy of every
+ array the estimator keeps as numpy arrays (coefficients, the nodes of
+ histogram boosting trees). Scikit-learn's decision trees
+ copy their nodes into buffers of their own when loaded, so forests only
+ load faster.
+ "compressed" - the same directory layout with the joblib dump
+ zlib-compressed, smaller on disk but read fully into memory.
+ "flat" - the "mmap" layout, with single-output decision trees and random
+ forests stored as the :class:`~house_pricing.flat_trees.FlatForest`
+ exported from them, which predicts the same values from memory-mapped
+ node arrays. It only predicts: the estimator API (parameters, feature
+ importances, the trees) is not kept. The metadata keeps the class of the
+ fitted estimator, and of the stored predictor under "predictor".
+"""
+import json
+import os
+import pickle
+import platform
+import shutil
+import time
+import warnings
+from typing import Optional
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from house_pricing.flat_trees import flatten
+
+MODEL_FORMATS = ("pickle", "mmap", "compressed", "flat")
+METADATA = "metadata.json"
+ESTIMATOR_FILE = "estimator.joblib"
+FORMAT_VERSION = 1
+COMPRESS = 3
+# names the training runs save models under: train.py's single model and
+# the estimator class of each model family of logger.py
+MODEL_NAMES = (
+    "model",
+    "LinearRegression",
+    "DecisionTreeRegressor",
+    "RandomForestRegressor",
+    "HistGradientBoostingRegressor",
+)
+
+
+def _flat_predictor(model):
+    # scikit-learn's trees would copy their nodes out of the mapped pages
+    if (
+        isinstance(model, (DecisionTreeRegressor, RandomForestRegressor))
+        and model.n_outputs_ == 1
+    ):
+        return flatten(model)
+    return model
+
+
+def model_path(directory: str, name: str, fmt: str = "pickle") -> str:
+    """Builds the path of a model stored in the given format.
+    Parameters
+    ----------
+    directory : str
+        Directory holding the model.
+    name : str
+        Name of the model, e.g. "RandomForestRegressor".
+    fmt : str, optional
+        One of MODEL_FORMATS, by default "pickle".
+    Returns
+    -------
+    str
+        Path of the pickle file or of the model directory.
+    """
+    if fmt not in MODEL_FORMATS:
+        raise ValueError(
+            f"Unknown model format {fmt!r}, expected {MODEL_FORMATS}."
+        )
+    if fmt == "pickle":
+        return os.path.join(directory, f"{name}.pkl")
+    return os.path.join(directory, name)
+
+
+def is_model_dir(path: str) -> bool:
+    """Checks if the given path holds a model in "mmap", "compressed" or
+    "flat" format.
+    Parameters
+    ----------
+    path : str
+        Path to check.
+    Returns
+    -------
+    bool
+        True if path is a directory with a metadata header.
+    """
+    return os.path.isfile(os.path.join(path, METADATA))
+
+
+def metadata_path(path: str) -> str:
+    """Builds the path of the metadata header of a model.
+    Parameters
+    ----------
+    path : str
+        Pickle file or model directory.
+    Returns
+    -------
+    str
+        Header inside the model directory, or beside the pickle file.
+    """
+    if os.path.isdir(path):
+        return os.path.join(path, METADATA)
+    return os.path.splitext(path)[0] + ".json"
+
+
+def read_metadata(path: str) -> dict:
+    """Reads the metadata header of a model, without loading the model.
+    Parameters
+    ----------
+    path : str
+        Pickle file or model directory.
+    Returns
+    -------
+    dict
+        Metadata contents.
+    """
+    with open(metadata_path(path)) as file:
+        return json.load(file)
+
+
+def model_metadata(
+    model, data_hash: Optional[str] = None, imputed: bool = True
+) -> dict:
+    """Describes a fitted model.
+    Parameters
+    ----------
+    model : sklearn.base.BaseEstimator
+        Fitted estimator.
+    data_hash : str, optional
+        Hash of the training data, e.g. from
+        ``search_journal.dataset_hash``, by default None.
+    imputed : bool, optional
+        Whether the missing values of the training features were imputed,
+        so predictions need imputed features too, by default True.
+    Returns
+    -------
+    dict
+        Estimator class, feature names, imputation, data hash and library
+        versions.
+    """
+    feature_names = getattr(model, "feature_names_in_", None)
+    return {
+        "format_version": FORMAT_VERSION,
+        "estimator": f"{type(model).__module__}.{type(model).__qualname__}",
+        "n_features": getattr(model, "n_features_in_", None),
+        "feature_names": (
+            None if feature_names is None else [str(f) for f in feature_names]
+        ),
+        "imputed": imputed,
+        "data_hash": data_hash,
+        "sklearn_version": sklearn.__version__,
+        "numpy_version": np.__version__,
+        "python_version": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_model(
+    model,
+    path: str,
+    fmt: str = "mmap",
+    data_hash: Optional[str] = None,
+    imputed: bool = True,
+) -> None:
+    """Stores a fitted model in the given format. Directories are written
+    next to path and renamed into place, so readers never see a partial
+    model. In "flat" format, trees and forests are stored flattened, see
+    the module docstring.
+    Parameters
+    ----------
+    model : sklearn.base.BaseEstimator
+        Fitted estimator.
+    path : str
+        Pickle file or model directory, see :func:`model_path`.
+    fmt : str, optional
+        One of MODEL_FORMATS, by default "mmap".
+    data_hash : str, optional
+        Hash of the training data stored in the metadata, by default None.
+    imputed : bool, optional
+        Whether the training features were imputed, stored in the
+        metadata, by default True.
+    """
+    if fmt not in MODEL_FORMATS:
+        raise ValueError(
+            f"Unknown model format {fmt!r}, expected {MODEL_FORMATS}."
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    metadata = model_metadata(model, data_hash, imputed)
+    if fmt == "pickle":
+        with open(path, "wb") as file:
+            pickle.dump(model, file)
+        with open(metadata_path(path), "w") as file:
+            json.dump(metadata, file, indent=2)
+        return
+
+    metadata["compress"] = COMPRESS if fmt == "compressed" else 0
+    if fmt == "flat":
+        model = _flat_predictor(model)
+    metadata["predictor"] = f"{type(model).__module__}.{type(model).__qualname__}"
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    joblib.dump(
+        model,
+        os.path.join(tmp_path, ESTIMATOR_FILE),
+        compress=metadata["compress"],
+    )
+    with open(os.path.join(tmp_path, METADATA), "w") as file:
+        json.dump(metadata, file, indent=2)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+def read_model(path: str, mmap_mode: Optional[str] = "r"):
+    """Loads a model stored in any of MODEL_FORMATS.
+    Warns if it was written by another scikit-learn version.
+    Parameters
+    ----------
+    path : str
+        Pickle file (read with joblib, so joblib dumps work too) or model
+        directory.
+    mmap_mode : str, optional
+        Memory-map mode of the arrays of uncompressed model directories,
+        None reads them into memory, by default "r".
+    Returns
+    -------
+    sklearn.base.BaseEstimator
+        The fitted estimator, or the FlatForest stored for trees and
+        forests in "flat" format.
+    """
+    if not is_model_dir(path):
+        return joblib.load(path)
+    metadata = read_metadata(path)
+    if metadata["sklearn_version"] != sklearn.__version__:
+        warnings.warn(
+            f"Model {path} was written with scikit-learn "
+            f"{metadata['sklearn_version']}, loading it with "
+            f"{sklearn.__version__}.",
+            UserWarning,
+        )
+    return joblib.load(
+        os.path.join(path, ESTIMATOR_FILE),
+        mmap_mode=None if metadata["compress"] else mmap_mode,
+    )
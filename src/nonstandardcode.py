@@ -1,41 +1,51 @@
+import hashlib
+import logging
 import os
-import tarfile
 
 import matplotlib as mpl  # noqa
 import matplotlib.pyplot as plt  # noqa
 import numpy as np
 import pandas as pd
 from scipy.stats import randint
-from six import urllib
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.impute import SimpleImputer
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from sklearn.model_selection import (
     GridSearchCV,
-    RandomizedSearchCV,
     StratifiedShuffleSplit,
     train_test_split,
 )
 from sklearn.tree import DecisionTreeRegressor
 
+from house_pricing.data_cache import cached_fetch, open_csv_member
+from house_pricing.dataset_io import LABEL, load_xy
+from house_pricing.feature_cache import FeatureCache, source_digest
+from house_pricing.search import BudgetedSearchCV
+from house_pricing.schema import memory_report, read_raw_csv
+from house_pricing.shared_data import SharedDataset
+
 DOWNLOAD_ROOT = "https://raw.githubusercontent.com/ageron/handson-ml/master/"
 HOUSING_PATH = os.path.join("datasets", "housing")
 HOUSING_URL = DOWNLOAD_ROOT + "datasets/housing/housing.tgz"
+FEATURE_CACHE_PATH = os.path.join("datasets", "features")
+
+logger = logging.getLogger(__name__)
 
 
-def fetch_housing_data(housing_url=HOUSING_URL, housing_path=HOUSING_PATH):
-    os.makedirs(housing_path, exist_ok=True)
-    tgz_path = os.path.join(housing_path, "housing.tgz")
-    urllib.request.urlretrieve(housing_url, tgz_path)
-    housing_tgz = tarfile.open(tgz_path)
-    housing_tgz.extractall(path=housing_path)
-    housing_tgz.close()
+def fetch_housing_data(
+    housing_url=HOUSING_URL, housing_path=HOUSING_PATH, sha256=None
+):
+    # cached by url and checksum; file:// urls and local paths are used as-is
+    return cached_fetch(housing_url, housing_path, sha256)
 
 
-def load_housing_data(housing_path=HOUSING_PATH):
-    csv_path = os.path.join(housing_path, "housing.csv")
-    return pd.read_csv(csv_path)
+def load_housing_data(housing_path=HOUSING_PATH, housing_url=HOUSING_URL):
+    # housing.csv is parsed straight out of the archive, nothing is extracted
+    with open_csv_member(fetch_housing_data(housing_url, housing_path)) as file:
+        housing = read_raw_csv(file)
+    logger.info(f"Loaded housing data. {memory_report(housing)}")
+    return housing
 
 
 housing = load_housing_data
@@ -98,19 +108,57 @@ imputer = SimpleImputer(strategy="median")
 housing_num = housing.drop("ocean_proximity", axis=1)
 
 imputer.fit(housing_num)
-X = imputer.transform(housing_num)
 
-housing_tr = pd.DataFrame(X, columns=housing_num.columns, index=housing.index)
-housing_tr["rooms_per_household"] = housing_tr["total_rooms"] / housing_tr["households"]
-housing_tr["bedrooms_per_room"] = (
-    housing_tr["total_bedrooms"] / housing_tr["total_rooms"]
-)
-housing_tr["population_per_household"] = (
-    housing_tr["population"] / housing_tr["households"]
-)
 
-housing_cat = housing[["ocean_proximity"]]
-housing_prepared = housing_tr.join(pd.get_dummies(housing_cat, drop_first=True))
+def prepare_housing(data, imputer):
+    # imputation, ratio features and dummies, the same for train and test
+    num = data.drop("ocean_proximity", axis=1)
+    prepared = pd.DataFrame(
+        imputer.transform(num), columns=num.columns, index=data.index
+    )
+    prepared["rooms_per_household"] = prepared["total_rooms"] / prepared["households"]
+    prepared["bedrooms_per_room"] = (
+        prepared["total_bedrooms"] / prepared["total_rooms"]
+    )
+    prepared["population_per_household"] = (
+        prepared["population"] / prepared["households"]
+    )
+    return prepared.join(
+        pd.get_dummies(data[["ocean_proximity"]], drop_first=True)
+    )
+
+
+def preparation_config(data, imputer, name):
+    # everything the prepared set depends on besides the archive: its rows,
+    # the fitted imputer and the preparation code, so changing any of them
+    # misses the cache instead of reading stale features
+    return {
+        "set": name,
+        "rows": hashlib.sha256(data.index.to_numpy().tobytes()).hexdigest(),
+        "imputer": {
+            "strategy": imputer.strategy,
+            "features": [str(f) for f in imputer.feature_names_in_],
+            "statistics": imputer.statistics_.tolist(),
+        },
+        "code": source_digest(prepare_housing, load_prepared),
+    }
+
+
+def load_prepared(data, name):
+    # keyed on the housing archive, so later runs on the same data load the
+    # prepared features and labels from the cache instead of preparing them
+    def prepare(_):
+        features = prepare_housing(data.drop(LABEL, axis=1), imputer)
+        return features.assign(**{LABEL: data[LABEL]})
+
+    cache = FeatureCache(FEATURE_CACHE_PATH)
+    path = cache.prepared(
+        fetch_housing_data(), prepare, preparation_config(data, imputer, name)
+    )
+    return load_xy(path)
+
+
+housing_prepared, housing_labels = load_prepared(strat_train_set, "train")
 
 
 lin_reg = LinearRegression()
@@ -135,24 +183,35 @@ tree_rmse = np.sqrt(tree_mse)
 tree_rmse
 
 
+# one shared copy of the training data, mapped by every search worker
+shared = SharedDataset.create(housing_prepared, housing_labels)
+
 param_distribs = {
     "n_estimators": randint(low=1, high=200),
     "max_features": randint(low=1, high=8),
 }
 
 forest_reg = RandomForestRegressor(random_state=42)
-rnd_search = RandomizedSearchCV(
+# samples candidates for a minute instead of a fixed 10, dropping those
+# whose first folds already score clearly worse than the best so far
+rnd_search = BudgetedSearchCV(
     forest_reg,
-    param_distributions=param_distribs,
-    n_iter=10,
-    cv=5,
+    param_distribs,
     scoring="neg_mean_squared_error",
+    cv=5,
+    n_jobs=-1,
+    strategy="random",
+    max_time=60,
     random_state=42,
 )
-rnd_search.fit(housing_prepared, housing_labels)
+rnd_search.fit(shared)
 cvres = rnd_search.cv_results_
 for mean_score, params in zip(cvres["mean_test_score"], cvres["params"]):
     print(np.sqrt(-mean_score), params)
+print(
+    f"{rnd_search.n_aborted_} candidates abandoned early, "
+    f"{rnd_search.n_fits_avoided_} fits avoided"
+)
 
 
 param_grid = [
@@ -170,8 +229,10 @@ grid_search = GridSearchCV(
     cv=5,
     scoring="neg_mean_squared_error",
     return_train_score=True,
+    n_jobs=-1,
 )
-grid_search.fit(housing_prepared, housing_labels)
+grid_search.fit(shared.X, shared.y)
+shared.close()
 
 grid_search.best_params_
 cvres = grid_search.cv_results_
@@ -184,26 +245,7 @@ sorted(zip(feature_importances, housing_prepared.columns), reverse=True)
 
 final_model = grid_search.best_estimator_
 
-X_test = strat_test_set.drop("median_house_value", axis=1)
-y_test = strat_test_set["median_house_value"].copy()
-
-X_test_num = X_test.drop("ocean_proximity", axis=1)
-X_test_prepared = imputer.transform(X_test_num)
-X_test_prepared = pd.DataFrame(
-    X_test_prepared, columns=X_test_num.columns, index=X_test.index
-)
-X_test_prepared["rooms_per_household"] = (
-    X_test_prepared["total_rooms"] / X_test_prepared["households"]
-)
-X_test_prepared["bedrooms_per_room"] = (
-    X_test_prepared["total_bedrooms"] / X_test_prepared["total_rooms"]
-)
-X_test_prepared["population_per_household"] = (
-    X_test_prepared["population"] / X_test_prepared["households"]
-)
-
-X_test_cat = X_test[["ocean_proximity"]]
-X_test_prepared = X_test_prepared.join(pd.get_dummies(X_test_cat, drop_first=True))
+X_test_prepared, y_test = load_prepared(strat_test_set, "test")
 
 
 final_predictions = final_model.predict(X_test_prepared)
@@ -0,0 +1,226 @@
+"""
+This module contains a fitted, array-native preprocessor for housing data.
+It produces the same columns as ``ingest_data.pre_process_data``, but learns
+ the medians and "ocean_proximity" categories once and then preprocesses any
+ batch of raw rows in a single pass into a preallocated float matrix.
+"""
+import pickle
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from house_pricing.schema import FEATURE_DTYPE
+
+LABEL = "median_house_value"
+CATEGORICAL = "ocean_proximity"
+RATIOS = (
+    ("rooms_per_household", "total_rooms", "households"),
+    ("bedrooms_per_room", "total_bedrooms", "total_rooms"),
+    ("population_per_household", "population", "households"),
+)
+
+
+class HousingPreprocessor:
+    """Imputes missing values with medians, one-hot encodes
+    "ocean_proximity" and appends the ratio features.
+
+    Output layout: numeric columns in input order, one column per learned
+    category, then the ratio columns. The label is left out of
+    :meth:`transform` and kept in place by :meth:`transform_frame`.
+
+    Parameters
+    ----------
+    label : str, optional
+        Label column, by default LABEL.
+    categorical : str, optional
+        Categorical column to one-hot encode, by default CATEGORICAL.
+    dtype : type, optional
+        dtype of the output matrix, by default FEATURE_DTYPE.
+    """
+
+    def __init__(
+        self,
+        label: str = LABEL,
+        categorical: str = CATEGORICAL,
+        dtype: type = FEATURE_DTYPE,
+    ):
+        self.label = label
+        self.categorical = categorical
+        self.dtype = dtype
+
+    def fit(self, df: pd.DataFrame) -> "HousingPreprocessor":
+        """Learns per-column medians and the category vocabulary.
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Raw training data.
+        Returns
+        -------
+        HousingPreprocessor
+            The fitted preprocessor.
+        """
+        numeric = [c for c in df.columns if c != self.categorical]
+        values = df[numeric].to_numpy(dtype=float, na_value=np.nan)
+        medians = np.nanmedian(values, axis=0)
+        categories = sorted(df[self.categorical].dropna().unique())
+        return self._set_statistics(numeric, medians, categories)
+
+    @classmethod
+    def from_statistics(
+        cls,
+        medians: dict[str, float],
+        categories: list[str],
+        label: str = LABEL,
+        categorical: str = CATEGORICAL,
+    ) -> "HousingPreprocessor":
+        """Builds a fitted preprocessor from precomputed statistics,
+        e.g. medians estimated out of core.
+        Parameters
+        ----------
+        medians : dict[str, float]
+            Median per numeric column, in input column order.
+        categories : list[str]
+            Category vocabulary of the categorical column.
+        label : str, optional
+            Label column, by default LABEL.
+        categorical : str, optional
+            Categorical column, by default CATEGORICAL.
+        Returns
+        -------
+        HousingPreprocessor
+            The fitted preprocessor.
+        """
+        preprocessor = cls(label, categorical)
+        return preprocessor._set_statistics(
+            list(medians),
+            np.array(list(medians.values()), dtype=float),
+            list(categories),
+        )
+
+    def _set_statistics(
+        self, numeric: list[str], medians: np.ndarray, categories: list
+    ) -> "HousingPreprocessor":
+        self.numeric_columns_ = numeric
+        self.medians_ = medians
+        self.categories_ = categories
+        # the index keeps its hash table, so lookups are cheap on small batches
+        self.category_index_ = pd.Index(categories)
+        dummies = [f"{self.categorical}_{c}" for c in categories]
+        ratios = [name for name, _, _ in RATIOS]
+        self.columns_ = numeric + dummies + ratios
+        self.feature_names_ = [c for c in self.columns_ if c != self.label]
+        return self
+
+    def transform(
+        self,
+        df: pd.DataFrame,
+        out: Optional[np.ndarray] = None,
+        with_label: bool = False,
+        impute: bool = True,
+    ) -> np.ndarray:
+        """Preprocesses raw rows into a float matrix.
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Raw rows, the label column is optional.
+        out : np.ndarray, optional
+            Preallocated C-contiguous output of shape
+            (len(df), number of columns), by default None.
+        with_label : bool, optional
+            Keep the label column in the output, by default False.
+        impute : bool, optional
+            Fill missing values with the medians. Otherwise they stay NaN,
+            as do the ratios computed from them, for models that handle
+            them natively. By default True.
+        Returns
+        -------
+        np.ndarray
+            Matrix with columns ``columns_`` if with_label is set,
+            else ``feature_names_``.
+        """
+        columns = self.columns_ if with_label else self.feature_names_
+        numeric = [c for c in self.numeric_columns_ if c in columns]
+        if out is None:
+            out = np.empty((len(df), len(columns)), dtype=self.dtype)
+
+        n_numeric = len(numeric)
+        block = out[:, :n_numeric]
+        for j, column in enumerate(numeric):
+            block[:, j] = df[column].to_numpy(dtype=float, na_value=np.nan)
+
+        rows, cols = np.nonzero(np.isnan(block))
+        if impute and rows.size:
+            medians = self.medians_[
+                [self.numeric_columns_.index(c) for c in numeric]
+            ]
+            block[rows, cols] = medians[cols]
+
+        n_dummies = len(self.categories_)
+        onehot = out[:, n_numeric : n_numeric + n_dummies]
+        onehot[:] = 0.0
+        codes = self.category_index_.get_indexer(df[self.categorical])
+        known = np.flatnonzero(codes >= 0)
+        onehot[known, codes[known]] = 1.0
+
+        position = {c: j for j, c in enumerate(numeric)}
+        for k, (_, numerator, denominator) in enumerate(RATIOS):
+            np.divide(
+                block[:, position[numerator]],
+                block[:, position[denominator]],
+                out=out[:, n_numeric + n_dummies + k],
+            )
+        return out
+
+    def transform_frame(
+        self, df: pd.DataFrame, impute: bool = True
+    ) -> pd.DataFrame:
+        """Preprocesses raw rows into a dataframe laid out like
+        ``ingest_data.pre_process_data`` output.
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Raw rows, the label column is optional.
+        impute : bool, optional
+            Fill missing values with the medians, by default True.
+        Returns
+        -------
+        pd.DataFrame
+            Preprocessed rows, same index as df.
+        """
+        with_label = self.label in df.columns
+        columns = self.columns_ if with_label else self.feature_names_
+        return pd.DataFrame(
+            self.transform(df, with_label=with_label, impute=impute),
+            columns=columns,
+            index=df.index,
+            copy=False,
+        )
+
+
+def save_preprocessor(preprocessor: HousingPreprocessor, path: str) -> None:
+    """Saves a fitted preprocessor as pickle file.
+    Parameters
+    ----------
+    preprocessor : HousingPreprocessor
+        Preprocessor to save.
+    path : str
+        Path of the pickle file.
+    """
+    with open(path, "wb") as file:
+        pickle.dump(preprocessor, file)
+
+
+def load_preprocessor(path: str) -> HousingPreprocessor:
+    """Loads a preprocessor saved by :func:`save_preprocessor`.
+    Parameters
+    ----------
+    path : str
+        Path of the pickle file.
+    Returns
+    -------
+    HousingPreprocessor
+        The fitted preprocessor.
+    """
+    with open(path, "rb") as file:
+        return pickle.load(file)
@@ -0,0 +1,77 @@
+"""
+This module contains a scheduler running independent jobs concurrently in
+ a process pool.
+The cores are split between the jobs according to their estimated cost, so
+ cheap jobs get one core and finish right away while expensive ones get the
+ rest for their own parallelism. Results are handed back as each job
+ finishes, together with its wall time.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from typing import Callable, Iterator
+
+from joblib.externals.loky import get_reusable_executor
+
+
+def split_cores(costs: dict[str, float], n_cores: int) -> dict[str, int]:
+    """Splits cores between jobs in proportion to their costs, at least one
+    each.
+    Parameters
+    ----------
+    costs : dict[str, float]
+        Estimated cost per job, in any common unit.
+    n_cores : int
+        Cores to split.
+    Returns
+    -------
+    dict[str, int]
+        Cores per job. They add up to n_cores unless there are more jobs
+        than cores.
+    """
+    cores = {name: 1 for name in costs}
+    spare = n_cores - len(costs)
+    total = sum(costs.values())
+    if spare <= 0 or total <= 0:
+        return cores
+    shares = {name: spare * cost / total for name, cost in costs.items()}
+    for name, share in shares.items():
+        cores[name] += int(share)
+    # the cores left by rounding down go to the largest remainders
+    left = n_cores - sum(cores.values())
+    for name in sorted(shares, key=lambda n: int(shares[n]) - shares[n])[:left]:
+        cores[name] += 1
+    return cores
+
+
+def _timed(func: Callable, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    # otherwise idle joblib workers started by the job keep this process
+    # from exiting, and the pool from closing, for their 300 s timeout
+    get_reusable_executor().shutdown(wait=True)
+    return result, seconds
+
+
+def run_concurrently(jobs: dict[str, tuple]) -> Iterator[tuple]:
+    """Runs every job in its own process.
+    Parameters
+    ----------
+    jobs : dict[str, tuple]
+        Module-level function and its arguments per job name.
+    Yields
+    ------
+    tuple
+        Job name, its result and its wall time in seconds, as the jobs
+        finish.
+    """
+    # spawned, so workers do not inherit threads of the parent's pools
+    context = get_context("spawn")
+    with ProcessPoolExecutor(len(jobs), mp_context=context) as pool:
+        futures = {
+            pool.submit(_timed, *job): name for name, job in jobs.items()
+        }
+        for future in as_completed(futures):
+            result, seconds = future.result()
+            yield futures[future], result, seconds
@@ -0,0 +1,133 @@
+"""
+This module contains the housing dataset schema shared by all loaders.
+Features are stored as float32, "ocean_proximity" as a categorical and the
+ integer counts of the raw data as nullable integers, which takes several
+ times less memory than the float64/object columns read_csv infers.
+"ocean_proximity" values outside the known categories are kept as extra
+ categories, with a warning, so that downstream code can learn them.
+"""
+import sys
+import warnings
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+FEATURE_DTYPE = np.float32
+OCEAN_CATEGORIES = ["<1H OCEAN", "INLAND", "ISLAND", "NEAR BAY", "NEAR OCEAN"]
+OCEAN_PROXIMITY = pd.CategoricalDtype(OCEAN_CATEGORIES)
+RAW_DTYPES = {
+    "longitude": "float32",
+    "latitude": "float32",
+    "housing_median_age": "Int16",
+    "total_rooms": "Int32",
+    "total_bedrooms": "Int32",
+    "population": "Int32",
+    "households": "Int32",
+    "median_income": "float32",
+    "median_house_value": "float32",
+    # read as plain categories: a fixed dtype would turn new values into NaN
+    "ocean_proximity": "category",
+}
+
+
+def processed_dtypes(columns: list[str]) -> dict[str, type]:
+    """dtypes of processed datasets, where every column is a float feature.
+    Parameters
+    ----------
+    columns : list[str]
+        Columns of the processed dataset.
+    Returns
+    -------
+    dict[str, type]
+        FEATURE_DTYPE for every column.
+    """
+    return {column: FEATURE_DTYPE for column in columns}
+
+
+def read_raw_csv(file, **kwargs) -> pd.DataFrame:
+    """Reads raw housing csv data with the compact schema.
+    Parameters
+    ----------
+    file : str or file-like
+        Raw csv path or open file.
+    **kwargs
+        Passed on to ``pd.read_csv``, e.g. chunksize.
+    Returns
+    -------
+    pd.DataFrame
+        Raw housing data, or an iterator of chunks if chunksize is given.
+        "ocean_proximity" has the known categories, then any unknown one.
+    """
+    data = pd.read_csv(file, dtype=RAW_DTYPES, **kwargs)
+    if isinstance(data, pd.DataFrame):
+        return _check_categories(data, set())
+    return _check_chunks(data)
+
+
+def _check_chunks(chunks) -> Iterator[pd.DataFrame]:
+    warned = set()
+    for chunk in chunks:
+        yield _check_categories(chunk, warned)
+
+
+def _check_categories(df: pd.DataFrame, warned: set) -> pd.DataFrame:
+    """Puts the known "ocean_proximity" categories first, and warns about
+    unknown ones not in warned (updated) instead of losing them."""
+    if "ocean_proximity" not in df:
+        return df
+    column = df["ocean_proximity"]
+    unknown = sorted(set(column.cat.categories) - set(OCEAN_CATEGORIES))
+    new = [category for category in unknown if category not in warned]
+    if new:
+        warnings.warn(
+            f"Unknown ocean_proximity categories {new}, kept as new "
+            "categories.",
+            UserWarning,
+        )
+        warned.update(new)
+    df["ocean_proximity"] = column.cat.set_categories(OCEAN_CATEGORIES + unknown)
+    return df
+
+
+def default_memory_usage(df: pd.DataFrame) -> int:
+    """Estimates the memory the dataframe would take with read_csv's default
+    dtypes: 8 bytes per number and one Python string per categorical value.
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe read with the compact schema.
+    Returns
+    -------
+    int
+        Estimated size in bytes.
+    """
+    total = df.index.memory_usage()
+    for column in df.columns:
+        series = df[column]
+        total += 8 * len(series)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            counts = series.value_counts()
+            total += sum(sys.getsizeof(v) * n for v, n in counts.items())
+    return int(total)
+
+
+def memory_report(df: pd.DataFrame) -> str:
+    """Describes the memory usage of a dataframe before (default dtypes,
+    estimated) and after applying the compact schema.
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe read with the compact schema.
+    Returns
+    -------
+    str
+        Human readable summary.
+    """
+    after = df.memory_usage(deep=True).sum()
+    before = default_memory_usage(df)
+    return (
+        f"{len(df)} rows: {before / 2**20:.1f} MiB with default dtypes, "
+        f"{after / 2**20:.1f} MiB with housing schema "
+        f"({before / max(after, 1):.1f}x smaller)."
+    )
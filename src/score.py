@@ -1,11 +1,26 @@
 import argparse
 import logging
 import os
+import time
 
-import joblib
 import numpy as np
 import pandas as pd
-from sklearn.metrics import mean_squared_error
+from joblib import Parallel, delayed
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+from house_pricing.dataset_io import LABEL, iter_dataset, read_dataset
+from house_pricing.feature_cache import cached_path
+from house_pricing.model_io import (
+    MODEL_NAMES,
+    is_model_dir,
+    read_metadata,
+    read_model,
+)
+from house_pricing.schema import memory_report
+from house_pricing.shared_data import SharedDataset
+
+# single rows predicted one at a time to measure the latency of a request
+LATENCY_ROWS = 50
 
 
 def setup_logging(log_level, log_file, console):
@@ -31,30 +46,44 @@ def setup_logging(log_level, log_file, console):
 
 def load_model(model_path):
     """
-    Load a model from a file.
+    Load a model from a pickle file or a model directory.
+
+    Arrays of "mmap" and "flat" model directories are memory-mapped, so
+    processes scoring with the same model share them.
 
     Parameters:
-    - model_path (str): Path to the model file.
+    - model_path (str): Path to the model file or directory.
 
     Returns:
     - model: The loaded model.
     """
     logging.info(f"Loading model from {model_path}")
-    return joblib.load(model_path)
+    if is_model_dir(model_path):
+        metadata = read_metadata(model_path)
+        logging.info(
+            f"Model {metadata['estimator']} trained on data "
+            f"{metadata['data_hash']} with scikit-learn "
+            f"{metadata['sklearn_version']}"
+        )
+    return read_model(model_path)
 
 
-def load_data(file_path):
+def load_data(file_path, cache_dir=None):
     """
-    Load data from a CSV file.
+    Load data from a CSV file or npy dataset directory.
 
     Parameters:
-    - file_path (str): Path to the CSV file.
+    - file_path (str): Path to the CSV file or npy dataset directory.
+    - cache_dir (str): Feature cache directory. If given, a CSV file is
+      read from its cached binary copy, made on the first read.
 
     Returns:
     - pd.DataFrame: The loaded dataset.
     """
     logging.info(f"Loading data from {file_path}")
-    return pd.read_csv(file_path)
+    data = read_dataset(cached_path(file_path, cache_dir))
+    logging.info(f"Loaded data. {memory_report(data)}")
+    return data
 
 
 def score_model(model, data):
@@ -81,24 +110,211 @@ def score_model(model, data):
     return rmse
 
 
-def main(model_path, dataset_path, output_path, log_level, log_file, console):
+def score_model_streaming(model, dataset_path, chunksize,
+                          predictions_path=None):
+    """
+    Score the model reading the dataset in chunks, in constant memory.
+
+    Each chunk is predicted, its predictions appended to the predictions
+    file, and its errors added to running sums, so only one chunk is in
+    memory at a time whatever the size of the dataset.
+
+    Parameters:
+    - model: The model to be evaluated.
+    - dataset_path (str): Path to the CSV file or npy dataset directory.
+      Rows without a 'median_house_value' column are only predicted.
+    - chunksize (int): Number of rows read at a time.
+    - predictions_path (str): CSV file the row ids and predictions are
+      written to. None writes no predictions.
+
+    Returns:
+    - dict: "rows", "rmse" and "mae" (None without labels), "seconds"
+      and "rows_per_s".
+    """
+    logging.info(f"Scoring model, {chunksize} rows per chunk...")
+    start = time.perf_counter()
+    n_rows = n_labelled = 0
+    squared_error = absolute_error = 0.0
+    output = None if predictions_path is None else open(predictions_path, "w")
+    try:
+        for chunk in iter_dataset(dataset_path, chunksize):
+            X = chunk.drop(LABEL, axis=1, errors="ignore")
+            predictions = model.predict(X)
+            if output is not None:
+                np.savetxt(
+                    output,
+                    np.column_stack([chunk.index, predictions]),
+                    fmt=("%d", "%.10g"),
+                    delimiter=",",
+                    header="" if n_rows else "id,prediction",
+                    comments="",
+                )
+            n_rows += len(chunk)
+            if LABEL in chunk:
+                errors = chunk[LABEL].to_numpy(np.float64) - predictions
+                squared_error += float(errors @ errors)
+                absolute_error += float(np.abs(errors).sum())
+                n_labelled += len(chunk)
+    finally:
+        if output is not None:
+            output.close()
+    seconds = time.perf_counter() - start
+    rmse = mae = None
+    if n_labelled:
+        rmse = float(np.sqrt(squared_error / n_labelled))
+        mae = absolute_error / n_labelled
+    result = {
+        "rows": n_rows,
+        "rmse": rmse,
+        "mae": mae,
+        "seconds": seconds,
+        "rows_per_s": n_rows / seconds if seconds else float("inf"),
+    }
+    logging.info(
+        f"Scored {n_rows} rows in {seconds:.2f} s "
+        f"({result['rows_per_s']:.0f} rows/s). "
+        f"Model RMSE: {rmse}, MAE: {mae}"
+    )
+    return result
+
+
+def find_models(models_dir):
+    """
+    Find the model artifacts saved in a directory.
+
+    Parameters:
+    - models_dir (str): Directory the training run saved its models in.
+
+    Pickle files are only models if named as the training runs name them
+    (house_pricing.model_io.MODEL_NAMES), so other pickles such as a
+    preprocessor are skipped. Model directories carry a metadata header
+    and are found whatever their name.
+
+    Returns:
+    - list: (name, path) of every model pickle file and model directory,
+      sorted by name.
+    """
+    models = []
+    for entry in sorted(os.listdir(models_dir)):
+        path = os.path.join(models_dir, entry)
+        name, extension = os.path.splitext(entry)
+        if (
+            extension == ".pkl"
+            and name in MODEL_NAMES
+            and os.path.isfile(path)
+        ):
+            models.append((name, path))
+        elif not extension and is_model_dir(path):
+            models.append((entry, path))
+    return models
+
+
+def _score_artifact(name, path, data):
+    """Load and score one model on a shared dataset, timing each step."""
+    start = time.perf_counter()
+    model = read_model(path)
+    load_time = time.perf_counter() - start
+    X, y = data.X, data.y
+
+    start = time.perf_counter()
+    predictions = model.predict(X)
+    predict_time = time.perf_counter() - start
+    latencies = []
+    for i in range(min(LATENCY_ROWS, len(y))):
+        row = X.iloc[i:i + 1]
+        start = time.perf_counter()
+        model.predict(row)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "model": name,
+        "rmse": np.sqrt(mean_squared_error(y, predictions)),
+        "mae": mean_absolute_error(y, predictions),
+        "load_ms": load_time * 1e3,
+        "batch_us_per_row": predict_time / len(y) * 1e6,
+        "row_latency_ms": np.median(latencies) * 1e3,
+    }
+
+
+def score_models(models_dir, dataset_path, n_jobs=-1, cache_dir=None):
+    """
+    Score every model of a directory on a dataset parsed once.
+
+    The features and labels are mapped from the dataset files (or streamed
+    once, chunk by chunk, into shared memory for CSV files) and every
+    worker maps the same pages, so the dataset is parsed and held in
+    memory once whatever the number of models. Timings of models scored concurrently include the
+    contention between them.
+
+    Parameters:
+    - models_dir (str): Directory of pickle files and model directories.
+    - dataset_path (str): Path to the CSV file or npy dataset directory.
+    - n_jobs (int): Models scored in parallel, -1 for all cores.
+    - cache_dir (str): Feature cache directory, None disables the cache.
+
+    Returns:
+    - pd.DataFrame: One row per model, best RMSE first: RMSE, MAE, load
+      time in ms, batch prediction time per row in microseconds and median
+      latency of single-row predictions in ms.
+    """
+    models = find_models(models_dir)
+    if not models:
+        raise FileNotFoundError(f"No models found in {models_dir}")
+    path = cached_path(dataset_path, cache_dir)
+    logging.info(f"Loading data from {path}")
+    with SharedDataset.from_dataset(path) as data:
+        logging.info(f"Scoring {len(models)} models on {len(data)} rows...")
+        rows = Parallel(n_jobs=n_jobs)(
+            delayed(_score_artifact)(name, model_path, data)
+            for name, model_path in models
+        )
+    table = pd.DataFrame(rows).set_index("model").sort_values("rmse")
+    logging.info(f"Model comparison:\n{table.to_string()}")
+    return table
+
+
+def main(model_path, dataset_path, output_path, log_level, log_file, console,
+         cache_dir=None, chunksize=0, predictions_path=None, n_jobs=-1):
     """
     Main function to execute the script.
     Parameters:
-    - model_path (str): Path to the model file.
+    - model_path (str): Path to the model file, or to a models directory
+      to compare all the models in it.
     - dataset_path (str): Path to the validation dataset.
     - output_path (str): Path to the folder where the score will be saved.
     - log_level (str): The logging level (e.g., 'DEBUG',
       'INFO', 'WARNING', 'ERROR', 'CRITICAL').
     - log_file (str): Path to the log file.
     - console (bool): If True, enable console logging.
+    - cache_dir (str): Feature cache directory, None disables the cache.
+    - chunksize (int): If given, scores reading this many rows at a time,
+      in constant memory, and also reports MAE and throughput.
+    - predictions_path (str): Streaming only: CSV file of per-row
+      predictions, None writes none.
+    - n_jobs (int): Models directory only: models scored in parallel.
     """
     setup_logging(log_level, log_file, console)
+    if os.path.isdir(model_path) and not is_model_dir(model_path):
+        table = score_models(model_path, dataset_path, n_jobs, cache_dir)
+        table.to_csv(os.path.join(output_path, "scores.csv"))
+        logging.info(f"Scores saved to {output_path}/scores.csv")
+        return
     model = load_model(model_path)
-    val_data = load_data(dataset_path)
-    rmse = score_model(model, val_data)
-    with open(os.path.join(output_path, "score.txt"), "w") as f:
-        f.write(f"RMSE: {rmse}")
+    if chunksize:
+        result = score_model_streaming(
+            model, cached_path(dataset_path, cache_dir), chunksize,
+            predictions_path
+        )
+        with open(os.path.join(output_path, "score.txt"), "w") as f:
+            f.write(
+                f"RMSE: {result['rmse']}\nMAE: {result['mae']}\n"
+                f"Rows: {result['rows']}\n"
+                f"Rows per second: {result['rows_per_s']:.0f}"
+            )
+    else:
+        val_data = load_data(dataset_path, cache_dir)
+        rmse = score_model(model, val_data)
+        with open(os.path.join(output_path, "score.txt"), "w") as f:
+            f.write(f"RMSE: {rmse}")
 
     logging.info(f"Score saved to {output_path}/score.txt")
 
@@ -106,9 +322,11 @@ def main(model_path, dataset_path, output_path, log_level, log_file, console):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Score model script")
     parser.add_argument("--model_path", type=str, required=True,
-                        help="Path to the model pickle file")
+                        help="Path to the model pickle file or directory, "
+                             "or to a models directory to compare all of "
+                             "its models")
     parser.add_argument("--dataset_path", type=str, required=True,
-                        help="Validation dataset path")
+                        help="Validation dataset path (CSV or npy directory)")
     parser.add_argument("--output_path", type=str, required=True,
                         help="Output folder path for saving the score")
     parser.add_argument("--log_level", type=str, default="INFO",
@@ -119,7 +337,19 @@ if __name__ == "__main__":
                         help="Log file path")
     parser.add_argument("--console", action="store_true",
                         help="Enable console logging")
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Feature cache directory")
+    parser.add_argument("--chunksize", type=int, default=0,
+                        help="Score in constant memory reading this many "
+                             "rows at a time")
+    parser.add_argument("--predictions_path", type=str, default=None,
+                        help="Streaming only: CSV file of per-row "
+                             "predictions")
+    parser.add_argument("--n_jobs", type=int, default=-1,
+                        help="Models scored in parallel when comparing a "
+                             "models directory")
     args = parser.parse_args()
 
     main(args.model_path, args.dataset_path, args.output_path,
-         args.log_level, args.log_file, args.console)
+         args.log_level, args.log_file, args.console, args.cache_dir,
+         args.chunksize, args.predictions_path, args.n_jobs)
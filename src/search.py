@@ -0,0 +1,909 @@
+"""
+This module contains the hyperparameter search used by the training run.
+Every (candidate, fold) fit is an independent task spread over worker
+ processes, and the search can stop early on a wall-clock or fit-count
+ budget. The "halving" strategy evaluates all candidates on a small
+ subsample first and only gives the best third the next, three times
+ larger, subsample (successive halving). The "random" strategy samples
+ candidates until a time or fit budget runs out, evaluating each one fold
+ at a time and abandoning it as soon as its partial score is clearly worse
+ than the best complete candidate's on the same folds.
+Tree ensembles can be grown incrementally across the "n_estimators" values
+ of the grid instead of being refitted for each of them.
+Completed fits can be journaled to disk so an interrupted search resumes
+ where it stopped.
+Instead of local worker processes, the tasks can go through a
+ ``work_queue`` file served by any number of worker processes, on this host
+ or on others mounting the same path.
+Results follow the layout of scikit-learn's ``cv_results_`` so searches
+ can be swapped for ``GridSearchCV``.
+"""
+import math
+import os
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Iterator, Optional
+
+import numpy as np
+import sklearn
+from joblib import Parallel, delayed, effective_n_jobs
+from joblib.executor import get_memmapping_executor
+from scipy.stats import rankdata
+from sklearn.base import clone
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid, ParameterSampler, check_cv
+
+from house_pricing.search_journal import (
+    SearchJournal,
+    dataset_hash,
+    search_key,
+    task_key,
+)
+from house_pricing.shared_data import SharedDataset
+from house_pricing.work_queue import WorkQueue
+
+STRATEGIES = ("grid", "halving", "random")
+
+
+def take_rows(data, rows: np.ndarray):
+    """Selects rows of an array, dataframe or series by position.
+    Parameters
+    ----------
+    data : array-like
+        Features or labels.
+    rows : np.ndarray
+        Row positions.
+    Returns
+    -------
+    array-like
+        The selected rows, same type as data.
+    """
+    return data.iloc[rows] if hasattr(data, "iloc") else data[rows]
+
+
+def fit_and_score(
+    estimator: sklearn.base.BaseEstimator,
+    params: dict,
+    X,
+    y,
+    train: np.ndarray,
+    test: np.ndarray,
+    scorer,
+    return_train_score: bool = False,
+    deadline: Optional[float] = None,
+) -> Optional[dict]:
+    """Fits one candidate on one fold and scores it.
+    Parameters
+    ----------
+    estimator : sklearn.base.BaseEstimator
+        Unfitted estimator, cloned before fitting.
+    params : dict
+        Hyperparameters of the candidate.
+    X, y : array-like
+        Features and labels, or a SharedDataset and None.
+    train, test : np.ndarray
+        Row positions of the fold.
+    scorer : callable
+        Scorer from ``sklearn.metrics.check_scoring``.
+    return_train_score : bool, optional
+        Also score the train rows, by default False.
+    deadline : float, optional
+        ``time.time()`` after which the fit is skipped, by default None.
+    Returns
+    -------
+    Optional[dict]
+        "test_score", "train_score", "fit_time" and "score_time",
+        None if the deadline had passed.
+    """
+    if deadline is not None and time.time() > deadline:
+        return None
+    if isinstance(X, SharedDataset):
+        X, y = X.X, X.y
+    model = clone(estimator).set_params(**params)
+    X_train, y_train = take_rows(X, train), take_rows(y, train)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    test_score = scorer(model, take_rows(X, test), take_rows(y, test))
+    score_time = time.perf_counter() - start - fit_time
+    result = {
+        "test_score": test_score,
+        "fit_time": fit_time,
+        "score_time": score_time,
+    }
+    if return_train_score:
+        result["train_score"] = scorer(model, X_train, y_train)
+    return result
+
+
+def fit_and_score_path(
+    estimator: sklearn.base.BaseEstimator,
+    params: dict,
+    checkpoints: list[int],
+    X,
+    y,
+    train: np.ndarray,
+    test: np.ndarray,
+    scorer,
+    return_train_score: bool = False,
+    deadline: Optional[float] = None,
+) -> list[Optional[dict]]:
+    """Grows one warm-started ensemble on one fold and scores it at every
+    ``n_estimators`` checkpoint, so the trees of smaller candidates are
+    reused instead of rebuilt. With an integer ``random_state`` the model
+    at each checkpoint is the same as one fitted from scratch.
+    Parameters
+    ----------
+    estimator : sklearn.base.BaseEstimator
+        Unfitted ensemble with ``warm_start`` and ``n_estimators``.
+    params : dict
+        Hyperparameters shared by the checkpoints.
+    checkpoints : list[int]
+        Increasing ``n_estimators`` values to score.
+    X, y : array-like
+        Features and labels, or a SharedDataset and None.
+    train, test : np.ndarray
+        Row positions of the fold.
+    scorer : callable
+        Scorer from ``sklearn.metrics.check_scoring``.
+    return_train_score : bool, optional
+        Also score the train rows, by default False.
+    deadline : float, optional
+        ``time.time()`` after which no more trees are grown,
+        by default None.
+    Returns
+    -------
+    list[Optional[dict]]
+        :func:`fit_and_score` result per checkpoint, "fit_time" being the
+        time to grow the ensemble up to it. None once the deadline passed.
+    """
+    if isinstance(X, SharedDataset):
+        X, y = X.X, X.y
+    model = clone(estimator).set_params(**params, warm_start=True)
+    X_train, y_train = take_rows(X, train), take_rows(y, train)
+    X_test, y_test = take_rows(X, test), take_rows(y, test)
+
+    results = []
+    fit_time = 0.0
+    for n_estimators in checkpoints:
+        if deadline is not None and time.time() > deadline:
+            results.append(None)
+            continue
+        start = time.perf_counter()
+        model.set_params(n_estimators=n_estimators).fit(X_train, y_train)
+        fit_time += time.perf_counter() - start
+        start = time.perf_counter()
+        result = {
+            "test_score": scorer(model, X_test, y_test),
+            "fit_time": fit_time,
+            "score_time": time.perf_counter() - start,
+        }
+        if return_train_score:
+            result["train_score"] = scorer(model, X_train, y_train)
+        results.append(result)
+    return results
+
+
+def run_queued_task(context: tuple, item: tuple):
+    """Runs a task of a search batch submitted to a work queue.
+    Parameters
+    ----------
+    context : tuple
+        Shared by the batch: estimator, X, y, folds, scorer,
+        return_train_score and deadline.
+    item : tuple
+        Hyperparameters, ``n_estimators`` checkpoints (None unless
+        warm-started) and fold number.
+    Returns
+    -------
+    Optional[dict] or list[Optional[dict]]
+        Result of :func:`fit_and_score`, or of :func:`fit_and_score_path`
+        if there are checkpoints.
+    """
+    estimator, X, y, folds, scorer, return_train_score, deadline = context
+    params, checkpoints, fold = item
+    train, test = folds[fold]
+    shared = (scorer, return_train_score, deadline)
+    if checkpoints is None:
+        return fit_and_score(estimator, params, X, y, train, test, *shared)
+    return fit_and_score_path(
+        estimator, params, checkpoints, X, y, train, test, *shared
+    )
+
+
+def warm_start_groups(
+    candidates: list[dict], default_n_estimators: int
+) -> list[tuple[dict, list[int]]]:
+    """Groups candidates that only differ in ``n_estimators``.
+    Parameters
+    ----------
+    candidates : list[dict]
+        Hyperparameters per candidate.
+    default_n_estimators : int
+        ``n_estimators`` of candidates that do not set it.
+    Returns
+    -------
+    list[tuple[dict, list[int]]]
+        Shared parameters and candidate positions per group, positions
+        sorted by increasing ``n_estimators``.
+    """
+    groups = {}
+    for i, params in enumerate(candidates):
+        shared = {k: v for k, v in params.items() if k != "n_estimators"}
+        key = repr(sorted(shared.items()))
+        groups.setdefault(key, (shared, []))[1].append(i)
+    for _, members in groups.values():
+        members.sort(
+            key=lambda i: candidates[i].get("n_estimators", default_n_estimators)
+        )
+    return list(groups.values())
+
+
+def _tagged(tag, func, *args):
+    """Calls func and returns its result with a tag identifying the call."""
+    return tag, func(*args)
+
+
+def rank_scores(scores: np.ndarray) -> np.ndarray:
+    """Ranks mean scores like scikit-learn, higher is better, NaN last.
+    Parameters
+    ----------
+    scores : np.ndarray
+        Mean test score per candidate.
+    Returns
+    -------
+    np.ndarray
+        int32 rank per candidate, 1 is best, ties share the lowest rank.
+    """
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    return rankdata(-scores, method="min").astype(np.int32)
+
+
+def param_columns(candidates: list[dict]) -> dict:
+    """The "param_<name>" and "params" entries of ``cv_results_``.
+    Parameters
+    ----------
+    candidates : list[dict]
+        Hyperparameters per candidate.
+    Returns
+    -------
+    dict
+        A masked object array per parameter name (masked where a candidate
+        does not set it) and the list of candidates.
+    """
+    columns = {}
+    names = sorted({name for params in candidates for name in params})
+    for name in names:
+        column = np.ma.MaskedArray(
+            np.empty(len(candidates), dtype=object),
+            mask=[name not in params for params in candidates],
+        )
+        for i, params in enumerate(candidates):
+            if name in params:
+                column[i] = params[name]
+        columns[f"param_{name}"] = column
+    columns["params"] = list(candidates)
+    return columns
+
+
+def results_table(
+    candidates: list[dict],
+    splits: list[list[Optional[dict]]],
+    return_train_score: bool = False,
+) -> dict:
+    """Aggregates per-fold results into a ``cv_results_`` dictionary.
+    Parameters
+    ----------
+    candidates : list[dict]
+        Hyperparameters per candidate.
+    splits : list[list[Optional[dict]]]
+        Per candidate, the :func:`fit_and_score` result of every fold.
+        A candidate with a missing fold gets NaN scores.
+    return_train_score : bool, optional
+        Include train scores, by default False.
+    Returns
+    -------
+    dict
+        Same keys as ``GridSearchCV.cv_results_``.
+    """
+    n_splits = max(len(folds) for folds in splits)
+    keys = ["test_score", "fit_time", "score_time"]
+    if return_train_score:
+        keys.append("train_score")
+    values = {
+        key: np.array(
+            [
+                [np.nan if r is None else r[key] for r in folds]
+                + [np.nan] * (n_splits - len(folds))
+                for folds in splits
+            ],
+            dtype=float,
+        )
+        for key in keys
+    }
+    # a candidate is only scored if every one of its folds completed
+    incomplete = np.isnan(values["test_score"]).any(axis=1)
+
+    table = {}
+    for key in ("fit_time", "score_time"):
+        with warnings.catch_warnings():
+            # candidates without any completed fold get NaN times
+            warnings.simplefilter("ignore", RuntimeWarning)
+            table[f"mean_{key}"] = np.nanmean(values[key], axis=1)
+            table[f"std_{key}"] = np.nanstd(values[key], axis=1)
+    table.update(param_columns(candidates))
+
+    for kind in ("test", "train") if return_train_score else ("test",):
+        scores = values[f"{kind}_score"]
+        for fold in range(n_splits):
+            table[f"split{fold}_{kind}_score"] = scores[:, fold]
+        mean = np.where(incomplete, np.nan, scores.mean(axis=1))
+        table[f"mean_{kind}_score"] = mean
+        table[f"std_{kind}_score"] = np.where(
+            incomplete, np.nan, scores.std(axis=1)
+        )
+        if kind == "test":
+            table["rank_test_score"] = rank_scores(mean)
+    return table
+
+
+class BudgetedSearchCV:
+    """Parallel cross-validated search with optional successive halving and
+    a wall-clock or fit-count budget.
+    Parameters
+    ----------
+    estimator : sklearn.base.BaseEstimator
+        Estimator to tune.
+    param_grid : dict or list[dict]
+        Candidates, as for ``GridSearchCV``. The "random" strategy also
+        accepts distributions, as for ``RandomizedSearchCV``.
+    scoring : str, optional
+        Scorer name, by default "neg_mean_squared_error".
+    cv : int or cross-validation generator, optional
+        Folds, by default 5 (unshuffled, like ``GridSearchCV``).
+    n_jobs : int, optional
+        Worker processes, -1 for all cores, by default None (one).
+    strategy : str, optional
+        One of STRATEGIES, by default "grid".
+    factor : int, optional
+        Halving only: candidates kept per iteration are 1 / factor and
+        the subsample grows factor times, by default 3.
+    min_resources : int, optional
+        Halving only: rows of the first iteration, by default the size that
+        lets the last iteration use every row.
+    n_iter : int, optional
+        Random only: most candidates to sample, by default as many as the
+        budget allows (every candidate of a grid of lists).
+    abort_margin : float, optional
+        Random only: a candidate is abandoned once its mean score on the
+        folds done so far is below the best complete candidate's mean on
+        the same folds by more than abort_margin standard errors of the
+        latter's fold scores. None never abandons, by default 2.0.
+    max_fits : int, optional
+        Stop after this many (candidate, fold) fits, by default None.
+    max_time : float, optional
+        Do not start new fits after this many seconds, by default None.
+    warm_start : bool, optional
+        Grow one ensemble per fold and group of candidates that only differ
+        in ``n_estimators``, scoring it at each value instead of refitting
+        every candidate from scratch, by default False.
+    journal : str, optional
+        Directory of the on-disk journal. Every completed (candidate, fold)
+        result is saved there, and a search restarted on the same data,
+        estimator and grid skips the fits already made, by default None.
+    queue : str, optional
+        SQLite file of a ``work_queue`` the tasks are submitted to instead
+        of running in n_jobs local processes. The search runs tasks itself
+        while waiting, and workers started on the same file share the
+        rest. The data is staged next to the queue file for the workers to
+        map (a SharedDataset is hard-linked when possible), by default
+        None.
+    return_train_score : bool, optional
+        Also score the train folds, by default False.
+    refit : bool, optional
+        Refit the best candidate on all rows, by default True. The refit
+        is not counted in the budget.
+    random_state : int, optional
+        Seed of the halving subsamples, by default 42.
+
+    Attributes
+    ----------
+    cv_results_ : dict
+        ``GridSearchCV``-like results, with "iter" and "n_resources"
+        columns for halving (one row per candidate and iteration).
+    best_index_, best_params_, best_score_, best_estimator_
+        As in ``GridSearchCV``.
+    n_fits_ : int
+        (candidate, fold) fits performed.
+    n_resumed_ : int
+        (candidate, fold) results read from the journal instead.
+    n_aborted_ : int
+        Random only: candidates abandoned before their last fold.
+    n_fits_avoided_ : int
+        Random only: folds of the abandoned candidates left unfitted.
+    budget_exhausted_ : bool
+        Whether the budget cut the search short.
+    """
+
+    def __init__(
+        self,
+        estimator: sklearn.base.BaseEstimator,
+        param_grid,
+        scoring: str = "neg_mean_squared_error",
+        cv=5,
+        n_jobs: Optional[int] = None,
+        strategy: str = "grid",
+        factor: int = 3,
+        min_resources: Optional[int] = None,
+        n_iter: Optional[int] = None,
+        abort_margin: Optional[float] = 2.0,
+        max_fits: Optional[int] = None,
+        max_time: Optional[float] = None,
+        warm_start: bool = False,
+        journal: Optional[str] = None,
+        queue: Optional[str] = None,
+        return_train_score: bool = False,
+        refit: bool = True,
+        random_state: int = 42,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(
+                f"Unknown search strategy {strategy!r}, expected {STRATEGIES}."
+            )
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.strategy = strategy
+        self.factor = factor
+        self.min_resources = min_resources
+        self.n_iter = n_iter
+        self.abort_margin = abort_margin
+        self.max_fits = max_fits
+        self.max_time = max_time
+        self.warm_start = warm_start
+        self.journal = journal
+        self.queue = queue
+        self.return_train_score = return_train_score
+        self.refit = refit
+        self.random_state = random_state
+
+    def fit(self, X, y=None) -> "BudgetedSearchCV":
+        """Runs the search.
+        Parameters
+        ----------
+        X : array-like or SharedDataset
+            Features. A SharedDataset (with y None) is sent to the workers
+            as a handle, so they map the data instead of copying it (staged
+            beside the queue file if there is one).
+        y : array-like
+            Labels.
+        Returns
+        -------
+        BudgetedSearchCV
+            The fitted search.
+        """
+        if self.strategy == "random" and (
+            self.warm_start or self.journal or self.queue
+        ):
+            raise ValueError(
+                "The random strategy runs folds one at a time on local "
+                "workers, without warm start, journal or queue."
+            )
+        if self.warm_start and "warm_start" not in self.estimator.get_params():
+            raise ValueError(
+                f"{type(self.estimator).__name__} cannot be warm-started."
+            )
+        self.scorer_ = check_scoring(self.estimator, scoring=self.scoring)
+        self.n_fits_ = 0
+        self.n_resumed_ = 0
+        self.n_aborted_ = 0
+        self.n_fits_avoided_ = 0
+        self.budget_exhausted_ = False
+        self._deadline = (
+            None if self.max_time is None else time.time() + self.max_time
+        )
+        self._cv = check_cv(self.cv)
+        candidates = (
+            None
+            if self.strategy == "random"
+            else list(ParameterGrid(self.param_grid))
+        )
+        if isinstance(X, SharedDataset):
+            self._data = (X, None)
+            X, y = X.X, X.y
+        else:
+            self._data = (X, y)
+
+        # everything opened or copied below is released in the finally
+        self._queue = None
+        self._journal = None
+        copied = None
+        try:
+            if self.queue:
+                self._queue = WorkQueue(self.queue)
+                # workers, maybe on other hosts, map the data from the queue
+                # path: /dev/shm and relative paths are local to this process
+                directory = tempfile.mkdtemp(
+                    prefix="data_",
+                    dir=os.path.dirname(os.path.abspath(self.queue)),
+                )
+                shared = self._data[0]
+                copied = (
+                    shared.stage(directory)
+                    if isinstance(shared, SharedDataset)
+                    else SharedDataset.create(X, y, directory)
+                )
+                self._data = (copied, None)
+            elif (
+                self.strategy == "random"
+                and effective_n_jobs(self.n_jobs) > 1
+                and not isinstance(self._data[0], SharedDataset)
+            ):
+                # tasks are submitted one by one, each would pickle its own
+                # copy
+                copied = SharedDataset.create(X, y)
+                self._data = (copied, None)
+            if self.journal:
+                self._journal = SearchJournal(
+                    self.journal, self._search_key(candidates, X, y)
+                )
+            if self.strategy == "grid":
+                self._grid(candidates, X, y)
+            elif self.strategy == "halving":
+                self._halving(candidates, X, y)
+            else:
+                self._random(X, y)
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+            if self._queue is not None:
+                self._queue.close()
+            if copied is not None:
+                copied.close()
+
+        mean = self.cv_results_["mean_test_score"]
+        if np.isnan(mean).all():
+            raise RuntimeError("The budget did not allow a single candidate.")
+        self.best_index_ = int(np.argmin(self.cv_results_["rank_test_score"]))
+        self.best_params_ = self.cv_results_["params"][self.best_index_]
+        self.best_score_ = float(mean[self.best_index_])
+        if self.refit:
+            self.best_estimator_ = clone(self.estimator).set_params(
+                **self.best_params_
+            )
+            self.best_estimator_.fit(X, y)
+        del self._data
+        return self
+
+    def _search_key(self, candidates: list[dict], X, y) -> str:
+        """Key of the journal: everything the fold results depend on."""
+        return search_key(
+            data=dataset_hash(X, y),
+            estimator=sorted(self.estimator.get_params().items()),
+            candidates=[sorted(params.items()) for params in candidates],
+            scoring=self.scoring,
+            cv=self._cv,
+            strategy=self.strategy,
+            factor=self.factor,
+            min_resources=self.min_resources,
+            random_state=self.random_state,
+        )
+
+    def _affordable(self, n_candidates: int, n_splits: int) -> int:
+        """Number of whole candidates the remaining fit budget allows."""
+        if self.max_fits is None:
+            return n_candidates
+        remaining = (self.max_fits - self.n_fits_) // n_splits
+        if remaining < n_candidates:
+            self.budget_exhausted_ = True
+        return max(0, min(n_candidates, remaining))
+
+    def _evaluate(
+        self, candidates: list[dict], X, y, rows: np.ndarray
+    ) -> list[list[Optional[dict]]]:
+        """Cross-validates candidates on the given rows, all (candidate,
+        fold) pairs in parallel. Returns per candidate the fold results."""
+        folds = [
+            (rows[train], rows[test])
+            for train, test in self._cv.split(take_rows(X, rows))
+        ]
+        n_rows = len(rows)
+        splits = [
+            [self._journaled(params, fold, n_rows) for fold in range(len(folds))]
+            for params in candidates
+        ]
+        pending = [i for i, done in enumerate(splits) if None in done]
+        n_pending = self._affordable(len(pending), len(folds))
+        if n_pending < len(pending):
+            self.budget_exhausted_ = True
+        selected = sorted(
+            set(range(len(candidates))) - set(pending) | set(pending[:n_pending])
+        )
+        if self.warm_start:
+            default = self.estimator.get_params()["n_estimators"]
+            groups = [
+                (params, [selected[j] for j in members])
+                for params, members in warm_start_groups(
+                    [candidates[i] for i in selected], default
+                )
+            ]
+        else:
+            groups = [(candidates[i], [i]) for i in selected]
+        tasks = [
+            (members, fold, params, train, test)
+            for params, members in groups
+            for fold, (train, test) in enumerate(folds)
+            if any(splits[i][fold] is None for i in members)
+        ]
+        # results are journaled in completion order, not submission order
+        if self._queue is not None:
+            context = (
+                self.estimator,
+                *self._data,
+                folds,
+                self.scorer_,
+                self.return_train_score,
+                self._deadline,
+            )
+            results = self._queue.map(
+                run_queued_task,
+                context,
+                [
+                    (params, self._checkpoints(candidates, members), fold)
+                    for members, fold, params, _, _ in tasks
+                ],
+            )
+        else:
+            results = Parallel(
+                n_jobs=self.n_jobs, return_as="generator_unordered"
+            )(
+                delayed(_tagged)(
+                    k, *self._task(candidates, members, params, train, test)
+                )
+                for k, (members, _, params, train, test) in enumerate(tasks)
+            )
+        for k, result in results:
+            members, fold, *_ = tasks[k]
+            path = result if self.warm_start else [result]
+            for i, checkpoint in zip(members, path):
+                if checkpoint is None:
+                    self.budget_exhausted_ = True
+                    continue
+                splits[i][fold] = checkpoint
+                self.n_fits_ += 1
+                if self._journal is not None:
+                    self._journal.record(
+                        task_key(candidates[i], fold, n_rows), checkpoint
+                    )
+        return splits
+
+    def _journaled(self, params: dict, fold: int, n_rows: int) -> Optional[dict]:
+        """Result of a fit completed by an earlier run, if journaled."""
+        if self._journal is None:
+            return None
+        result = self._journal.get(task_key(params, fold, n_rows))
+        self.n_resumed_ += result is not None
+        return result
+
+    def _checkpoints(self, candidates, members) -> Optional[list[int]]:
+        """``n_estimators`` of a warm-started group, None without warm
+        start."""
+        if not self.warm_start:
+            return None
+        default = self.estimator.get_params()["n_estimators"]
+        return [candidates[i].get("n_estimators", default) for i in members]
+
+    def _task(self, candidates, members, params, train, test) -> tuple:
+        """Function and arguments fitting one fold of a candidate (or of a
+        group of warm-started candidates)."""
+        shared = (self.scorer_, self.return_train_score, self._deadline)
+        checkpoints = self._checkpoints(candidates, members)
+        if checkpoints is not None:
+            return (
+                fit_and_score_path,
+                self.estimator,
+                params,
+                checkpoints,
+                *self._data,
+                train,
+                test,
+                *shared,
+            )
+        return (
+            fit_and_score,
+            self.estimator,
+            params,
+            *self._data,
+            train,
+            test,
+            *shared,
+        )
+
+    def _grid(self, candidates: list[dict], X, y) -> None:
+        rows = np.arange(len(y))
+        splits = self._evaluate(candidates, X, y, rows)
+        self.cv_results_ = results_table(
+            candidates, splits, self.return_train_score
+        )
+
+    def _halving(self, candidates: list[dict], X, y) -> None:
+        n_rows = len(y)
+        n_iterations = max(
+            1, math.floor(math.log(len(candidates), self.factor)) + 1
+        )
+        min_resources = self.min_resources or max(
+            2 * self._cv.get_n_splits(),
+            n_rows // self.factor ** (n_iterations - 1),
+        )
+        order = np.random.default_rng(self.random_state).permutation(n_rows)
+
+        tables = []
+        survivors = list(range(len(candidates)))
+        for iteration in range(n_iterations):
+            n_resources = min(n_rows, min_resources * self.factor**iteration)
+            if iteration == n_iterations - 1:
+                n_resources = n_rows
+            # subsamples are nested prefixes of one permutation
+            rows = np.sort(order[:n_resources])
+            splits = self._evaluate(
+                [candidates[i] for i in survivors], X, y, rows
+            )
+            table = results_table(
+                [candidates[i] for i in survivors],
+                splits,
+                self.return_train_score,
+            )
+            table["iter"] = np.full(len(survivors), iteration)
+            table["n_resources"] = np.full(len(survivors), n_resources)
+            tables.append(table)
+
+            scored = ~np.isnan(table["mean_test_score"])
+            if self.budget_exhausted_ or iteration == n_iterations - 1:
+                break
+            n_keep = max(1, math.ceil(len(survivors) / self.factor))
+            # best first, so a fit budget cuts the weakest survivors
+            best = np.argsort(
+                -np.where(scored, table["mean_test_score"], -np.inf),
+                kind="stable",
+            )
+            survivors = [survivors[i] for i in best[:n_keep]]
+
+        self.cv_results_ = self._merge_iterations(tables)
+
+    def _sample(self) -> Iterator[dict]:
+        """Candidates of the random strategy, in sampling order."""
+        grids = (
+            self.param_grid
+            if isinstance(self.param_grid, list)
+            else [self.param_grid]
+        )
+        if all(not hasattr(v, "rvs") for grid in grids for v in grid.values()):
+            # a grid of lists is sampled without replacement
+            n_iter = len(ParameterGrid(self.param_grid))
+            n_iter = min(n_iter, self.n_iter or n_iter)
+        elif self.n_iter is not None:
+            n_iter = self.n_iter
+        elif self.max_time is None and self.max_fits is None:
+            raise ValueError(
+                "Random search over distributions needs n_iter, max_time "
+                "or max_fits."
+            )
+        else:
+            n_iter = sys.maxsize
+        return iter(
+            ParameterSampler(self.param_grid, n_iter, random_state=self.random_state)
+        )
+
+    def _beaten(self, scores: list[float], best: Optional[list[float]]) -> bool:
+        """Whether a candidate's scores on its first folds are worse than
+        the best complete candidate's by more than the abort margin."""
+        if best is None or self.abort_margin is None:
+            return False
+        k = len(scores)
+        margin = self.abort_margin * np.std(best, ddof=1) / math.sqrt(k)
+        return np.mean(scores) + margin < np.mean(best[:k])
+
+    def _random(self, X, y) -> None:
+        folds = list(self._cv.split(X, y))
+        n_splits = len(folds)
+        n_workers = effective_n_jobs(self.n_jobs)
+        # the executor of joblib's Parallel, so its workers are reused
+        executor = get_memmapping_executor(n_workers) if n_workers > 1 else None
+        sampler = self._sample()
+        candidates, splits, aborted = [], [], []
+        running = {}
+        best = None
+
+        def start(i: int, fold: int) -> None:
+            task = (
+                fit_and_score,
+                self.estimator,
+                candidates[i],
+                *self._data,
+                *folds[fold],
+                self.scorer_,
+                self.return_train_score,
+                self._deadline,
+            )
+            if executor is None:
+                future = Future()
+                future.set_result(task[0](*task[1:]))
+            else:
+                future = executor.submit(*task)
+            running[future] = (i, fold)
+
+        def affordable() -> bool:
+            if (
+                self._deadline is not None and time.time() > self._deadline
+            ) or (
+                self.max_fits is not None
+                and self.n_fits_ + len(running) >= self.max_fits
+            ):
+                self.budget_exhausted_ = True
+                return False
+            return True
+
+        while True:
+            # one fold in flight per candidate, new candidates fill the rest
+            while len(running) < n_workers and affordable():
+                params = next(sampler, None)
+                if params is None:
+                    break
+                candidates.append(params)
+                splits.append([None] * n_splits)
+                start(len(candidates) - 1, 0)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, fold = running.pop(future)
+                result = future.result()
+                if result is None:
+                    self.budget_exhausted_ = True
+                    continue
+                splits[i][fold] = result
+                self.n_fits_ += 1
+                scores = [r["test_score"] for r in splits[i][: fold + 1]]
+                if fold + 1 == n_splits:
+                    if best is None or np.mean(scores) > np.mean(best):
+                        best = scores
+                elif self._beaten(scores, best):
+                    aborted.append(i)
+                    self.n_fits_avoided_ += n_splits - fold - 1
+                elif affordable():
+                    start(i, fold + 1)
+        self.n_aborted_ = len(aborted)
+
+        if not candidates:
+            candidates, splits = [{}], [[None] * n_splits]
+        self.cv_results_ = results_table(
+            candidates, splits, self.return_train_score
+        )
+        self.cv_results_["aborted"] = np.isin(
+            np.arange(len(candidates)), aborted
+        )
+
+    def _merge_iterations(self, tables: list[dict]) -> dict:
+        """Stacks per-iteration tables; only the last iteration with scores
+        competes for the best candidate."""
+        merged = param_columns([p for table in tables for p in table["params"]])
+        for key in tables[0]:
+            if key != "params" and not key.startswith("param_"):
+                merged[key] = np.concatenate([t[key] for t in tables])
+
+        scored = [
+            iteration
+            for iteration, table in enumerate(tables)
+            if not np.isnan(table["mean_test_score"]).all()
+        ]
+        final = scored[-1] if scored else len(tables) - 1
+        competing = merged["iter"] == final
+        mean = np.where(competing, merged["mean_test_score"], np.nan)
+        merged["rank_test_score"] = rank_scores(mean)
+        return merged
@@ -0,0 +1,135 @@
+"""
+This module contains the on-disk journal of the hyperparameter search.
+Every completed (candidate, fold) result is appended to a json-lines file
+ named after a hash of the dataset, the estimator, the candidates and the
+ cross-validation settings, so a search restarted on the same data and
+ grid skips the fits it already made.
+"""
+import hashlib
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+
+def dataset_hash(X, y) -> str:
+    """Hashes the values (and feature names) of a dataset.
+    Parameters
+    ----------
+    X : array-like
+        Features.
+    y : array-like
+        Labels.
+    Returns
+    -------
+    str
+        Hex sha256 digest.
+    """
+    digest = hashlib.sha256()
+    if hasattr(X, "columns"):
+        digest.update(json.dumps([str(c) for c in X.columns]).encode())
+    for values in (X, y):
+        values = np.ascontiguousarray(values)
+        digest.update(f"{values.dtype.str}{values.shape}".encode())
+        digest.update(memoryview(values.reshape(-1).view(np.uint8)))
+    return digest.hexdigest()
+
+
+def search_key(**settings) -> str:
+    """Hashes everything a search result depends on.
+    Parameters
+    ----------
+    **settings
+        Json-serialisable settings, values that are not are hashed by repr.
+    Returns
+    -------
+    str
+        Hex sha256 digest.
+    """
+    text = json.dumps(settings, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def task_key(params: dict, fold: int, n_rows: int) -> str:
+    """Journal key of one (candidate, fold) fit on n_rows rows.
+    Parameters
+    ----------
+    params : dict
+        Hyperparameters of the candidate.
+    fold : int
+        Fold number.
+    n_rows : int
+        Rows cross-validated (less than the dataset when halving).
+    Returns
+    -------
+    str
+        The key.
+    """
+    return f"{n_rows}/{fold}/{repr(sorted(params.items()))}"
+
+
+class SearchJournal:
+    """Append-only file of completed (candidate, fold) results.
+    Parameters
+    ----------
+    directory : str
+        Journal directory, shared by searches with different keys.
+    key : str
+        Key of the search from :func:`search_key`.
+    """
+
+    def __init__(self, directory: str, key: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{key}.jsonl")
+        self.results = {}
+        # end of the last complete line: a run killed while writing leaves
+        # a partial line, cut off so new results start on a line of their own
+        end = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        break
+                    end += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.results[entry["task"]] = entry["result"]
+            if end < os.path.getsize(self.path):
+                with open(self.path, "r+b") as file:
+                    file.truncate(end)
+        self._file = open(self.path, "a")
+
+    def get(self, key: str) -> Optional[dict]:
+        """Journaled result of a task.
+        Parameters
+        ----------
+        key : str
+            Key from :func:`task_key`.
+        Returns
+        -------
+        Optional[dict]
+            The result, None if the task has not completed yet.
+        """
+        return self.results.get(key)
+
+    def record(self, key: str, result: dict) -> None:
+        """Durably appends the result of a task.
+        Parameters
+        ----------
+        key : str
+            Key from :func:`task_key`.
+        result : dict
+            Result of the fit, json-serialisable.
+        """
+        result = {k: float(v) for k, v in result.items()}
+        self.results[key] = result
+        self._file.write(json.dumps({"task": key, "result": result}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Closes the journal file."""
+        self._file.close()
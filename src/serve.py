@@ -0,0 +1,454 @@
+"""
+This module contains a localhost HTTP prediction service.
+Models and the fitted preprocessor are loaded once at startup. Clients
+ post raw housing rows as JSON to ``/predict`` (or ``/predict/<model>``)
+ and get one prediction per row back; ``/health`` lists the models.
+Requests that queue up while a batch is predicted, or that arrive within
+ an optional latency window after the first one, are coalesced into a
+ micro-batch: one preprocessing pass and one ``predict`` call serve them
+ all, so the fixed cost of a call (input validation, tree
+ traversal setup, a dataframe per call) is paid once per batch rather than
+ once per request. Linear models are predicted by their compiled
+ ``linear_scorer``, which skips the remaining validation.
+Can be run standalone with the model and preprocessor paths as arguments;
+ ``benchmarks/bench_serve.py`` generates load against it.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import warnings
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import Logger
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from house_pricing.linear_scorer import compile_linear
+from house_pricing.model_io import metadata_path, read_metadata
+from house_pricing.preprocessing import HousingPreprocessor, load_preprocessor
+from house_pricing.score import load_model
+
+HOST = "127.0.0.1"
+PORT = 8000
+# requests queued while a batch is predicted always join the next one; a
+# window only pays off with cores to spare while the batch waits
+WINDOW = 0.0
+MAX_ROWS = 1024
+
+
+def parse_args() -> Namespace:
+    """Commandline argument parser for standalone run.
+    Returns
+    -------
+    arparse.Namespace
+        Commandline arguments. Contains keys: ["models": list[str],
+         "preprocessor": str,
+         "host": str,
+         "port": int,
+         "window_ms": float,
+         "max_rows": int,
+         "log_level": str,
+         "no_console_log": bool,
+         "log_path": str]
+    """
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-m",
+        "--models",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Model pickle files or directories. The first one answers "
+        "/predict, every one answers /predict/<file name without .pkl>.",
+    )
+    parser.add_argument(
+        "-p",
+        "--preprocessor",
+        type=str,
+        default="data/processed/preprocessor.pkl",
+        help="Preprocessor fitted by the ingestion.",
+    )
+    parser.add_argument("--host", type=str, default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument(
+        "--window-ms",
+        type=float,
+        default=WINDOW * 1000,
+        help="Milliseconds a batch waits for more requests after its first "
+        "one. 0 only batches requests that arrive while the previous batch "
+        "is predicted.",
+    )
+    parser.add_argument(
+        "--max-rows",
+        type=int,
+        default=MAX_ROWS,
+        help="Rows above which a batch is predicted without waiting.",
+    )
+    parser.add_argument("--log-level", type=str, default="DEBUG")
+    parser.add_argument("--no-console-log", action="store_true")
+    parser.add_argument("--log-path", type=str, default="")
+    return parser.parse_args()
+
+
+class Predictor:
+    """Preprocesses raw rows and predicts them with a fitted model.
+    Parameters
+    ----------
+    model : sklearn.base.BaseEstimator
+        Model fitted on preprocessed data.
+    preprocessor : HousingPreprocessor
+        Preprocessor fitted by the ingestion.
+    impute : bool, optional
+        Impute missing values, False for models trained with them kept,
+        by default True.
+    """
+
+    def __init__(
+        self, model, preprocessor: HousingPreprocessor, impute: bool = True
+    ):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.impute = impute
+        self.raw_columns = preprocessor.numeric_columns_ + [
+            preprocessor.categorical
+        ]
+        names = list(preprocessor.feature_names_)
+        expected = getattr(model, "feature_names_in_", None)
+        # positions of the model's features in the preprocessor output
+        self.order = (
+            None
+            if expected is None or list(expected) == names
+            else [names.index(name) for name in expected]
+        )
+        self._predict = (
+            compile_linear(model).predict
+            if isinstance(model, LinearRegression)
+            else model.predict
+        )
+
+    def __call__(self, rows: list[dict]) -> np.ndarray:
+        """Predicts raw rows.
+        Parameters
+        ----------
+        rows : list[dict]
+            Raw rows as column name to value. Missing and null values are
+            imputed unless the model was trained without imputation, other
+            keys (such as the label) are ignored.
+        Returns
+        -------
+        np.ndarray
+            One prediction per row.
+        """
+        X = self.preprocessor.transform(
+            pd.DataFrame.from_records(rows, columns=self.raw_columns),
+            impute=self.impute,
+        )
+        if self.order is not None:
+            X = X[:, self.order]
+        # the columns are aligned by name here, so arrays are predicted:
+        # wrapping each batch in a dataframe for scikit-learn to check the
+        # names again costs more than predicting a few rows
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                "ignore", "X does not have valid feature names", UserWarning
+            )
+            return self._predict(X)
+
+    def example_row(self) -> dict:
+        """A raw row of medians and the first category, e.g. to warm up."""
+        row = dict(
+            zip(
+                self.preprocessor.numeric_columns_,
+                self.preprocessor.medians_.tolist(),
+            )
+        )
+        row[self.preprocessor.categorical] = self.preprocessor.categories_[0]
+        return row
+
+
+class MicroBatcher:
+    """Coalesces concurrent prediction requests into batches predicted by
+    a single thread.
+    Parameters
+    ----------
+    predict : Callable[[list[dict]], np.ndarray]
+        Predicts a list of rows.
+    window : float, optional
+        Seconds a batch waits for more requests after its first one,
+        by default WINDOW.
+    max_rows : int, optional
+        Rows above which a batch is predicted without waiting, by default
+        MAX_ROWS.
+    """
+
+    def __init__(
+        self,
+        predict: Callable[[list[dict]], np.ndarray],
+        window: float = WINDOW,
+        max_rows: int = MAX_ROWS,
+    ):
+        self.predict = predict
+        self.window = window
+        self.max_rows = max_rows
+        self.n_batches = 0
+        self.n_requests = 0
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: list[dict]) -> Future:
+        """Queues rows for the next batch.
+        Parameters
+        ----------
+        rows : list[dict]
+            Raw rows.
+        Returns
+        -------
+        Future
+            Resolves to the predictions of the rows.
+        """
+        future = Future()
+        self._requests.put((rows, future))
+        return future
+
+    def __call__(self, rows: list[dict]) -> np.ndarray:
+        """Predicts rows within the next batch, waiting for the result."""
+        return self.submit(rows).result()
+
+    def _loop(self) -> None:
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            batch = [request]
+            n_rows = len(request[0])
+            deadline = time.perf_counter() + self.window
+            while n_rows < self.max_rows:
+                try:
+                    request = self._requests.get(
+                        timeout=max(0.0, deadline - time.perf_counter())
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    # predict what was queued, then stop
+                    self._requests.put(None)
+                    break
+                batch.append(request)
+                n_rows += len(request[0])
+            self._run(batch)
+
+    def _run(self, batch: list[tuple[list[dict], Future]]) -> None:
+        rows = [row for request, _ in batch for row in request]
+        try:
+            predictions = self.predict(rows)
+        except Exception as error:
+            if len(batch) > 1:
+                # one at a time, so only the faulty requests fail
+                for request in batch:
+                    self._run([request])
+                return
+            batch[0][1].set_exception(error)
+            return
+        self.n_batches += 1
+        self.n_requests += len(batch)
+        start = 0
+        for request, future in batch:
+            future.set_result(predictions[start : start + len(request)])
+            start += len(request)
+
+    def close(self) -> None:
+        """Predicts the queued requests, then stops the batching thread."""
+        self._requests.put(None)
+        self._thread.join()
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """Answers ``POST /predict[/<model>]`` and ``GET /health``.
+    A request body is a row object, a list of rows or ``{"rows": [...]}``.
+    Malformed requests get a 400 reply, failed predictions a 500 one.
+    """
+
+    # keep-alive connections, replies sent without waiting for acks
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        self._reply(200, {"models": list(self.server.batchers)})
+
+    def do_POST(self) -> None:
+        # read even if unused, the connection is kept for the next request
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        parts = self.path.strip("/").split("/")
+        if parts[0] != "predict" or len(parts) > 2:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        name = parts[1] if len(parts) == 2 else self.server.default
+        if name not in self.server.batchers:
+            self._reply(404, {"error": f"Unknown model {name}"})
+            return
+        try:
+            body = json.loads(body)
+            rows = body.get("rows", [body]) if isinstance(body, dict) else body
+            if not isinstance(rows, list) or not all(
+                isinstance(row, dict) for row in rows
+            ):
+                raise TypeError("Expected a row object or a list of rows.")
+            predictions = (
+                self.server.batchers[name](rows) if rows else np.empty(0)
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            self._reply(400, {"error": f"{type(error).__name__}: {error}"})
+            return
+        except Exception as error:
+            if self.server.logger is not None:
+                self.server.logger.exception(f"Prediction with {name} failed.")
+            self._reply(500, {"error": f"{type(error).__name__}: {error}"})
+            return
+        self._reply(200, {"model": name, "predictions": predictions.tolist()})
+
+    def _reply(self, status: int, content: dict) -> None:
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.logger is not None:
+            self.server.logger.debug(format % args)
+
+
+class PredictionServer(ThreadingHTTPServer):
+    """HTTP server holding one micro-batcher per model.
+    Parameters
+    ----------
+    address : tuple[str, int]
+        Host and port to listen on.
+    predictors : dict[str, Predictor]
+        Predictor per model name; the first answers ``/predict``.
+    window : float, optional
+        Batching window in seconds, by default WINDOW.
+    max_rows : int, optional
+        Rows above which a batch does not wait, by default MAX_ROWS.
+    logger : Logger, optional
+        Logs the requests at debug level, by default None.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        predictors: dict[str, Predictor],
+        window: float = WINDOW,
+        max_rows: int = MAX_ROWS,
+        logger: Optional[Logger] = None,
+    ):
+        self.batchers = {
+            name: MicroBatcher(predictor, window, max_rows)
+            for name, predictor in predictors.items()
+        }
+        self.default = next(iter(predictors))
+        self.logger = logger
+        super().__init__(address, PredictionHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        for batcher in self.batchers.values():
+            batcher.close()
+
+
+def load_predictors(
+    model_paths: list[str], preprocessor_path: str
+) -> dict[str, Predictor]:
+    """Loads models and the preprocessor, and predicts one row with each
+    model so the first request does not pay for lazy initialisation.
+    Models whose metadata says they were trained on unimputed features are
+    served them unimputed too.
+    Parameters
+    ----------
+    model_paths : list[str]
+        Model pickle files or directories.
+    preprocessor_path : str
+        Preprocessor pickle file.
+    Returns
+    -------
+    dict[str, Predictor]
+        Predictor per model name (file name without ".pkl").
+    """
+    preprocessor = load_preprocessor(preprocessor_path)
+    predictors = {}
+    for path in model_paths:
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        metadata = (
+            read_metadata(path)
+            if os.path.isfile(metadata_path(path))
+            else {}
+        )
+        predictor = Predictor(
+            load_model(path), preprocessor, metadata.get("imputed", True)
+        )
+        predictor([predictor.example_row()])
+        predictors[name] = predictor
+    return predictors
+
+
+def run(args: Namespace, logger: Logger) -> None:
+    """Serves predictions according to given commandline arguments until
+    interrupted.
+    Parameters
+    ----------
+    args : Namespace
+        Commandline arguments from parse_args.
+    logger : Logger
+        Logs the outputs.
+    """
+    start = time.perf_counter()
+    predictors = load_predictors(args.models, args.preprocessor)
+    logger.info(
+        f"Loaded {', '.join(predictors)} in "
+        f"{time.perf_counter() - start:.2f} s."
+    )
+    server = PredictionServer(
+        (args.host, args.port),
+        predictors,
+        args.window_ms / 1000,
+        args.max_rows,
+        logger,
+    )
+    logger.info(f"Serving on http://{args.host}:{server.server_port}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for name, batcher in server.batchers.items():
+            logger.info(
+                f"{name}: {batcher.n_requests} requests in "
+                f"{batcher.n_batches} batches."
+            )
+
+
+if __name__ == "__main__":
+    from house_pricing.logger import configure_logger
+
+    args = parse_args()
+    logger = configure_logger(
+        log_level=args.log_level,
+        console=not args.no_console_log,
+        log_file=args.log_path,
+    )
+
+    run(args, logger)
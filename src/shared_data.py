@@ -0,0 +1,261 @@
+"""
+This module contains a dataset handle shared by parallel workers.
+The feature matrix and labels are written once to memory-mapped files
+ (in /dev/shm when available) or, for "npy" datasets, the dataset files
+ are mapped directly. The handle itself only pickles file names and
+ shapes, so every worker maps the same pages instead of receiving its own
+ copy and memory stays close to one copy of the data whatever the number
+ of workers.
+"""
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from house_pricing.dataset_io import (
+    FEATURES_FILE,
+    LABELS_FILE,
+    DatasetWriter,
+    is_npy_dataset,
+    iter_dataset,
+    read_manifest,
+)
+
+SHM_DIR = "/dev/shm"
+# csv rows parsed at a time by from_dataset
+CHUNKSIZE = 100_000
+
+
+def _temp_dir() -> str:
+    """Temporary directory in shared memory if the system has one."""
+    parent = SHM_DIR if os.access(SHM_DIR, os.W_OK) else None
+    return tempfile.mkdtemp(prefix="house_pricing_", dir=parent)
+
+
+class SharedDataset:
+    """Memory-mapped features and labels that can be sent to workers.
+    Use :meth:`create` or :meth:`from_xy` rather than the constructor,
+    and as a context manager so created files are removed.
+    Parameters
+    ----------
+    arrays : dict[str, tuple[str, str, tuple]]
+        File, dtype and shape of "X" and "y".
+    columns : list[str], optional
+        Feature names. If given, ``X`` is a dataframe wrapping the mapped
+        matrix, by default None.
+    directory : str, optional
+        Directory owned by this handle, removed by ``close``,
+        by default None.
+    """
+
+    def __init__(
+        self,
+        arrays: dict[str, tuple[str, str, tuple]],
+        columns: Optional[list[str]] = None,
+        directory: Optional[str] = None,
+    ):
+        self.arrays = arrays
+        self.columns = columns
+        self.directory = directory
+        self._mapped = {}
+
+    @classmethod
+    def create(cls, X, y, directory: Optional[str] = None) -> "SharedDataset":
+        """Copies features and labels into new memory-mapped files.
+        Parameters
+        ----------
+        X : array-like
+            Feature matrix or dataframe.
+        y : array-like
+            Labels.
+        directory : str, optional
+            Where to write the files, by default a new temporary directory
+            in shared memory.
+        Returns
+        -------
+        SharedDataset
+            Handle owning the new files.
+        """
+        directory = os.path.abspath(directory or _temp_dir())
+        columns = list(X.columns) if hasattr(X, "columns") else None
+        arrays = {}
+        for name, file_name, values in (
+            ("X", FEATURES_FILE, X),
+            ("y", LABELS_FILE, y),
+        ):
+            values = np.asarray(values)
+            path = os.path.join(directory, file_name)
+            if values.size:
+                mapped = np.memmap(
+                    path, dtype=values.dtype, mode="w+", shape=values.shape
+                )
+                mapped[:] = values
+                mapped.flush()
+                del mapped
+            arrays[name] = (path, values.dtype.str, values.shape)
+        return cls(arrays, columns, directory)
+
+    @classmethod
+    def from_npy_dataset(cls, path: str) -> "SharedDataset":
+        """Maps the files of an "npy" dataset without copying them.
+        Parameters
+        ----------
+        path : str
+            Dataset directory.
+        Returns
+        -------
+        SharedDataset
+            Handle on the dataset files, which it does not own.
+        """
+        manifest = read_manifest(path)
+        n_rows = manifest["n_rows"]
+        # absolute, so workers started elsewhere find the files
+        path = os.path.abspath(path)
+        arrays = {
+            "X": (
+                os.path.join(path, FEATURES_FILE),
+                manifest["dtype"],
+                (n_rows, len(manifest["features"])),
+            ),
+            "y": (os.path.join(path, LABELS_FILE), manifest["dtype"], (n_rows,)),
+        }
+        return cls(arrays, manifest["features"])
+
+    @classmethod
+    def from_xy(cls, X, y, path: Optional[str] = None) -> "SharedDataset":
+        """Maps the dataset at path if it is an "npy" dataset with labels,
+        otherwise copies X and y into shared memory.
+        Parameters
+        ----------
+        X : array-like
+            Features loaded from path.
+        y : array-like
+            Labels loaded from path.
+        path : str, optional
+            Dataset the arrays were loaded from, by default None.
+        Returns
+        -------
+        SharedDataset
+            The handle.
+        """
+        if (
+            path is not None
+            and is_npy_dataset(path)
+            and read_manifest(path)["label"] is not None
+        ):
+            return cls.from_npy_dataset(path)
+        return cls.create(X, y)
+
+    @classmethod
+    def from_dataset(
+        cls, path: str, chunksize: int = CHUNKSIZE
+    ) -> "SharedDataset":
+        """Maps an "npy" dataset, or streams a csv dataset chunk by chunk
+        into an "npy" copy in shared memory, so the parsed rows are never
+        held in memory besides the shared copy.
+        Parameters
+        ----------
+        path : str
+            Csv file or dataset directory, with labels.
+        chunksize : int, optional
+            Csv rows parsed at a time, by default CHUNKSIZE.
+        Returns
+        -------
+        SharedDataset
+            The handle, owning the copy of a csv dataset.
+        """
+        if is_npy_dataset(path):
+            if read_manifest(path)["label"] is None:
+                raise ValueError(f"Dataset {path} has no labels.")
+            return cls.from_npy_dataset(path)
+        directory = _temp_dir()
+        try:
+            with DatasetWriter(directory, "npy") as writer:
+                for chunk in iter_dataset(path, chunksize):
+                    writer.write(chunk)
+            if read_manifest(directory)["label"] is None:
+                raise ValueError(f"Dataset {path} has no labels.")
+            shared = cls.from_npy_dataset(directory)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        shared.directory = directory
+        return shared
+
+    def stage(self, directory: str) -> "SharedDataset":
+        """Hard-links the files into a directory, or copies them where a
+        link is impossible (e.g. from /dev/shm to another filesystem).
+        Parameters
+        ----------
+        directory : str
+            Existing directory, such as one on a filesystem other hosts
+            mount.
+        Returns
+        -------
+        SharedDataset
+            Handle owning the staged files, by absolute path.
+        """
+        directory = os.path.abspath(directory)
+        arrays = {}
+        for name, (path, dtype, shape) in self.arrays.items():
+            target = os.path.join(directory, os.path.basename(path))
+            if np.prod(shape):
+                try:
+                    os.link(path, target)
+                except OSError:
+                    shutil.copyfile(path, target)
+            arrays[name] = (target, dtype, shape)
+        return type(self)(arrays, self.columns, directory)
+
+    def _map(self, name: str) -> np.ndarray:
+        if name not in self._mapped:
+            path, dtype, shape = self.arrays[name]
+            if np.prod(shape) == 0:
+                self._mapped[name] = np.empty(shape, dtype=dtype)
+            else:
+                self._mapped[name] = np.memmap(
+                    path, dtype=dtype, mode="r", shape=tuple(shape)
+                )
+        return self._mapped[name]
+
+    @property
+    def X(self):
+        """Read-only features, a dataframe if feature names are known."""
+        X = self._map("X")
+        if self.columns is None:
+            return X
+        return pd.DataFrame(X, columns=self.columns, copy=False)
+
+    @property
+    def y(self) -> np.ndarray:
+        """Read-only labels."""
+        return self._map("y")
+
+    def __len__(self) -> int:
+        return self.arrays["y"][2][0]
+
+    def __getstate__(self) -> dict:
+        # workers map the files themselves, nothing else is sent
+        return {
+            "arrays": self.arrays,
+            "columns": self.columns,
+            "directory": None,
+            "_mapped": {},
+        }
+
+    def close(self) -> None:
+        """Removes the files created by :meth:`create`, :meth:`stage` or
+        :meth:`from_dataset`."""
+        self._mapped = {}
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def __enter__(self) -> "SharedDataset":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,124 @@
+"""
+This module contains a mergeable quantile sketch.
+It is used to estimate imputation medians of datasets that are too big
+ to be loaded in memory at once.
+"""
+import numpy as np
+
+
+class QuantileSketch:
+    """Mergeable streaming quantile sketch (compactor hierarchy).
+
+    Values are kept exactly while fewer than ``k`` of them have been seen.
+    After that, full levels are sorted and every other item is promoted
+    to the next level with twice the weight, so memory stays
+    ``O(k * log(n / k))`` and the rank error of a quantile stays around
+    ``log2(n / k) / k``.
+
+    Parameters
+    ----------
+    k : int, optional
+        Capacity of each level, by default 2048.
+    random_state : int, optional
+        Seed of the generator that picks which half of a level is promoted,
+        by default 42.
+    """
+
+    def __init__(self, k: int = 2048, random_state: int = 42):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(random_state)
+
+    def update(self, values) -> "QuantileSketch":
+        """Adds values to the sketch. Missing values are ignored.
+        Parameters
+        ----------
+        values : array-like
+            Values to add.
+        Returns
+        -------
+        QuantileSketch
+            The sketch itself.
+        """
+        if hasattr(values, "to_numpy"):
+            # pandas nullable integers hold pd.NA, not NaN
+            values = values.to_numpy(dtype=float, na_value=np.nan)
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.n += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Merges another sketch into this one.
+        Parameters
+        ----------
+        other : QuantileSketch
+            Sketch built on another part of the data.
+        Returns
+        -------
+        QuantileSketch
+            The sketch itself.
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self.k:
+                items = np.sort(items)
+                # an odd item out stays on this level so weights add up to n
+                keep = items[items.size - items.size % 2:]
+                pairs = items[: items.size - items.size % 2]
+                promoted = pairs[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate(
+                    [self.levels[level + 1], promoted]
+                )
+            level += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimates the q-th quantile of the values seen so far.
+        Exact (same as ``np.quantile``) while nothing has been compacted.
+        Parameters
+        ----------
+        q : float
+            Quantile to compute, between 0 and 1.
+        Returns
+        -------
+        float
+            Estimated quantile, NaN if the sketch is empty.
+        """
+        if self.n == 0:
+            return np.nan
+        if len(self.levels) == 1:
+            return float(np.quantile(self.levels[0], q))
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(lvl.size, 2.0**h) for h, lvl in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1])
+        return float(items[order][min(position, items.size - 1)])
+
+    def median(self) -> float:
+        """Estimates the median of the values seen so far.
+        Returns
+        -------
+        float
+            Estimated median.
+        """
+        return self.quantile(0.5)
@@ -0,0 +1,335 @@
+"""
+This module contains a synthetic housing data generator for scale testing.
+It learns the joint distribution of the real housing data (a Gaussian copula
+ over the empirical marginals, "ocean_proximity" frequencies and the
+ missing-value rate of every column) and streams any number of rows in
+ parallel chunks with a fixed seed.
+Running this standalone writes a raw csv that ``ingest_data`` reads with
+ ``--url <output>``, or a processed npy dataset that the training and
+ scoring entry points read directly.
+"""
+import json
+import os
+from argparse import ArgumentParser, Namespace
+from logging import Logger
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from house_pricing.data_cache import cached_fetch, open_csv_member
+from house_pricing.dataset_io import FORMATS, DatasetWriter
+from house_pricing.ingest_data import HOUSING_URL
+from house_pricing.logger import configure_logger
+from house_pricing.preprocessing import HousingPreprocessor
+from house_pricing.schema import RAW_DTYPES
+from joblib import Parallel, delayed
+from scipy import special
+
+N_QUANTILES = 1001
+CATEGORICAL = "ocean_proximity"
+
+
+def parse_args() -> Namespace:
+    """Commandline argument parser for standalone run.
+    Returns
+    -------
+    arparse.Namespace
+        Commandline arguments. Contains keys: ["source": str,
+         "raw": str,
+         "model": str,
+         "rows": int,
+         "output": str,
+         "format": str,
+         "chunksize": int,
+         "n_jobs": int,
+         "seed": int,
+         "log_level": str,
+         "no_console_log": bool,
+         "log_path": str]
+    """
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--source",
+        type=str,
+        default=HOUSING_URL,
+        help="Real housing data to learn from (url, archive or csv).",
+    )
+    parser.add_argument(
+        "-r",
+        "--raw",
+        type=str,
+        default="data/raw/",
+        help="Download cache directory of the real dataset.",
+    )
+    parser.add_argument(
+        "-m",
+        "--model",
+        type=str,
+        default="",
+        help="Json file of the learned distribution. Loaded if it exists, "
+        "else learned from --source and saved there.",
+    )
+    parser.add_argument(
+        "-n", "--rows", type=int, default=1_000_000, help="Rows to generate."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="data/synthetic/housing.csv",
+        help="Output csv file (raw rows) or npy directory (processed rows).",
+    )
+    parser.add_argument(
+        "-f", "--format", type=str, choices=FORMATS, default="csv"
+    )
+    parser.add_argument("-c", "--chunksize", type=int, default=100_000)
+    parser.add_argument("-j", "--n-jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", type=str, default="DEBUG")
+    parser.add_argument("--no-console-log", action="store_true")
+    parser.add_argument("--log-path", type=str, default="")
+    return parser.parse_args()
+
+
+def _decimals(values: np.ndarray) -> int:
+    for decimals in range(7):
+        if np.allclose(np.round(values, decimals), values, rtol=0, atol=1e-9):
+            return decimals
+    return 6
+
+
+def _normal_scores(values: np.ndarray) -> np.ndarray:
+    ranks = pd.Series(values).rank(method="average").to_numpy()
+    return special.ndtri(ranks / (np.count_nonzero(~np.isnan(values)) + 1))
+
+
+def learn_distribution(df: pd.DataFrame) -> dict:
+    """Learns the joint distribution of raw housing data.
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Raw housing data.
+    Returns
+    -------
+    dict
+        Json-serialisable model with, per numeric column, quantiles,
+        missing rate and rounding, the category frequencies and the
+        correlation matrix of the Gaussian copula.
+    """
+    grid = np.linspace(0, 1, N_QUANTILES)
+    numeric = {}
+    scores = []
+    for column in df.columns:
+        if column == CATEGORICAL:
+            continue
+        values = df[column].to_numpy(dtype=float, na_value=np.nan)
+        present = values[~np.isnan(values)]
+        numeric[column] = {
+            "quantiles": np.quantile(present, grid).tolist(),
+            "missing_rate": float(np.isnan(values).mean()),
+            "decimals": _decimals(present),
+        }
+        scores.append(_normal_scores(values))
+
+    counts = df[CATEGORICAL].value_counts(normalize=True, sort=False)
+    counts = counts[counts > 0].sort_index()
+    # categories enter the copula through their cumulative frequency bins
+    codes = pd.Categorical(df[CATEGORICAL], categories=counts.index).codes
+    scores.append(_normal_scores(np.where(codes < 0, np.nan, codes)))
+
+    scores = np.column_stack(scores)
+    complete = scores[~np.isnan(scores).any(axis=1)]
+    correlation = np.corrcoef(complete, rowvar=False)
+    return {
+        "columns": list(df.columns),
+        "numeric": numeric,
+        "categories": [str(c) for c in counts.index],
+        "probabilities": counts.to_numpy().tolist(),
+        "correlation": correlation.tolist(),
+    }
+
+
+def save_distribution(model: dict, path: str) -> None:
+    """Saves a learned distribution as json.
+    Parameters
+    ----------
+    model : dict
+        Model from :func:`learn_distribution`.
+    path : str
+        Json file path.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(model, file)
+
+
+def load_distribution(path: str) -> dict:
+    """Loads a distribution saved by :func:`save_distribution`.
+    Parameters
+    ----------
+    path : str
+        Json file path.
+    Returns
+    -------
+    dict
+        The learned distribution.
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def generate_chunk(model: dict, n_rows: int, seed) -> pd.DataFrame:
+    """Samples raw housing rows from a learned distribution.
+    Parameters
+    ----------
+    model : dict
+        Model from :func:`learn_distribution`.
+    n_rows : int
+        Number of rows.
+    seed : int or np.random.SeedSequence
+        Seed of this chunk.
+    Returns
+    -------
+    pd.DataFrame
+        Raw rows with the same columns as the real data.
+    """
+    rng = np.random.default_rng(seed)
+    correlation = np.asarray(model["correlation"])
+    # a little jitter keeps the factorisation stable for near-singular input
+    jitter = 1e-9 * np.eye(len(correlation))
+    cholesky = np.linalg.cholesky(correlation + jitter)
+    normals = rng.standard_normal((n_rows, len(correlation))) @ cholesky.T
+    uniforms = special.ndtr(normals)
+
+    grid = np.linspace(0, 1, N_QUANTILES)
+    columns = {}
+    for j, (column, spec) in enumerate(model["numeric"].items()):
+        values = np.interp(uniforms[:, j], grid, spec["quantiles"])
+        values = np.round(values, spec["decimals"])
+        values[rng.random(n_rows) < spec["missing_rate"]] = np.nan
+        columns[column] = values
+
+    cumulative = np.cumsum(model["probabilities"])
+    codes = np.searchsorted(cumulative / cumulative[-1], uniforms[:, -1])
+    codes = np.minimum(codes, len(cumulative) - 1)
+    columns[CATEGORICAL] = pd.Categorical.from_codes(
+        codes, categories=model["categories"]
+    )
+    df = pd.DataFrame(columns)[model["columns"]]
+    return df.astype(
+        {c: t for c, t in RAW_DTYPES.items() if c in df and c != CATEGORICAL}
+    )
+
+
+def generate(
+    model: dict,
+    n_rows: int,
+    chunksize: int = 100_000,
+    seed: int = 42,
+    n_jobs: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """Streams synthetic rows in chunks generated in parallel.
+    Chunk i is seeded from ``np.random.SeedSequence(seed)``, so the output
+    only depends on seed and chunksize, not on n_jobs.
+    Parameters
+    ----------
+    model : dict
+        Model from :func:`learn_distribution`.
+    n_rows : int
+        Total number of rows.
+    chunksize : int, optional
+        Rows per chunk, by default 100_000.
+    seed : int, optional
+        Random seed, by default 42.
+    n_jobs : int, optional
+        Number of parallel jobs, by default None (one).
+    Yields
+    ------
+    pd.DataFrame
+        Consecutive chunks, indexed by global row number.
+    """
+    sizes = [min(chunksize, n_rows - s) for s in range(0, n_rows, chunksize)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = Parallel(n_jobs=n_jobs, return_as="generator")(
+        delayed(generate_chunk)(model, size, s) for size, s in zip(sizes, seeds)
+    )
+    start = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def write_raw_csv(chunks: Iterable[pd.DataFrame], path: str) -> int:
+    """Writes raw rows in the layout of the real housing csv.
+    Parameters
+    ----------
+    chunks : Iterable[pd.DataFrame]
+        Raw chunks, e.g. from :func:`generate`.
+    path : str
+        Output csv file.
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    n_rows = 0
+    with open(path, "w", newline="") as file:
+        for chunk in chunks:
+            chunk.to_csv(file, header=n_rows == 0, index=False)
+            n_rows += len(chunk)
+    return n_rows
+
+
+def run(args: Namespace, logger: Logger) -> None:
+    """Learns (or loads) the distribution and writes the synthetic rows.
+    Parameters
+    ----------
+    args : Namespace
+        Commandline arguments from parse_args.
+    logger : Logger
+        Logger to log the state while running.
+    """
+    if args.model and os.path.exists(args.model):
+        model = load_distribution(args.model)
+        logger.debug(f"Loaded distribution from {args.model}.")
+    else:
+        source = cached_fetch(args.source, args.raw)
+        with open_csv_member(source) as file:
+            model = learn_distribution(pd.read_csv(file))
+        logger.debug(f"Learned distribution from {source}.")
+        if args.model:
+            save_distribution(model, args.model)
+
+    preprocessor = None
+    if args.format == "npy":
+        medians = {
+            column: spec["quantiles"][N_QUANTILES // 2]
+            for column, spec in model["numeric"].items()
+        }
+        preprocessor = HousingPreprocessor.from_statistics(
+            medians, model["categories"]
+        )
+
+    logger.debug(f"Generating {args.rows} rows...")
+    chunks = generate(model, args.rows, args.chunksize, args.seed, args.n_jobs)
+    if args.format == "csv":
+        write_raw_csv(chunks, args.output)
+    else:
+        with DatasetWriter(args.output, "npy") as writer:
+            for chunk in chunks:
+                writer.write(preprocessor.transform_frame(chunk))
+    logger.debug(f"Synthetic data stored at {args.output}.")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logger = configure_logger(
+        log_level=args.log_level,
+        log_file=args.log_path,
+        console=not args.no_console_log,
+    )
+
+    run(args, logger)
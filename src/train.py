@@ -5,16 +5,23 @@ This script loads a dataset, trains a Linear Regression model, and saves the tra
 
 Functions:
 - setup_logging(log_level, log_file, console): Configures logging with the specified log level, file, and console output.
-- load_data(file_path): Loads data from a CSV file at the specified path.
+- load_data(file_path, cache_dir): Loads data from a CSV file or npy dataset directory at the specified path, through the feature cache if a cache directory is given.
 - train_model(train_data): Trains a Linear Regression model on the provided training data.
-- save_model(model, output_path): Saves the trained model to the specified output directory.
+- train_boosting_model(train_data): Trains a histogram gradient boosting model with early stopping on the provided training data.
+- train_model_streaming(input_path, chunksize, n_jobs): Trains the same Linear Regression model reading the dataset in chunks.
+- save_model(model, output_path, model_format, data_hash): Saves the trained model to the specified output directory.
 
 Command-line Arguments:
-- --input_path (str): Required. Path to the input CSV file containing the training dataset.
+- --input_path (str): Required. Path to the input CSV file or npy dataset directory containing the training dataset.
 - --output_path (str): Required. Directory path where the trained model will be saved.
 - --log_level (str): Optional. Logging level. Choices are DEBUG, INFO, WARNING, ERROR, CRITICAL. Default is INFO.
 - --log_file (str): Optional. Path to the log file. Default is 'train.log'.
 - --console (bool): Optional. If specified, enables console logging in addition to file logging.
+- --chunksize (int): Optional. If given, trains out of core reading this many rows at a time. Default is 0 (in memory).
+- --n_jobs (int): Optional. Processes reading an npy dataset in streaming mode. Default is 1.
+- --model (str): Optional. Model family, 'linear' or 'boosting'. Default is 'linear'. Boosting is trained in memory, on the unimputed dataset ingest_data.py writes with --unimputed (e.g. housing_train_unimputed.csv) since it handles missing values itself.
+- --cache_dir (str): Optional. Feature cache directory: CSV datasets are converted once to a binary copy read on later runs. Default is no cache.
+- --model_format (str): Optional. 'pickle' saves model.pkl, 'mmap', 'compressed' or 'flat' a model directory with a metadata header ('flat' stores trees and forests as flattened predictors, which only predict). Default is 'pickle'.
 
 Example Usage:
 python train_model.py --input_path data/train.csv --output_path models/ --log_level DEBUG --console
@@ -22,12 +29,18 @@ python train_model.py --input_path data/train.csv --output_path models/ --log_le
 
 
 import os
-import joblib
-import pandas as pd
 from sklearn.linear_model import LinearRegression
 import argparse
 import logging
 
+from house_pricing.boosting import make_booster
+from house_pricing.dataset_io import read_dataset
+from house_pricing.feature_cache import cached_path
+from house_pricing.linear_stats import stream_linear_stats
+from house_pricing.model_io import model_path, write_model
+from house_pricing.schema import memory_report
+from house_pricing.search_journal import dataset_hash
+
 def setup_logging(log_level, log_file, console):
     
     log_format = "%(asctime)s - %(levelname)s - %(message)s"
@@ -39,24 +52,28 @@ def setup_logging(log_level, log_file, console):
         console_handler.setFormatter(logging.Formatter(log_format))
         logging.getLogger().addHandler(console_handler)
 
-def load_data(file_path):
+def load_data(file_path, cache_dir=None):
     """
-    Load a model from a file.
+    Load data from a CSV file or npy dataset directory.
 
     Parameters:
-    - model_path (str): Path to the model file.
+    - file_path (str): Path to the CSV file or npy dataset directory.
+    - cache_dir (str): Feature cache directory. If given, a CSV file is read from its cached binary copy, made on the first read.
 
     Returns:
-    - model: The loaded model.
+    - pd.DataFrame: The loaded dataset.
     """
     logging.info(f"Loading data from {file_path}")
-    return pd.read_csv(file_path)
+    data = read_dataset(cached_path(file_path, cache_dir))
+    logging.info(f"Loaded data. {memory_report(data)}")
+    return data
 
 def train_model(train_data):
      
     logging.info("Training model...")
-    housing = train_data.drop("median_house_value", axis=1)
-    housing_labels = train_data["median_house_value"].copy()
+    # float64 like the streaming fit: float32 least squares loses digits
+    housing = train_data.drop("median_house_value", axis=1).astype("float64")
+    housing_labels = train_data["median_house_value"].astype("float64")
 
     model = LinearRegression()
     model.fit(housing, housing_labels)
@@ -64,18 +81,88 @@ def train_model(train_data):
     
     return model
 
-def save_model(model, output_path):
+def train_boosting_model(train_data):
+    """
+    Train a histogram gradient boosting model.
+
+    Features are binned from the training rows; missing values are handled
+    by the trees, so train_data should be the unimputed dataset, and
+    boosting stops when the score on 10% held-out rows stops improving.
+
+    Parameters:
+    - train_data (pd.DataFrame): Training features and labels.
+
+    Returns:
+    - HistGradientBoostingRegressor: The fitted model.
+    """
+    logging.info("Training boosting model...")
+    housing = train_data.drop("median_house_value", axis=1)
+    housing_labels = train_data["median_house_value"]
+
+    model = make_booster(random_state=42)
+    model.fit(housing, housing_labels)
+    logging.info(f"Model training complete after {model.n_iter_} rounds.")
+    return model
+
+def train_model_streaming(input_path, chunksize, n_jobs=1):
+    """
+    Train a Linear Regression model without loading the dataset in memory.
+
+    The dataset is read in chunks into least squares statistics that take
+    O(features^2) memory, then solved for the same coefficients as
+    train_model.
+
+    Parameters:
+    - input_path (str): Path to the CSV file or npy dataset directory.
+    - chunksize (int): Number of rows read at a time.
+    - n_jobs (int): Processes reading parts of an npy dataset in parallel.
+
+    Returns:
+    - LinearRegression: The fitted model.
+    """
+    logging.info(f"Training model out of core, {chunksize} rows per chunk...")
+    stats = stream_linear_stats(input_path, chunksize, n_jobs)
+    model = stats.to_model()
+    logging.info(f"Model training complete on {stats.n_rows} rows.")
+    return model
+
+def save_model(model, output_path, model_format="pickle", data_hash=None, imputed=True):
+    """
+    Save the model as model.pkl, or as a "model" directory in the
+    "mmap", "compressed" or "flat" formats of house_pricing.model_io.
+
+    Parameters:
+    - model: The fitted model.
+    - output_path (str): Directory to save the model in.
+    - model_format (str): 'pickle', 'mmap', 'compressed' or 'flat'.
+    - data_hash (str): Hash of the training data, kept in the metadata.
+    - imputed (bool): Whether the training features were imputed, kept in the metadata so the model is served features alike.
+    """
     os.makedirs(output_path, exist_ok=True)
-    model_file = os.path.join(output_path, "model.pkl")
-    joblib.dump(model, model_file)
+    model_file = model_path(output_path, "model", model_format)
+    write_model(model, model_file, model_format, data_hash, imputed)
     logging.info(f"Model saved to {model_file}")
 
 
-def main(input_path, output_path, log_level, log_file, console):
+def main(input_path, output_path, log_level, log_file, console, chunksize=0, n_jobs=1, family="linear", model_format="pickle", cache_dir=None):
     setup_logging(log_level, log_file, console)
-    train_data = load_data(input_path)
-    model = train_model(train_data)
-    save_model(model, output_path)
+    data_hash = None
+    imputed = True
+    if chunksize and family != "boosting":
+        model = train_model_streaming(input_path, chunksize, n_jobs)
+    else:
+        train_data = load_data(input_path, cache_dir)
+        data_hash = dataset_hash(
+            train_data.drop("median_house_value", axis=1),
+            train_data["median_house_value"],
+        )
+        # the boosting family may be trained with missing values kept
+        imputed = not train_data.isna().any(axis=None)
+        if family == "boosting":
+            model = train_boosting_model(train_data)
+        else:
+            model = train_model(train_data)
+    save_model(model, output_path, model_format, data_hash, imputed)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Train model script")
@@ -84,7 +171,12 @@ if __name__ == "__main__":
     parser.add_argument("--log_level", type=str, default="INFO", help="Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)")
     parser.add_argument("--log_file", type=str, default="train.log", help="Log file path")
     parser.add_argument("--console", action="store_true", help="Enable console logging")
+    parser.add_argument("--chunksize", type=int, default=0, help="Train out of core reading this many rows at a time")
+    parser.add_argument("--n_jobs", type=int, default=1, help="Processes reading an npy dataset in streaming mode")
+    parser.add_argument("--model", type=str, choices=["linear", "boosting"], default="linear", help="Model family to train")
+    parser.add_argument("--model_format", type=str, choices=["pickle", "mmap", "compressed", "flat"], default="pickle", help="Storage format of the model")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Feature cache directory")
     args = parser.parse_args()
     
-    main(args.input_path, args.output_path, args.log_level, args.log_file, args.console)
+    main(args.input_path, args.output_path, args.log_level, args.log_file, args.console, args.chunksize, args.n_jobs, args.model, args.model_format, args.cache_dir)
     
\ No newline at end of file
@@ -0,0 +1,389 @@
+"""
+This module contains a task queue in a SQLite file for searches spread over
+ several worker processes.
+A coordinator submits a batch: a function, a context shared by all the
+ tasks of the batch (pickled once) and one small item per task. Workers on
+ this host, or on other hosts mounting the same path, claim pending tasks,
+ run ``func(context, item)`` and write the pickled result back. A task
+ claimed by a worker that died is claimed again once its lease expires.
+ The coordinator runs tasks itself while it waits, so a search completes
+ even with no worker started.
+Can be run standalone as a worker with the queue path as argument. SQLite
+ relies on file locks, so a queue shared between hosts needs a network
+ filesystem with working locks.
+"""
+import os
+import pickle
+import socket
+import sqlite3
+import time
+import traceback
+import uuid
+from argparse import ArgumentParser, Namespace
+from logging import Logger
+from multiprocessing import get_context
+from typing import Callable, Iterable, Iterator, Optional
+
+LEASE = 3600.0
+POLL = 0.2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    func BLOB NOT NULL,
+    context BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    batch TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    item BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    claimed REAL,
+    result BLOB
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def parse_args() -> Namespace:
+    """Commandline argument parser for standalone run.
+    Returns
+    -------
+    arparse.Namespace
+        Commandline arguments. Contains keys: ["queue": str,
+         "wait": bool,
+         "lease": float,
+         "log_level": str,
+         "no_console_log": bool,
+         "log_path": str]
+    """
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-q",
+        "--queue",
+        type=str,
+        required=True,
+        help="Path of the SQLite queue file shared with the coordinator.",
+    )
+    parser.add_argument(
+        "-w",
+        "--wait",
+        action="store_true",
+        help="Keep polling for new tasks until the coordinator closes the "
+        "queue, instead of exiting when no task is pending.",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=LEASE,
+        help="Seconds after which a task claimed by a silent worker is "
+        "claimed again.",
+    )
+    parser.add_argument("--log-level", type=str, default="DEBUG")
+    parser.add_argument("--no-console-log", action="store_true")
+    parser.add_argument("--log-path", type=str, default="")
+    return parser.parse_args()
+
+
+class TaskError(RuntimeError):
+    """A queued task raised an exception in a worker."""
+
+
+class WorkQueue:
+    """Connection to a task queue file, created if it does not exist.
+    Parameters
+    ----------
+    path : str
+        SQLite file of the queue.
+    lease : float, optional
+        Seconds after which a claimed task that has no result is handed to
+        another worker, by default LEASE.
+    """
+
+    def __init__(self, path: str, lease: float = LEASE):
+        self.path = path
+        self.lease = lease
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.executescript(SCHEMA)
+        self._contexts = {}
+
+    def submit(self, func: Callable, context, items: Iterable) -> str:
+        """Adds a batch of tasks ``func(context, item)``.
+        Parameters
+        ----------
+        func : Callable
+            Module-level function, pickled by reference.
+        context
+            Picklable data shared by the tasks of the batch.
+        items : Iterable
+            Picklable argument of each task.
+        Returns
+        -------
+        str
+            Id of the batch.
+        """
+        batch = uuid.uuid4().hex
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "INSERT INTO batches VALUES (?, ?, ?)",
+                (batch, pickle.dumps(func), pickle.dumps(context, protocol=5)),
+            )
+            self._db.executemany(
+                "INSERT INTO tasks (batch, position, item) VALUES (?, ?, ?)",
+                (
+                    (batch, position, pickle.dumps(item))
+                    for position, item in enumerate(items)
+                ),
+            )
+        return batch
+
+    def _claim(self) -> Optional[tuple]:
+        """Marks the oldest pending (or abandoned) task as ours."""
+        now = time.time()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            task = self._db.execute(
+                "SELECT id, batch, item FROM tasks "
+                "WHERE status = 'pending' "
+                "OR (status = 'running' AND claimed < ?) "
+                "ORDER BY id LIMIT 1",
+                (now - self.lease,),
+            ).fetchone()
+            if task is not None:
+                self._db.execute(
+                    "UPDATE tasks SET status = 'running', worker = ?, "
+                    "claimed = ? WHERE id = ?",
+                    (self.worker, now, task[0]),
+                )
+        return task
+
+    def _context(self, batch: str) -> tuple:
+        if batch not in self._contexts:
+            func, context = self._db.execute(
+                "SELECT func, context FROM batches WHERE id = ?", (batch,)
+            ).fetchone()
+            self._contexts = {batch: (pickle.loads(func), pickle.loads(context))}
+        return self._contexts[batch]
+
+    def run_one(self) -> bool:
+        """Claims and runs one task.
+        Returns
+        -------
+        bool
+            Whether there was a task to run.
+        """
+        task = self._claim()
+        if task is None:
+            return False
+        task_id, batch, item = task
+        try:
+            func, context = self._context(batch)
+            status, result = "done", func(context, pickle.loads(item))
+        except Exception:
+            status, result = "failed", traceback.format_exc()
+        self._db.execute(
+            "UPDATE tasks SET status = ?, result = ? "
+            "WHERE id = ? AND status = 'running'",
+            (status, pickle.dumps(result, protocol=5), task_id),
+        )
+        return True
+
+    def work(self, wait: bool = False, poll: float = 1.0) -> int:
+        """Runs tasks until none is pending.
+        Parameters
+        ----------
+        wait : bool, optional
+            Keep polling until :meth:`shutdown` is called (after this
+            worker started) instead of returning when no task is pending,
+            by default False.
+        poll : float, optional
+            Seconds between polls when waiting, by default 1.0.
+        Returns
+        -------
+        int
+            Number of tasks run.
+        """
+        n_tasks = 0
+        started = time.time()
+        while True:
+            if self.run_one():
+                n_tasks += 1
+            elif not wait or self.shut_down_since(started):
+                return n_tasks
+            else:
+                time.sleep(poll)
+
+    def results(self, batch: str, poll: float = POLL) -> Iterator[tuple]:
+        """Waits for the tasks of a batch, running pending ones meanwhile,
+        and removes the batch once every result is read.
+        Parameters
+        ----------
+        batch : str
+            Id from :meth:`submit`.
+        poll : float, optional
+            Seconds between polls while all tasks run elsewhere,
+            by default POLL.
+        Yields
+        ------
+        tuple
+            Position of the task in the batch and its result, in
+            completion order.
+        Raises
+        ------
+        TaskError
+            If a task raised, with the worker's traceback.
+        """
+        n_tasks = self._db.execute(
+            "SELECT COUNT(*) FROM tasks WHERE batch = ?", (batch,)
+        ).fetchone()[0]
+        seen = set()
+        try:
+            while len(seen) < n_tasks:
+                finished = self._db.execute(
+                    "SELECT position, status, worker, result FROM tasks "
+                    "WHERE batch = ? AND status IN ('done', 'failed')",
+                    (batch,),
+                ).fetchall()
+                new = [row for row in finished if row[0] not in seen]
+                for position, status, worker, result in new:
+                    seen.add(position)
+                    result = pickle.loads(result)
+                    if status == "failed":
+                        raise TaskError(f"Task failed on {worker}:\n{result}")
+                    yield position, result
+                if not new and not self.run_one():
+                    time.sleep(poll)
+        finally:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.execute("DELETE FROM tasks WHERE batch = ?", (batch,))
+                self._db.execute("DELETE FROM batches WHERE id = ?", (batch,))
+
+    def map(self, func: Callable, context, items: Iterable) -> Iterator[tuple]:
+        """Submits a batch and waits for its results, see :meth:`results`.
+        Parameters
+        ----------
+        func : Callable
+            Module-level function called as ``func(context, item)``.
+        context
+            Data shared by the tasks.
+        items : Iterable
+            Argument of each task.
+        Yields
+        ------
+        tuple
+            Position of the task and its result, in completion order.
+        """
+        return self.results(self.submit(func, context, items))
+
+    def shutdown(self) -> None:
+        """Tells the waiting workers to exit once no task is pending.
+        Workers started later are not affected."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO state VALUES ('shutdown', ?)",
+            (repr(time.time()),),
+        )
+
+    def shut_down_since(self, since: float) -> bool:
+        """Whether :meth:`shutdown` was called after a time.
+        Parameters
+        ----------
+        since : float
+            ``time.time()`` value.
+        Returns
+        -------
+        bool
+            True if the queue was shut down after since.
+        """
+        row = self._db.execute(
+            "SELECT value FROM state WHERE key = 'shutdown'"
+        ).fetchone()
+        return row is not None and float(row[0]) > since
+
+    def close(self) -> None:
+        """Closes the connection."""
+        self._db.close()
+
+
+def work(path: str, wait: bool = False, lease: float = LEASE) -> int:
+    """Runs a worker on the queue at path.
+    Parameters
+    ----------
+    path : str
+        SQLite file of the queue.
+    wait : bool, optional
+        Keep polling until the queue is shut down, by default False.
+    lease : float, optional
+        Lease of claimed tasks in seconds, by default LEASE.
+    Returns
+    -------
+    int
+        Number of tasks run.
+    """
+    queue = WorkQueue(path, lease)
+    try:
+        return queue.work(wait)
+    finally:
+        queue.close()
+
+
+def start_workers(path: str, n_workers: int, lease: float = LEASE) -> list:
+    """Starts local worker processes that wait for tasks until the queue is
+    shut down.
+    Parameters
+    ----------
+    path : str
+        SQLite file of the queue.
+    n_workers : int
+        Number of processes.
+    lease : float, optional
+        Lease of claimed tasks in seconds, by default LEASE.
+    Returns
+    -------
+    list[multiprocessing.Process]
+        The started processes.
+    """
+    context = get_context("spawn")
+    workers = [
+        context.Process(target=work, args=(path, True, lease), daemon=True)
+        for _ in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def run(args: Namespace, logger: Logger) -> None:
+    """Runs a worker according to given commandline arguments.
+    Parameters
+    ----------
+    args : Namespace
+        Commandline arguments from parse_args.
+    logger : Logger
+        Logs the outputs.
+    """
+    logger.info(f"Worker started on {args.queue}.")
+    n_tasks = work(args.queue, args.wait, args.lease)
+    logger.info(f"Worker ran {n_tasks} tasks.")
+
+
+if __name__ == "__main__":
+    # not imported at the top: the training run module imports this one
+    from house_pricing.logger import configure_logger
+
+    args = parse_args()
+    logger = configure_logger(
+        log_level=args.log_level,
+        console=not args.no_console_log,
+        log_file=args.log_path,
+    )
+
+    run(args, logger)
@@ -0,0 +1,109 @@
+"""
+Random housing dataframes shared by the tests and benchmarks, so they all
+build their fixtures the same way.
+"""
+import numpy as np
+import pandas as pd
+
+from house_pricing.schema import OCEAN_CATEGORIES
+
+
+def make_raw(n_rows: int, seed: int = 0, missing: float = 0.05) -> pd.DataFrame:
+    """Builds random raw housing rows with dependent counts.
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows.
+    seed : int, optional
+        Seed of the generator, by default 0.
+    missing : float, optional
+        Fraction of "total_bedrooms" left missing, by default 0.05.
+    Returns
+    -------
+    pd.DataFrame
+        Raw rows laid out like housing.csv. Labels are not rounded, so
+        they tell the rows apart.
+    """
+    rng = np.random.default_rng(seed)
+    rooms = rng.lognormal(7.8, 0.5, n_rows).round()
+    bedrooms = (rooms * rng.uniform(0.15, 0.25, n_rows)).round()
+    bedrooms[rng.random(n_rows) < missing] = np.nan
+    return pd.DataFrame(
+        {
+            "longitude": rng.uniform(-124, -114, n_rows).round(2),
+            "latitude": rng.uniform(32, 42, n_rows).round(2),
+            "housing_median_age": rng.integers(1, 52, n_rows).astype(float),
+            "total_rooms": rooms,
+            "total_bedrooms": bedrooms,
+            "population": (rooms * rng.uniform(0.5, 0.7, n_rows)).round(),
+            "households": (rooms / 5).round(),
+            "median_income": rng.gamma(4, 1, n_rows).round(4),
+            "median_house_value": rng.uniform(15000, 500001, n_rows),
+            "ocean_proximity": rng.choice(OCEAN_CATEGORIES, n_rows),
+        }
+    )
+
+
+def make_processed(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Builds random processed-like rows with a linear label.
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows.
+    seed : int, optional
+        Seed of the generator, by default 0.
+    Returns
+    -------
+    pd.DataFrame
+        Numeric features, one-hot columns summing to one and the label,
+        linear in them plus noise.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "longitude": rng.uniform(-124, -114, n_rows),
+            "total_rooms": rng.lognormal(7.8, 0.5, n_rows),
+            "median_income": rng.gamma(4, 1, n_rows),
+        }
+    )
+    codes = rng.integers(0, 3, n_rows)
+    for code, category in enumerate(OCEAN_CATEGORIES[:3]):
+        df[f"ocean_proximity_{category}"] = (codes == code).astype(float)
+    df["median_house_value"] = (
+        40000 * df["median_income"]
+        + 5 * df["total_rooms"]
+        + 20000 * codes
+        + rng.normal(0, 1000, n_rows)
+    )
+    return df
+
+
+def make_features(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Builds random unimputed features with a nonlinear label.
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows.
+    seed : int, optional
+        Seed of the generator, by default 0.
+    Returns
+    -------
+    pd.DataFrame
+        Features, 5% of "median_income" missing, and the label.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "median_income": rng.gamma(4, 1, n_rows),
+            "latitude": rng.uniform(32, 42, n_rows),
+            "ocean_proximity_INLAND": rng.integers(0, 2, n_rows).astype(float),
+        }
+    )
+    df["median_house_value"] = (
+        50000 * np.sqrt(df["median_income"])
+        + 30000 * np.sin(df["latitude"])
+        - 60000 * df["ocean_proximity_INLAND"]
+        + rng.normal(0, 5000, n_rows)
+    )
+    df.loc[rng.random(n_rows) < 0.05, "median_income"] = np.nan
+    return df
@@ -0,0 +1,67 @@
+"""
+Unit tests for the histogram gradient boosting family.
+
+Classes
+-------
+TestBoosting : unittest.TestCase
+    Tests native missing values, early stopping, the search on shared
+    unimputed features and training through ``train.main``.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from house_pricing import score, train
+from house_pricing.boosting import make_booster, search_boosting
+from house_pricing.shared_data import SharedDataset
+from sklearn.ensemble import HistGradientBoostingRegressor
+from tests.helpers import make_features
+
+
+class TestBoosting(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.df = make_features(2000)
+        self.X = self.df.drop("median_house_value", axis=1)
+        self.y = self.df["median_house_value"]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fits_missing_values_with_early_stopping(self):
+        model = make_booster(random_state=0).fit(self.X, self.y)
+        self.assertLess(model.n_iter_, model.max_iter)
+        predictions = model.predict(self.X)
+        self.assertTrue(np.all(np.isfinite(predictions)))
+        rmse = np.sqrt(np.mean((predictions - self.y) ** 2))
+        self.assertLess(rmse, 0.5 * self.y.std())
+
+    def test_search_refits_best_candidate(self):
+        grid = {"learning_rate": [0.1, 0.3], "max_leaf_nodes": [7, 15]}
+        with SharedDataset.create(self.X, self.y) as data:
+            model, search = search_boosting(data, grid, cv=3, n_jobs=2)
+        self.assertEqual(search.n_fits_, 12)
+        self.assertEqual(model.learning_rate, search.best_params_["learning_rate"])
+        # the refit bins all rows itself, like a fit on them does
+        expected = make_booster(random_state=42, **search.best_params_).fit(
+            self.X, self.y
+        )
+        np.testing.assert_array_equal(
+            model.predict(self.X), expected.predict(self.X)
+        )
+
+    def test_train_main_boosting(self):
+        path = os.path.join(self.tmp.name, "train.csv")
+        self.df.to_csv(path)
+        models = os.path.join(self.tmp.name, "models")
+        log = os.path.join(self.tmp.name, "train.log")
+        train.main(path, models, "INFO", log, False, family="boosting")
+
+        model = score.load_model(os.path.join(models, "model.pkl"))
+        self.assertIsInstance(model, HistGradientBoostingRegressor)
+        self.assertLess(score.score_model(model, score.load_data(path)), 20000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Unit tests for the download cache.
+
+Classes
+-------
+TestDataCache : unittest.TestCase
+    Tests cache hits, checksum checks and reading csv out of archives.
+"""
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+from house_pricing import data_cache
+
+
+class TestDataCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        csv_path = os.path.join(self.tmp.name, "housing.csv")
+        pd.DataFrame({"a": [1, 2], "b": [3, 4]}).to_csv(csv_path, index=False)
+        self.tgz_path = os.path.join(self.tmp.name, "housing.tgz")
+        with tarfile.open(self.tgz_path, "w:gz") as archive:
+            archive.add(csv_path, arcname="housing.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fake_download(self, url, path):
+        shutil.copy(self.tgz_path, path)
+
+    def test_second_fetch_is_a_cache_hit(self):
+        url = "https://example.com/housing.tgz"
+        with mock.patch.object(
+            data_cache.urllib.request,
+            "urlretrieve",
+            side_effect=self.fake_download,
+        ) as download:
+            first = data_cache.cached_fetch(url, self.cache_dir)
+            second = data_cache.cached_fetch(url, self.cache_dir)
+        self.assertEqual(first, second)
+        self.assertEqual(download.call_count, 1)
+        self.assertEqual(
+            os.path.basename(first), data_cache.file_sha256(self.tgz_path)
+        )
+
+    def test_checksum_mismatch_raises(self):
+        with self.assertRaises(ValueError):
+            data_cache.cached_fetch(self.tgz_path, self.cache_dir, "0" * 64)
+
+    def test_local_sources_are_used_in_place(self):
+        url = "file://" + os.path.abspath(self.tgz_path)
+        path = data_cache.cached_fetch(url, self.cache_dir)
+        self.assertEqual(path, os.path.abspath(self.tgz_path))
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_csv_is_read_from_archive(self):
+        with data_cache.open_csv_member(self.tgz_path) as file:
+            df = pd.read_csv(file)
+        self.assertEqual(df.shape, (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Unit tests for the processed dataset formats.
+
+Classes
+-------
+TestDatasetIO : unittest.TestCase
+    Round trips through the "csv" and "npy" formats of `dataset_io`.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing import dataset_io
+
+
+class TestDatasetIO(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame(
+            rng.normal(size=(50, 3)).astype(np.float32),
+            columns=["median_income", "median_house_value", "total_rooms"],
+            index=rng.permutation(50),
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_formats_read_back_the_same_frame(self):
+        frames = []
+        for fmt in dataset_io.FORMATS:
+            path = dataset_io.dataset_path(self.tmp.name, "train", fmt)
+            with dataset_io.DatasetWriter(path, fmt) as writer:
+                writer.write(self.df.iloc[:20])
+                writer.write(self.df.iloc[20:])
+            frames.append(dataset_io.read_dataset(path))
+        for frame in frames:
+            np.testing.assert_allclose(frame.to_numpy(), self.df.to_numpy())
+            self.assertEqual(list(frame.columns), list(self.df.columns))
+            self.assertEqual(list(frame.index), list(self.df.index))
+
+    def test_load_xy_memory_maps_features(self):
+        path = os.path.join(self.tmp.name, "train")
+        dataset_io.write_dataset(self.df, path, "npy")
+        X, y = dataset_io.load_xy(path)
+        features, _, _, _ = dataset_io.load_arrays(path)
+        self.assertIsInstance(features, np.memmap)
+        self.assertEqual(list(X.columns), ["median_income", "total_rooms"])
+        np.testing.assert_array_equal(y, self.df["median_house_value"])
+
+    def test_iter_dataset_chunks(self):
+        path = os.path.join(self.tmp.name, "train")
+        dataset_io.write_dataset(self.df, path, "npy")
+        chunks = list(dataset_io.iter_dataset(path, 15))
+        self.assertEqual([len(chunk) for chunk in chunks], [15, 15, 15, 5])
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks), self.df, check_index_type=False
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
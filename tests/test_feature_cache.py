@@ -0,0 +1,90 @@
+"""
+Unit tests for the feature matrix cache.
+
+Classes
+-------
+TestFeatureCache : unittest.TestCase
+    Tests that repeat reads hit the cache, that a changed file,
+    preparation or preparation code misses it, that the least recently used entries are
+    evicted, and that "npy" datasets bypass it.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing import train
+from house_pricing.dataset_io import is_npy_dataset, write_dataset
+from house_pricing.feature_cache import FeatureCache, cached_path, source_digest
+
+
+class TestFeatureCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame(
+            {
+                "a": rng.normal(size=200),
+                "b": rng.normal(size=200),
+                "median_house_value": rng.normal(size=200),
+            }
+        )
+        self.path = os.path.join(self.tmp.name, "train.csv")
+        self.df.to_csv(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit_returns_same_data(self):
+        calls = []
+
+        def prepare(path):
+            calls.append(path)
+            return pd.read_csv(path, index_col=0)
+
+        cache = FeatureCache(self.cache_dir)
+        first = cache.prepared(self.path, prepare, {"step": 1})
+        second = cache.prepared(self.path, prepare, {"step": 1})
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(is_npy_dataset(first))
+
+        data = train.load_data(self.path, self.cache_dir)
+        np.testing.assert_allclose(data, self.df, rtol=1e-6)
+        self.assertEqual(list(data.columns), list(self.df.columns))
+
+    def test_changed_file_or_config_misses(self):
+        cache = FeatureCache(self.cache_dir)
+        key = cache.key(self.path, {"step": 1})
+        self.assertNotEqual(key, cache.key(self.path, {"step": 2}))
+        self.df.iloc[:10].to_csv(self.path)
+        self.assertNotEqual(key, cache.key(self.path, {"step": 1}))
+        # configurations can follow the preparation code
+        self.assertEqual(source_digest(train.main), source_digest(train.main))
+        self.assertNotEqual(
+            source_digest(train.main), source_digest(train.load_data)
+        )
+
+    def test_evicts_least_recently_used(self):
+        cache = FeatureCache(self.cache_dir)
+        for i in range(3):
+            os.utime(cache.put(f"k{i}", self.df), (i, i))
+        cache.get("k0")
+        cache.max_bytes = sum(size for _, size, _ in cache.entries()) - 1
+        removed = cache.evict()
+        self.assertEqual(removed, [os.path.join(self.cache_dir, "k1")])
+        self.assertIsNone(cache.get("k1"))
+        self.assertIsNotNone(cache.get("k0"))
+
+    def test_npy_dataset_bypasses_cache(self):
+        npy = os.path.join(self.tmp.name, "train")
+        write_dataset(self.df, npy, "npy")
+        self.assertEqual(cached_path(npy, self.cache_dir), npy)
+        self.assertEqual(cached_path(self.path, None), self.path)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
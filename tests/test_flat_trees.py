@@ -0,0 +1,76 @@
+"""
+Unit tests for the flattened tree-ensemble predictor.
+
+Classes
+-------
+TestFlatForest : unittest.TestCase
+    Tests that flattened trees and forests predict exactly like the
+    exported models, with missing values and dataframes, that they are
+    memory-mapped by the "mmap" model format, and that other models are
+    rejected.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing.flat_trees import flatten
+from house_pricing.model_io import read_model, write_model
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+
+class TestFlatForest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(500, 4))
+        X[rng.random(X.shape) < 0.1] = np.nan
+        self.X = pd.DataFrame(X, columns=["a", "b", "c", "d"])
+        self.y = np.nansum(X, axis=1) + rng.normal(size=500)
+
+    def test_predictions_identical(self):
+        for model in (
+            DecisionTreeRegressor(random_state=0),
+            RandomForestRegressor(n_estimators=7, random_state=0),
+            RandomForestRegressor(n_estimators=3, max_depth=1, random_state=0),
+        ):
+            model.fit(self.X, self.y)
+            flat = flatten(model)
+            with self.subTest(model=model):
+                np.testing.assert_array_equal(
+                    flat.predict(self.X), model.predict(self.X)
+                )
+                np.testing.assert_array_equal(
+                    flat.predict(self.X.iloc[:1]), model.predict(self.X.iloc[:1])
+                )
+                # columns are matched by name
+                np.testing.assert_array_equal(
+                    flat.predict(self.X[self.X.columns[::-1]]),
+                    model.predict(self.X),
+                )
+
+    def test_mmap_round_trip(self):
+        model = RandomForestRegressor(n_estimators=5, random_state=0)
+        flat = flatten(model.fit(self.X, self.y))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "flat")
+            write_model(flat, path)
+            loaded = read_model(path)
+            self.assertIsInstance(loaded.children, np.memmap)
+            np.testing.assert_array_equal(
+                loaded.predict(self.X), model.predict(self.X)
+            )
+
+    def test_rejects_other_models(self):
+        with self.assertRaises(TypeError):
+            flatten(LinearRegression().fit(self.X.fillna(0), self.y))
+        with self.assertRaises(ValueError):
+            flatten(DecisionTreeRegressor().fit(self.X, self.y)).predict(
+                self.X.to_numpy()[:, :3]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
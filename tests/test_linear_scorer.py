@@ -0,0 +1,72 @@
+"""
+Unit tests for the compiled linear scorer.
+
+Classes
+-------
+TestLinearScorer : unittest.TestCase
+    Tests that batches are predicted exactly like the model into a given
+    buffer, whatever the input dtype, that dict and array rows match the
+    model, and that unsuitable models and buffers are rejected.
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing.linear_scorer import CHUNK_ROWS, compile_linear
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+
+class TestLinearScorer(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = CHUNK_ROWS + 100
+        self.X = pd.DataFrame(
+            rng.normal(size=(n, 3)).astype(np.float32),
+            columns=["a", "b", "c"],
+        )
+        y = self.X @ np.array([1.5, -2.0, 0.25]) + 3.0
+        self.model = LinearRegression().fit(self.X, y + rng.normal(size=n))
+        self.expected = self.model.predict(self.X)
+
+    def test_batch_into_buffer(self):
+        scorer = compile_linear(self.model)
+        out = np.empty(len(self.X) + 5, dtype=scorer.dtype)
+        predictions = scorer.predict(self.X.to_numpy(), out)
+        self.assertTrue(np.shares_memory(predictions, out))
+        np.testing.assert_array_equal(predictions, self.expected)
+        # rows of the other dtype are cast chunk by chunk, dataframes are
+        # matched by name
+        np.testing.assert_array_equal(
+            scorer.predict(self.X.to_numpy(np.float64), out), self.expected
+        )
+        np.testing.assert_array_equal(
+            scorer.predict(self.X[["c", "a", "b"]]), self.expected
+        )
+
+    def test_single_rows(self):
+        scorer = compile_linear(self.model)
+        row = self.X.iloc[7]
+        self.assertAlmostEqual(
+            scorer.predict_row(row.to_numpy()), self.expected[7], places=3
+        )
+        self.assertAlmostEqual(
+            scorer.predict_row({**row.to_dict(), "label": 1.0}),
+            self.expected[7],
+            places=3,
+        )
+        with self.assertRaises(KeyError):
+            scorer.predict_row({"a": 1.0, "b": 2.0})
+
+    def test_rejects_bad_inputs(self):
+        with self.assertRaises(TypeError):
+            compile_linear(DecisionTreeRegressor().fit(self.X, self.expected))
+        scorer = compile_linear(self.model)
+        with self.assertRaises(ValueError):
+            scorer.predict(self.X, np.empty(3, dtype=scorer.dtype))
+        with self.assertRaises(ValueError):
+            scorer.predict(self.X.to_numpy()[:, :2])
+
+
+if __name__ == "__main__":
+    unittest.main()
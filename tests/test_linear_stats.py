@@ -0,0 +1,81 @@
+"""
+Unit tests for the out-of-core linear regression.
+
+Classes
+-------
+TestLinearStats : unittest.TestCase
+    Tests that chunked and merged statistics solve for the in-memory
+    coefficients, and that the streamed model scores like the in-memory one.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from house_pricing import score, train
+from house_pricing.dataset_io import read_dataset, write_dataset
+from house_pricing.linear_stats import LinearStats, stream_linear_stats
+from sklearn.linear_model import LinearRegression
+from tests.helpers import make_processed
+
+
+class TestLinearStats(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.df = make_processed(3000)
+        self.X = self.df.drop("median_house_value", axis=1)
+        self.y = self.df["median_house_value"]
+        self.expected = LinearRegression().fit(self.X, self.y)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def assert_same_model(self, model, expected=None):
+        expected = expected or self.expected
+        np.testing.assert_allclose(model.coef_, expected.coef_, rtol=1e-7)
+        self.assertAlmostEqual(model.intercept_, expected.intercept_, 4)
+        self.assertEqual(model.rank_, expected.rank_)
+
+    def test_merged_chunks_match_in_memory_fit(self):
+        parts = []
+        for start in range(0, 3000, 1000):
+            stats = LinearStats(list(self.X.columns))
+            for begin in range(start, start + 1000, 300):
+                end = min(begin + 300, start + 1000)
+                stats.update(self.X[begin:end], self.y[begin:end])
+            parts.append(stats)
+        parts[0].merge(parts[1]).merge(parts[2])
+        self.assertEqual(parts[0].n_rows, 3000)
+        self.assert_same_model(parts[0].to_model())
+        np.testing.assert_allclose(
+            parts[0].gram()[1:-1, -1], self.X.T @ self.y, rtol=1e-9
+        )
+
+    def test_streams_csv_and_npy(self):
+        for fmt, path in (("csv", "train.csv"), ("npy", "train")):
+            path = os.path.join(self.tmp.name, path)
+            write_dataset(self.df, path, fmt)
+            stats = stream_linear_stats(path, chunksize=700, n_jobs=2)
+            # datasets are stored as float32, fit the stored values
+            stored = read_dataset(path).astype(np.float64)
+            expected = LinearRegression().fit(
+                stored.drop("median_house_value", axis=1),
+                stored["median_house_value"],
+            )
+            self.assert_same_model(stats.to_model(), expected)
+
+    def test_streamed_model_is_scored_unchanged(self):
+        path = os.path.join(self.tmp.name, "train.csv")
+        self.df.to_csv(path)
+        models = os.path.join(self.tmp.name, "models")
+        log = os.path.join(self.tmp.name, "train.log")
+        train.main(path, models, "INFO", log, False, chunksize=500)
+
+        model = score.load_model(os.path.join(models, "model.pkl"))
+        data = score.load_data(path)
+        expected = score.score_model(train.train_model(data), data)
+        self.assertAlmostEqual(score.score_model(model, data), expected, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Unit tests for the model storage formats.
+
+Classes
+-------
+TestModelIO : unittest.TestCase
+    Tests that every format round-trips models, that "mmap" models are
+    memory-mapped and carry their metadata, that only "flat" models store
+    forests as flattened predictors, and that scoring loads them.
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import sklearn
+from house_pricing import score, train
+from house_pricing.flat_trees import FlatForest
+from house_pricing.model_io import (
+    METADATA,
+    MODEL_FORMATS,
+    model_path,
+    read_metadata,
+    read_model,
+    write_model,
+)
+from house_pricing.search_journal import dataset_hash
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+
+
+class TestModelIO(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.X = pd.DataFrame(
+            rng.normal(size=(500, 4)), columns=["a", "b", "c", "d"]
+        )
+        self.y = self.X["a"] * 2 - self.X["c"] + rng.normal(0, 0.1, 500)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_formats_round_trip(self):
+        model = RandomForestRegressor(5, random_state=0).fit(self.X, self.y)
+        for fmt in MODEL_FORMATS:
+            path = model_path(self.tmp.name, "forest", fmt)
+            write_model(model, path, fmt)
+            loaded = read_model(path)
+            np.testing.assert_array_equal(
+                loaded.predict(self.X), model.predict(self.X)
+            )
+        with self.assertRaises(ValueError):
+            model_path(self.tmp.name, "forest", "onnx")
+
+    def test_flat_forest_is_flattened(self):
+        model = RandomForestRegressor(5, random_state=0).fit(self.X, self.y)
+        path = model_path(self.tmp.name, "forest", "mmap")
+        write_model(model, path, "mmap")
+        # "mmap" keeps the estimator
+        loaded = read_model(path)
+        self.assertIsInstance(loaded, RandomForestRegressor)
+        self.assertEqual(loaded.get_params(), model.get_params())
+
+        path = model_path(self.tmp.name, "forest", "flat")
+        write_model(model, path, "flat")
+        loaded = read_model(path)
+        self.assertIsInstance(loaded, FlatForest)
+        self.assertIsInstance(loaded.children, np.memmap)
+        np.testing.assert_array_equal(
+            loaded.predict(self.X), model.predict(self.X)
+        )
+        metadata = read_metadata(path)
+        self.assertTrue(metadata["estimator"].endswith("RandomForestRegressor"))
+        self.assertTrue(metadata["predictor"].endswith("FlatForest"))
+
+    def test_mmap_model_metadata(self):
+        model = LinearRegression().fit(self.X, self.y)
+        path = model_path(self.tmp.name, "linear", "mmap")
+        write_model(model, path, "mmap", dataset_hash(self.X, self.y))
+
+        metadata = read_metadata(path)
+        self.assertEqual(metadata["feature_names"], ["a", "b", "c", "d"])
+        self.assertEqual(metadata["data_hash"], dataset_hash(self.X, self.y))
+        self.assertEqual(metadata["sklearn_version"], sklearn.__version__)
+        self.assertIsInstance(read_model(path).coef_, np.memmap)
+
+        metadata["sklearn_version"] = "0.1"
+        with open(os.path.join(path, METADATA), "w") as file:
+            json.dump(metadata, file)
+        with self.assertWarnsRegex(UserWarning, "scikit-learn 0.1"):
+            read_model(path)
+
+    def test_scores_model_directory(self):
+        data = self.X.assign(median_house_value=self.y)
+        path = os.path.join(self.tmp.name, "train.csv")
+        data.to_csv(path)
+        models = os.path.join(self.tmp.name, "models")
+        log = os.path.join(self.tmp.name, "train.log")
+        train.main(path, models, "INFO", log, False, model_format="mmap")
+
+        model = score.load_model(os.path.join(models, "model"))
+        self.assertEqual(list(model.feature_names_in_), ["a", "b", "c", "d"])
+        self.assertLess(score.score_model(model, score.load_data(path)), 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Unit tests for the fitted housing preprocessor.
+
+Classes
+-------
+TestHousingPreprocessor : unittest.TestCase
+    Checks `HousingPreprocessor` against `ingest_data.pre_process_data`.
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing.ingest_data import pre_process_data
+from house_pricing.preprocessing import HousingPreprocessor
+
+
+class TestHousingPreprocessor(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame(
+            {
+                "median_income": [1.0, 2.0, 3.0, 4.0, 5.0],
+                "total_rooms": [100.0, 200.0, 300.0, 400.0, 500.0],
+                "households": [10.0, 20.0, 30.0, 40.0, 50.0],
+                "total_bedrooms": [8.0, np.nan, 25.0, 35.0, 45.0],
+                "population": [50.0, 100.0, 150.0, 200.0, 250.0],
+                "ocean_proximity": ["INLAND", "NEAR BAY", "INLAND", "ISLAND", "INLAND"],
+                "median_house_value": [2e5, 2.5e5, 3e5, 3.5e5, 4e5],
+            }
+        )
+
+    def test_matches_pre_process_data(self):
+        expected, _ = pre_process_data(self.df.copy())
+        result = HousingPreprocessor().fit(self.df).transform_frame(self.df)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    def test_transform_batch_without_label(self):
+        preprocessor = HousingPreprocessor().fit(self.df)
+        batch = self.df.drop("median_house_value", axis=1).iloc[[1]].copy()
+        batch["ocean_proximity"] = "NEAR OCEAN"
+        out = np.full((1, len(preprocessor.feature_names_)), -1.0)
+        result = preprocessor.transform(batch, out=out)
+
+        self.assertIs(result, out)
+        row = dict(zip(preprocessor.feature_names_, out[0]))
+        self.assertEqual(row["total_bedrooms"], 30.0)
+        self.assertEqual(row["bedrooms_per_room"], 30.0 / 200.0)
+        onehot = [v for k, v in row.items() if k.startswith("ocean_")]
+        self.assertEqual(onehot, [0.0, 0.0, 0.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Unit tests for the concurrent training of the model families.
+
+Classes
+-------
+TestScheduler : unittest.TestCase
+    Tests the cost-based split of the cores, that jobs run concurrently and
+    that the training run saves every family.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from argparse import Namespace
+
+import numpy as np
+import pandas as pd
+from house_pricing import logger as training
+from house_pricing.dataset_io import write_dataset
+from house_pricing.model_io import read_metadata
+from house_pricing.scheduler import run_concurrently, split_cores
+
+
+def nap(seconds):
+    """Job of the tests."""
+    time.sleep(seconds)
+    return seconds
+
+
+class TestScheduler(unittest.TestCase):
+    def test_split_cores_by_cost(self):
+        costs = {"linear": 1, "tree": 1, "forest": 1055, "boosting": 175}
+        self.assertEqual(
+            split_cores(costs, 16),
+            {"linear": 1, "tree": 1, "forest": 11, "boosting": 3},
+        )
+        self.assertEqual(sum(split_cores(costs, 7).values()), 7)
+        self.assertEqual(set(split_cores(costs, 2).values()), {1})
+
+    def test_jobs_run_concurrently(self):
+        jobs = {"long": (nap, 2.0), "short": (nap, 0.1)}
+        finished = list(run_concurrently(jobs))
+        # the short job does not wait behind the long one
+        self.assertEqual([name for name, _, _ in finished], ["short", "long"])
+        self.assertEqual(finished[1][1], 2.0)
+        self.assertGreaterEqual(finished[1][2], 2.0)
+
+    def test_run_saves_every_family(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(
+            rng.normal(size=(300, 9)), columns=[f"f{i}" for i in range(9)]
+        )
+        df["median_house_value"] = df["f0"] * 3 + rng.normal(0, 0.1, 300)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "train")
+            write_dataset(df, path, "npy")
+            # missing values only the boosting family can fit, in the copy
+            # it is trained on by default
+            unimputed = os.path.join(tmp, "train_unimputed")
+            features = df.columns[:-1]
+            missing = df.copy()
+            missing[features] = df[features].mask(
+                rng.random((len(df), len(features))) < 0.05
+            )
+            write_dataset(missing, unimputed, "npy")
+            args = Namespace(
+                dataset=path,
+                models=os.path.join(tmp, "models"),
+                n_jobs=2,
+                search="halving",
+                max_fits=None,
+                max_time=None,
+                warm_start=False,
+                journal=None,
+                queue=None,
+                queue_workers=0,
+                model_format="pickle",
+                cache_dir=None,
+            )
+            self.assertEqual(training.boosting_dataset_path(args), unimputed)
+            with self.assertLogs("test_scheduler", logging.INFO) as logs:
+                logger = logging.getLogger("test_scheduler")
+                logger.setLevel(logging.DEBUG)
+                training.run(args, logger)
+            names = [
+                "DecisionTreeRegressor",
+                "HistGradientBoostingRegressor",
+                "LinearRegression",
+                "RandomForestRegressor",
+            ]
+            self.assertEqual(
+                sorted(os.listdir(args.models)),
+                [name + ext for name in names for ext in (".json", ".pkl")],
+            )
+            # only boosting was trained with missing values kept
+            for name in names:
+                metadata = read_metadata(
+                    os.path.join(args.models, f"{name}.pkl")
+                )
+                self.assertEqual(
+                    metadata["imputed"], name != "HistGradientBoostingRegressor"
+                )
+            shutil.rmtree(unimputed)
+            self.assertEqual(training.boosting_dataset_path(args), path)
+        summary = logs.output[-1]
+        for family in training.FAMILIES:
+            self.assertIn(family, summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Unit tests for the shared housing schema.
+
+Classes
+-------
+TestSchema : unittest.TestCase
+    Tests compact dtypes, that unknown categories are kept with a warning
+    and the memory report of `schema`.
+"""
+import io
+import unittest
+
+from house_pricing import schema
+
+RAW_CSV = """longitude,latitude,housing_median_age,total_rooms,total_bedrooms,\
+population,households,median_income,median_house_value,ocean_proximity
+-122.23,37.88,41.0,880.0,129.0,322.0,126.0,8.3252,452600.0,NEAR BAY
+-121.97,37.64,32.0,1283.0,,1015.0,236.0,2.5,160500.0,<1H OCEAN
+-117.07,32.77,38.0,3779.0,614.0,1495.0,614.0,4.35,178800.0,INLAND
+"""
+
+
+class TestSchema(unittest.TestCase):
+    def test_raw_csv_uses_compact_dtypes(self):
+        df = schema.read_raw_csv(io.StringIO(RAW_CSV))
+        self.assertEqual(str(df["longitude"].dtype), "float32")
+        self.assertEqual(str(df["total_bedrooms"].dtype), "Int32")
+        self.assertTrue(df["total_bedrooms"].isna().iloc[1])
+        self.assertEqual(df["ocean_proximity"].dtype, schema.OCEAN_PROXIMITY)
+
+    def test_unknown_category_is_kept(self):
+        raw = RAW_CSV + "-118.0,34.0,20.0,900.0,150.0,400.0,140.0,3.1,2e5,NEW CAT\n"
+        with self.assertWarnsRegex(UserWarning, "NEW CAT"):
+            df = schema.read_raw_csv(io.StringIO(raw))
+        self.assertEqual(df["ocean_proximity"].iloc[-1], "NEW CAT")
+        self.assertEqual(
+            list(df["ocean_proximity"].cat.categories),
+            schema.OCEAN_CATEGORIES + ["NEW CAT"],
+        )
+        with self.assertWarns(UserWarning) as caught:
+            chunks = list(schema.read_raw_csv(io.StringIO(raw), chunksize=2))
+        self.assertEqual(len(caught.warnings), 1)
+        self.assertEqual(chunks[-1]["ocean_proximity"].iloc[-1], "NEW CAT")
+
+    def test_compact_frame_is_smaller_than_default(self):
+        header, rows = RAW_CSV.split("\n", 1)
+        df = schema.read_raw_csv(io.StringIO(header + "\n" + rows * 100))
+        self.assertGreater(
+            schema.default_memory_usage(df),
+            2 * df.memory_usage(deep=True).sum(),
+        )
+        self.assertIn("300 rows", schema.memory_report(df))
+
+
+if __name__ == "__main__":
+    unittest.main()
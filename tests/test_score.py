@@ -0,0 +1,119 @@
+"""
+Unit tests for the scoring script.
+
+Classes
+-------
+TestScoreStreaming : unittest.TestCase
+    Tests that scoring in chunks matches scoring in memory, writes one
+    prediction per row and predicts datasets without labels.
+TestScoreModels : unittest.TestCase
+    Tests that every model of a directory, and no other pickle, is found
+    and scored like it is on its own.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing import score
+from house_pricing.dataset_io import write_dataset
+from house_pricing.model_io import model_path, write_model
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+
+class TestScoreStreaming(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.normal(size=(1000, 3)), columns=["a", "b", "c"])
+        y = X["a"] * 2 - X["c"] + rng.normal(0, 0.5, 1000)
+        self.model = LinearRegression().fit(X, y)
+        self.data = X.assign(median_house_value=y)
+        self.path = os.path.join(self.tmp.name, "test.csv")
+        self.data.to_csv(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_in_memory_scoring(self):
+        predictions_path = os.path.join(self.tmp.name, "predictions.csv")
+        result = score.score_model_streaming(
+            self.model, self.path, 300, predictions_path
+        )
+        expected = score.score_model(self.model, score.load_data(self.path))
+        self.assertEqual(result["rows"], 1000)
+        self.assertAlmostEqual(result["rmse"], expected, 4)
+        self.assertGreater(result["rows_per_s"], 0)
+
+        predictions = pd.read_csv(predictions_path, index_col="id")
+        np.testing.assert_array_equal(predictions.index, self.data.index)
+        np.testing.assert_allclose(
+            predictions["prediction"],
+            self.model.predict(self.data.drop("median_house_value", axis=1)),
+            rtol=1e-5,
+        )
+        errors = predictions["prediction"] - self.data["median_house_value"]
+        self.assertAlmostEqual(result["mae"], errors.abs().mean(), 4)
+
+    def test_predicts_without_labels(self):
+        path = os.path.join(self.tmp.name, "unlabelled")
+        write_dataset(self.data.drop("median_house_value", axis=1), path, "npy")
+        predictions_path = os.path.join(self.tmp.name, "predictions.csv")
+        result = score.score_model_streaming(
+            self.model, path, 128, predictions_path
+        )
+        self.assertEqual(result["rows"], 1000)
+        self.assertIsNone(result["rmse"])
+        self.assertEqual(len(pd.read_csv(predictions_path)), 1000)
+
+
+class TestScoreModels(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.normal(size=(500, 3)), columns=["a", "b", "c"])
+        y = X["a"] * 2 - X["c"] + rng.normal(0, 0.5, 500)
+        self.data = X.assign(median_house_value=y)
+        self.path = os.path.join(self.tmp.name, "test.csv")
+        self.data.to_csv(self.path)
+        self.models = os.path.join(self.tmp.name, "models")
+        self.fitted = {
+            "LinearRegression": LinearRegression().fit(X, y),
+            "DecisionTreeRegressor": DecisionTreeRegressor(
+                max_depth=4, random_state=0
+            ).fit(X, y),
+        }
+        for (name, model), fmt in zip(self.fitted.items(), ("pickle", "mmap")):
+            write_model(model, model_path(self.models, name, fmt), fmt)
+        # pickles not named like a model, e.g. a preprocessor, are skipped
+        write_model(
+            X.mean(), os.path.join(self.models, "preprocessor.pkl"), "pickle"
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_scores_every_model(self):
+        score.main(
+            self.models, self.path, self.tmp.name, "INFO",
+            os.path.join(self.tmp.name, "score.log"), False, n_jobs=2,
+        )
+        table = pd.read_csv(
+            os.path.join(self.tmp.name, "scores.csv"), index_col="model"
+        )
+        self.assertEqual(
+            list(table.index), ["LinearRegression", "DecisionTreeRegressor"]
+        )
+        for name, model in self.fitted.items():
+            self.assertAlmostEqual(
+                table.loc[name, "rmse"],
+                score.score_model(model, self.data),
+                4,
+            )
+        self.assertTrue((table[["load_ms", "row_latency_ms"]] > 0).all().all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+"""
+Unit tests for the hyperparameter search of the training run.
+
+Classes
+-------
+TestBudgetedSearchCV : unittest.TestCase
+    Tests that the parallel search matches GridSearchCV, that warm-started
+    forests score like refitted ones, that journaled searches resume, that
+    halving and budgets cut the number of fits and that the random search
+    abandons weak candidates and is rejected with a queue before staging
+    any data.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from house_pricing.search import BudgetedSearchCV
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import GridSearchCV
+from scipy.stats import randint
+from sklearn.tree import DecisionTreeRegressor
+
+PARAM_GRID = [
+    {"max_depth": [2, 4, 8], "min_samples_leaf": [1, 5, 20]},
+    {"max_depth": [None], "max_features": [2, 4]},
+]
+
+
+class TestBudgetedSearchCV(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(600, 6))
+        self.y = self.X[:, 0] * 3 + np.sin(self.X[:, 1]) + rng.normal(size=600)
+        self.estimator = DecisionTreeRegressor(random_state=0)
+
+    def test_grid_matches_grid_search_cv(self):
+        expected = GridSearchCV(
+            self.estimator,
+            PARAM_GRID,
+            scoring="neg_mean_squared_error",
+            cv=5,
+            return_train_score=True,
+        ).fit(self.X, self.y)
+        search = BudgetedSearchCV(
+            self.estimator, PARAM_GRID, n_jobs=2, return_train_score=True
+        ).fit(self.X, self.y)
+
+        self.assertEqual(search.best_params_, expected.best_params_)
+        self.assertEqual(search.n_fits_, 11 * 5)
+        for key in ("mean_test_score", "mean_train_score", "rank_test_score"):
+            np.testing.assert_allclose(
+                search.cv_results_[key], expected.cv_results_[key]
+            )
+        self.assertEqual(search.cv_results_["params"], expected.cv_results_["params"])
+        np.testing.assert_array_equal(
+            search.best_estimator_.predict(self.X),
+            expected.best_estimator_.predict(self.X),
+        )
+
+    def test_halving_needs_fewer_fits(self):
+        search = BudgetedSearchCV(
+            self.estimator, PARAM_GRID, strategy="halving"
+        ).fit(self.X, self.y)
+        # 11 candidates, then 4, then 2, on growing subsamples
+        self.assertEqual(search.n_fits_, (11 + 4 + 2) * 5)
+        last = search.cv_results_["iter"] == search.cv_results_["iter"].max()
+        self.assertEqual(search.cv_results_["n_resources"][last][0], len(self.y))
+        self.assertEqual(search.cv_results_["iter"][search.best_index_], 2)
+
+    def test_warm_start_matches_refitting(self):
+        forest = RandomForestRegressor(random_state=0)
+        grid = {"n_estimators": [3, 10, 30], "max_features": [2, 4]}
+        expected = BudgetedSearchCV(forest, grid).fit(self.X, self.y)
+        search = BudgetedSearchCV(forest, grid, warm_start=True).fit(
+            self.X, self.y
+        )
+        self.assertEqual(search.n_fits_, expected.n_fits_)
+        self.assertEqual(search.cv_results_["params"], expected.cv_results_["params"])
+        np.testing.assert_allclose(
+            search.cv_results_["mean_test_score"],
+            expected.cv_results_["mean_test_score"],
+        )
+        self.assertEqual(search.best_params_, expected.best_params_)
+        self.assertFalse(search.best_estimator_.warm_start)
+
+    def test_resumed_search_matches_uninterrupted(self):
+        with tempfile.TemporaryDirectory() as journal:
+            expected = BudgetedSearchCV(self.estimator, PARAM_GRID).fit(
+                self.X, self.y
+            )
+            # first run interrupted after 4 candidates
+            BudgetedSearchCV(
+                self.estimator, PARAM_GRID, max_fits=20, journal=journal
+            ).fit(self.X, self.y)
+            (path,) = [os.path.join(journal, f) for f in os.listdir(journal)]
+            with open(path, "a") as file:
+                file.write('{"task": "half written')
+
+            search = BudgetedSearchCV(self.estimator, PARAM_GRID, journal=journal)
+            search.fit(self.X, self.y)
+            self.assertEqual(search.n_resumed_, 20)
+            self.assertEqual(search.n_fits_, 11 * 5 - 20)
+            np.testing.assert_array_equal(
+                search.cv_results_["mean_test_score"],
+                expected.cv_results_["mean_test_score"],
+            )
+            np.testing.assert_array_equal(
+                search.best_estimator_.predict(self.X),
+                expected.best_estimator_.predict(self.X),
+            )
+            # the partial line was cut off, so no result of the resumed run
+            # was appended to it and lost
+            search = BudgetedSearchCV(self.estimator, PARAM_GRID, journal=journal)
+            search.fit(self.X, self.y)
+            self.assertEqual(search.n_resumed_, 11 * 5)
+
+            # other data gets its own journal
+            BudgetedSearchCV(self.estimator, PARAM_GRID, journal=journal).fit(
+                self.X[:300], self.y[:300]
+            )
+            self.assertEqual(len(os.listdir(journal)), 2)
+
+    def test_fit_budget_stops_search(self):
+        search = BudgetedSearchCV(self.estimator, PARAM_GRID, max_fits=23)
+        search.fit(self.X, self.y)
+        self.assertEqual(search.n_fits_, 20)
+        self.assertTrue(search.budget_exhausted_)
+        scored = ~np.isnan(search.cv_results_["mean_test_score"])
+        self.assertEqual(scored.sum(), 4)
+        self.assertTrue(scored[search.best_index_])
+
+    def test_exhausted_time_budget_raises(self):
+        search = BudgetedSearchCV(self.estimator, PARAM_GRID, max_time=0)
+        with self.assertRaises(RuntimeError):
+            search.fit(self.X, self.y)
+
+    def test_random_search_aborts_weak_candidates(self):
+        full = BudgetedSearchCV(
+            self.estimator, PARAM_GRID, strategy="random", abort_margin=None
+        ).fit(self.X, self.y)
+        self.assertEqual(full.n_fits_, 11 * 5)
+        self.assertEqual(full.n_aborted_, 0)
+
+        search = BudgetedSearchCV(
+            self.estimator, PARAM_GRID, strategy="random", n_jobs=2
+        ).fit(self.X, self.y)
+        self.assertEqual(search.best_params_, full.best_params_)
+        self.assertGreater(search.n_aborted_, 0)
+        self.assertEqual(search.n_fits_ + search.n_fits_avoided_, 11 * 5)
+        aborted = search.cv_results_["aborted"]
+        self.assertEqual(aborted.sum(), search.n_aborted_)
+        mean = search.cv_results_["mean_test_score"]
+        self.assertTrue(np.isnan(mean[aborted]).all())
+
+    def test_random_search_samples_until_budget(self):
+        distributions = {
+            "max_depth": randint(1, 20),
+            "min_samples_leaf": randint(1, 50),
+        }
+        search = BudgetedSearchCV(
+            self.estimator, distributions, strategy="random", max_fits=60
+        ).fit(self.X, self.y)
+        self.assertEqual(search.n_fits_, 60)
+        self.assertTrue(search.budget_exhausted_)
+        self.assertGreater(len(search.cv_results_["params"]), 60 // 5)
+        with self.assertRaises(ValueError):
+            BudgetedSearchCV(
+                self.estimator, distributions, strategy="random"
+            ).fit(self.X, self.y)
+
+    def test_rejected_random_queue_leaves_nothing_behind(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            search = BudgetedSearchCV(
+                self.estimator,
+                PARAM_GRID,
+                strategy="random",
+                queue=os.path.join(tmp, "queue.sqlite"),
+            )
+            with self.assertRaises(ValueError):
+                search.fit(self.X, self.y)
+            self.assertEqual(os.listdir(tmp), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
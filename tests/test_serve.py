@@ -0,0 +1,151 @@
+"""
+Unit tests for the prediction service.
+
+Classes
+-------
+TestMicroBatcher : unittest.TestCase
+    Tests that concurrent requests are predicted in shared batches and
+    that a faulty request only fails itself.
+TestPredictionServer : unittest.TestCase
+    Tests that the service predicts raw JSON rows like the model does on
+    preprocessed data without touching the warning filters, keeps missing
+    values for models trained without imputation, rejects unknown models
+    and malformed bodies, and answers failed predictions.
+"""
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+from house_pricing.model_io import write_model
+from house_pricing.preprocessing import HousingPreprocessor, save_preprocessor
+from house_pricing.serve import (
+    MicroBatcher,
+    PredictionServer,
+    Predictor,
+    load_predictors,
+)
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import LinearRegression
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_coalesces_concurrent_requests(self):
+        def predict(rows):
+            time.sleep(0.01)
+            return np.array([row["x"] * 2.0 for row in rows])
+
+        batcher = MicroBatcher(predict, window=0.005)
+        futures = [batcher.submit([{"x": i}, {"x": -i}]) for i in range(20)]
+        for i, future in enumerate(futures):
+            np.testing.assert_array_equal(future.result(), [2 * i, -2 * i])
+        batcher.close()
+        self.assertEqual(batcher.n_requests, 20)
+        self.assertLess(batcher.n_batches, 20)
+
+    def test_faulty_request_fails_alone(self):
+        batcher = MicroBatcher(
+            lambda rows: np.array([float(row["x"]) for row in rows]),
+            window=0.005,
+        )
+        good, bad = batcher.submit([{"x": 1}]), batcher.submit([{"x": "a"}])
+        self.assertEqual(good.result().tolist(), [1.0])
+        self.assertIsInstance(bad.exception(), ValueError)
+        batcher.close()
+
+
+class TestPredictionServer(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 300
+        raw = pd.DataFrame(
+            {
+                "total_rooms": rng.uniform(100, 5000, n),
+                "total_bedrooms": rng.uniform(20, 1000, n),
+                "population": rng.uniform(100, 3000, n),
+                "households": rng.uniform(50, 1000, n),
+                "median_income": rng.uniform(1, 10, n),
+                "median_house_value": rng.uniform(5e4, 5e5, n),
+                "ocean_proximity": rng.choice(["INLAND", "NEAR BAY"], n),
+            }
+        )
+        raw.loc[::7, "total_bedrooms"] = np.nan
+        self.raw = raw
+        self.preprocessor = preprocessor = HousingPreprocessor().fit(raw)
+        data = preprocessor.transform_frame(raw)
+        X = data.drop("median_house_value", axis=1)
+        model = LinearRegression().fit(X, data["median_house_value"])
+        self.expected = model.predict(X)
+        self.rows = json.loads(raw.to_json(orient="records"))
+
+        def broken(rows):
+            raise RuntimeError("model failed")
+
+        self.filters = list(warnings.filters)
+        self.server = PredictionServer(
+            ("127.0.0.1", 0),
+            {"linear": Predictor(model, preprocessor), "broken": broken},
+        )
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = http.client.HTTPConnection(
+            "127.0.0.1", self.server.server_port
+        )
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, path, body):
+        self.connection.request("POST", path, json.dumps(body))
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_predicts_raw_rows(self):
+        status, content = self.post("/predict", {"rows": self.rows})
+        self.assertEqual(status, 200)
+        np.testing.assert_allclose(content["predictions"], self.expected)
+
+        status, content = self.post("/predict/linear", self.rows[7])
+        self.assertEqual(status, 200)
+        np.testing.assert_allclose(content["predictions"], self.expected[7:8])
+        self.assertEqual(warnings.filters, self.filters)
+
+    def test_unimputed_model_is_served_unimputed(self):
+        data = self.preprocessor.transform_frame(self.raw, impute=False)
+        X = data.drop("median_house_value", axis=1)
+        model = HistGradientBoostingRegressor(max_iter=20).fit(
+            X, data["median_house_value"]
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            preprocessor_path = os.path.join(tmp, "preprocessor.pkl")
+            save_preprocessor(self.preprocessor, preprocessor_path)
+            path = os.path.join(tmp, "HistGradientBoostingRegressor.pkl")
+            write_model(model, path, "pickle", imputed=False)
+            predictors = load_predictors([path], preprocessor_path)
+        predictor = predictors["HistGradientBoostingRegressor"]
+        self.assertFalse(predictor.impute)
+        np.testing.assert_array_equal(predictor(self.rows), model.predict(X))
+
+    def test_rejects_bad_requests(self):
+        status, _ = self.post("/predict/forest", self.rows[0])
+        self.assertEqual(status, 404)
+        status, _ = self.post("/predict", [1, 2])
+        self.assertEqual(status, 400)
+        status, content = self.post("/predict/broken", self.rows[0])
+        self.assertEqual(status, 500)
+        self.assertIn("model failed", content["error"])
+        # the connection is still usable after errors
+        status, content = self.post("/predict", self.rows[:2])
+        self.assertEqual(status, 200)
+        self.assertEqual(len(content["predictions"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
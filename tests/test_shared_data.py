@@ -0,0 +1,83 @@
+"""
+Unit tests for the dataset handle shared by search workers.
+
+Classes
+-------
+TestSharedDataset : unittest.TestCase
+    Tests that the handle pickles without data, maps npy datasets in place,
+    streams csv datasets into a copy it owns and gives the same search
+    results as in-memory arrays.
+"""
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing.dataset_io import FEATURES_FILE, write_dataset
+from house_pricing.search import BudgetedSearchCV
+from house_pricing.shared_data import SharedDataset
+from sklearn.tree import DecisionTreeRegressor
+
+
+class TestSharedDataset(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame(
+            rng.normal(size=(500, 4)).astype(np.float32),
+            columns=["a", "b", "c", "median_house_value"],
+        )
+        self.X = self.df.drop("median_house_value", axis=1)
+        self.y = self.df["median_house_value"]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pickles_file_names_only(self):
+        with SharedDataset.create(self.X, self.y) as data:
+            data.X  # mapped arrays are not pickled either
+            payload = pickle.dumps(data)
+            self.assertLess(len(payload), 1000)
+            copy = pickle.loads(payload)
+            pd.testing.assert_frame_equal(copy.X, self.X)
+            np.testing.assert_array_equal(copy.y, self.y)
+            directory = data.directory
+        self.assertFalse(os.path.exists(directory))
+
+    def test_maps_npy_dataset_in_place(self):
+        path = os.path.join(self.tmp.name, "train")
+        write_dataset(self.df, path, "npy")
+        with SharedDataset.from_xy(self.X, self.y, path) as data:
+            self.assertIsNone(data.directory)
+            self.assertEqual(data.arrays["X"][0], os.path.join(path, FEATURES_FILE))
+            pd.testing.assert_frame_equal(data.X, self.X)
+            np.testing.assert_array_equal(data.y, self.y)
+        self.assertTrue(os.path.exists(path))
+
+    def test_streams_csv_dataset(self):
+        path = os.path.join(self.tmp.name, "train.csv")
+        write_dataset(self.df, path)
+        with SharedDataset.from_dataset(path, chunksize=64) as data:
+            pd.testing.assert_frame_equal(data.X, self.X, check_index_type=False)
+            np.testing.assert_array_equal(data.y, self.y)
+            directory = data.directory
+        self.assertFalse(os.path.exists(directory))
+
+    def test_search_on_shared_data(self):
+        grid = {"max_depth": [2, 4, 8]}
+        expected = BudgetedSearchCV(DecisionTreeRegressor(random_state=0), grid)
+        expected.fit(self.X, self.y)
+        with SharedDataset.create(self.X, self.y) as data:
+            search = BudgetedSearchCV(
+                DecisionTreeRegressor(random_state=0), grid, n_jobs=2
+            ).fit(data)
+        np.testing.assert_allclose(
+            search.cv_results_["mean_test_score"],
+            expected.cv_results_["mean_test_score"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Unit tests for the index-based stratified splits of `ingest_data`.
+
+Classes
+-------
+TestStratifiedSplitIndices : unittest.TestCase
+    Tests determinism, stratification and that inputs are not modified.
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing import ingest_data
+
+
+class TestStratifiedSplitIndices(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame(
+            {
+                "median_income": rng.gamma(4, 1, 1000),
+                "median_house_value": rng.uniform(1e4, 5e5, 1000),
+            }
+        )
+
+    def test_splits_are_deterministic_and_distinct(self):
+        splits = ingest_data.stratified_split_indices(
+            self.df["median_income"], n_splits=8
+        )
+        parallel = ingest_data.stratified_split_indices(
+            self.df["median_income"], n_splits=8, n_jobs=2
+        )
+        for (train, test), (train_2, test_2) in zip(splits, parallel):
+            np.testing.assert_array_equal(train, train_2)
+            np.testing.assert_array_equal(test, test_2)
+            self.assertEqual(len(test), 200)
+            self.assertEqual(len(np.union1d(train, test)), len(self.df))
+        self.assertFalse(np.array_equal(splits[0][1], splits[1][1]))
+
+    def test_split_preserves_strata_and_input(self):
+        before = self.df.copy()
+        train, test = ingest_data.stratified_shuffle_split(self.df)
+        pd.testing.assert_frame_equal(self.df, before)
+
+        strata = ingest_data.income_strata(self.df["median_income"])
+        test_strata = ingest_data.income_strata(test["median_income"])
+        np.testing.assert_allclose(
+            np.bincount(test_strata, minlength=6) / len(test),
+            np.bincount(strata, minlength=6) / len(strata),
+            atol=0.01,
+        )
+        self.assertNotIn("income_cat", train.columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+"""
+Unit tests for the streaming ingest mode.
+
+Classes
+-------
+TestQuantileSketch : unittest.TestCase
+    Tests the mergeable quantile sketch used for median imputation.
+TestStreamingIngest : unittest.TestCase
+    Tests the chunked split and preprocessing of `ingest_data`, imputed
+    and with missing values kept.
+TestIncrementalIngest : unittest.TestCase
+    Tests that incremental ingest only adds the delta of a new drop, keeps
+    every row in its split when refitting, tracks duplicated rows one by
+    one and forgets removed rows in its sketches.
+"""
+import logging
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing import dataset_io, ingest_data
+from house_pricing.ingest_manifest import IngestManifest
+from house_pricing.sketch import QuantileSketch
+from tests.helpers import make_raw
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def test_exact_on_small_input(self):
+        sketch = QuantileSketch().update([4.0, np.nan, 1.0, 3.0, 2.0])
+        self.assertEqual(sketch.median(), 2.5)
+
+    def test_merged_median_is_close(self):
+        values = np.random.default_rng(1).normal(size=200_000)
+        sketch = QuantileSketch(k=512).update(values[:100_000])
+        sketch.merge(QuantileSketch(k=512).update(values[100_000:]))
+        rank = (values < sketch.median()).mean()
+        self.assertAlmostEqual(rank, 0.5, delta=0.01)
+        self.assertEqual(sketch.n, values.size)
+
+
+class TestStreamingIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp.name, "housing.csv")
+        self.df = make_raw(2000)
+        self.df.to_csv(self.csv_path, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_split_is_stratified_and_complete(self):
+        parts = list(ingest_data.stream_stratified_split(self.csv_path, 300))
+        train = pd.concat([train for train, _ in parts])
+        test = pd.concat([test for _, test in parts])
+        self.assertEqual(len(train) + len(test), len(self.df))
+        self.assertAlmostEqual(len(test) / len(self.df), 0.2, delta=0.005)
+        self.assertTrue(train.index.intersection(test.index).empty)
+
+    def test_streaming_matches_in_memory_layout(self):
+        processed = os.path.join(self.tmp.name, "processed")
+        ingest_data.run_streaming(
+            self.csv_path,
+            processed,
+            300,
+            logging.getLogger(__name__),
+            unimputed=True,
+        )
+        train = pd.read_csv(
+            os.path.join(processed, "housing_train.csv"), index_col=0
+        )
+        expected, _ = ingest_data.pre_process_data(self.df.copy())
+        self.assertEqual(list(train.columns), list(expected.columns))
+        self.assertFalse(train.isna().any().any())
+
+        # the unimputed copy keeps the missing bedrooms, and only them
+        unimputed = pd.read_csv(
+            os.path.join(processed, "housing_train_unimputed.csv"), index_col=0
+        )
+        missing = unimputed.isna()
+        self.assertEqual(
+            set(missing.columns[missing.any()]),
+            {"total_bedrooms", "bedrooms_per_room"},
+        )
+        pd.testing.assert_frame_equal(unimputed[~missing], train[~missing])
+
+        # it is opt-in, and a later ingest without it removes the stale copy
+        ingest_data.run_streaming(
+            self.csv_path, processed, 300, logging.getLogger(__name__)
+        )
+        self.assertEqual(
+            sorted(os.listdir(processed)),
+            ["housing_test.csv", "housing_train.csv", "preprocessor.pkl"],
+        )
+
+
+class TestIncrementalIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.processed = os.path.join(self.tmp.name, "processed")
+        self.logger = logging.getLogger(__name__)
+        self.df = make_raw(1200)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ingest(self, df, **kwargs):
+        csv_path = os.path.join(self.tmp.name, "housing.csv")
+        df.to_csv(csv_path, index=False)
+        ingest_data.run_incremental(
+            csv_path, self.processed, self.logger, "npy", **kwargs
+        )
+        return [
+            dataset_io.read_dataset(
+                dataset_io.dataset_path(self.processed, f"housing_{split}", "npy")
+            )
+            for split in ("train", "test")
+        ]
+
+    def test_new_drop_appends_delta_only(self):
+        train, test = self.ingest(self.df.iloc[:1000], unimputed=True)
+        drop = pd.concat([self.df.iloc[5:1000], self.df.iloc[1000:]])
+        new_train, new_test = self.ingest(drop, unimputed=True)
+
+        self.assertEqual(len(new_train) + len(new_test), len(drop))
+        # rows that were kept are neither moved nor reprocessed
+        kept = train.index.difference(self.df.index[:5])
+        pd.testing.assert_frame_equal(
+            new_train.loc[kept], train.loc[kept], check_index_type=False
+        )
+        manifest = IngestManifest.load(self.processed)
+        self.assertEqual(len(manifest.fingerprints["train"]), len(new_train))
+        # the removed train rows are gone from the sketches too
+        self.assertEqual(manifest.sketches["median_income"].n, len(new_train))
+        unimputed = dataset_io.read_dataset(
+            dataset_io.dataset_path(
+                self.processed, "housing_train_unimputed", "npy"
+            )
+        )
+        np.testing.assert_array_equal(unimputed.index, new_train.index)
+
+    def test_refit_keeps_splits(self):
+        # labels are unique, so they identify the rows
+        train, test = self.ingest(self.df.iloc[:1000])
+        drop = self.df.iloc[5:]
+        # any drift at all forces a refit
+        new_train, new_test = self.ingest(drop, refit_threshold=-1.0)
+
+        self.assertEqual(len(new_train) + len(new_test), len(drop))
+        before = {
+            split: set(frame["median_house_value"])
+            for split, frame in (("train", train), ("test", test))
+        }
+        after = {
+            split: set(frame["median_house_value"])
+            for split, frame in (("train", new_train), ("test", new_test))
+        }
+        self.assertFalse(before["train"] & after["test"])
+        self.assertFalse(before["test"] & after["train"])
+        kept = len(before["train"] & after["train"]) + len(
+            before["test"] & after["test"]
+        )
+        self.assertEqual(kept, 995)
+        manifest = IngestManifest.load(self.processed)
+        self.assertEqual(manifest.state["next_index"], len(drop))
+        self.assertEqual(len(manifest.fingerprints["test"]), len(new_test))
+
+    def test_duplicated_rows_are_tracked(self):
+        df = pd.concat([self.df.iloc[:1000], self.df.iloc[[3, 3, 7]]])
+        train, test = self.ingest(df)
+        self.assertEqual(len(train) + len(test), len(df))
+        manifest = IngestManifest.load(self.processed)
+        keys = np.concatenate(list(manifest.fingerprints.values()))
+        self.assertEqual(len(np.unique(keys)), len(df))
+
+        # one copy of row 3 less, one more of row 7
+        drop = pd.concat([self.df.iloc[:1000], self.df.iloc[[3, 7, 7]]])
+        new_train, new_test = self.ingest(drop)
+        self.assertEqual(len(new_train) + len(new_test), len(drop))
+        counts = pd.concat([new_train, new_test])["median_house_value"]
+        counts = counts.value_counts()
+        self.assertEqual(counts[self.df["median_house_value"].iloc[3]], 2)
+        self.assertEqual(counts[self.df["median_house_value"].iloc[7]], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
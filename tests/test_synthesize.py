@@ -0,0 +1,65 @@
+"""
+Unit tests for the synthetic housing data generator.
+
+Classes
+-------
+TestSynthesize : unittest.TestCase
+    Tests that generated rows follow the learned distribution, are
+    reproducible and can be ingested like the real data.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from house_pricing import ingest_data, synthesize
+from house_pricing.schema import read_raw_csv
+from tests.helpers import make_raw
+
+
+class TestSynthesize(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.real = make_raw(3000)
+        self.model = synthesize.learn_distribution(self.real)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_follows_learned_distribution(self):
+        df = pd.concat(synthesize.generate(self.model, 20_000, 5000))
+        self.assertEqual(list(df.columns), list(self.real.columns))
+        self.assertEqual(list(df.index), list(range(20_000)))
+        real_median = self.real["median_income"].median()
+        self.assertAlmostEqual(
+            df["median_income"].median(), real_median, delta=0.05 * real_median
+        )
+        self.assertAlmostEqual(
+            df["total_bedrooms"].isna().mean(),
+            self.real["total_bedrooms"].isna().mean(),
+            delta=0.01,
+        )
+        # strongly dependent columns stay dependent
+        corr = df[["total_rooms", "population"]].astype(float).corr().iloc[0, 1]
+        self.assertGreater(corr, 0.9)
+
+    def test_output_does_not_depend_on_n_jobs(self):
+        serial = pd.concat(synthesize.generate(self.model, 3000, 1000, n_jobs=1))
+        parallel = pd.concat(synthesize.generate(self.model, 3000, 1000, n_jobs=2))
+        pd.testing.assert_frame_equal(serial, parallel)
+
+    def test_csv_is_ingested_unchanged(self):
+        path = os.path.join(self.tmp.name, "synthetic.csv")
+        chunks = synthesize.generate(self.model, 2000, 600)
+        self.assertEqual(synthesize.write_raw_csv(chunks, path), 2000)
+
+        df = read_raw_csv(path)
+        self.assertEqual(len(df), 2000)
+        train, test = ingest_data.stratified_shuffle_split(df)
+        self.assertEqual(len(train) + len(test), 2000)
+        self.assertFalse(np.isnan(df["median_income"].to_numpy()).any())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+Unit tests for the SQLite work queue and the search running on it.
+
+Classes
+-------
+TestWorkQueue : unittest.TestCase
+    Tests that worker processes share a batch, that abandoned tasks are
+    claimed again, that task errors reach the coordinator, that a search
+    through the queue gives the results of a local one and that its
+    workers find the data beside the queue file.
+"""
+import os
+import tempfile
+import unittest
+from multiprocessing import get_context
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from house_pricing.search import BudgetedSearchCV
+from house_pricing.shared_data import SharedDataset
+from house_pricing.work_queue import TaskError, WorkQueue, start_workers, work
+from sklearn.tree import DecisionTreeRegressor
+
+
+def scale(context, item):
+    """Task of the tests: item times the context."""
+    if item < 0:
+        raise ValueError("negative item")
+    return context * item
+
+
+def work_from(directory, path):
+    """Worker of the tests: runs the pending tasks from another directory."""
+    os.chdir(directory)
+    return work(path)
+
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "queue.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_workers_share_a_batch(self):
+        queue = WorkQueue(self.path)
+        batch = queue.submit(scale, 3, range(40))
+        with get_context("spawn").Pool(3) as pool:
+            counts = pool.map(work, [self.path] * 3)
+        self.assertEqual(sum(counts), 40)
+        results = dict(queue.results(batch))
+        self.assertEqual(results, {i: 3 * i for i in range(40)})
+        # read batches are removed
+        self.assertEqual(queue.work(), 0)
+        queue.close()
+
+    def test_abandoned_task_is_claimed_again(self):
+        dead = WorkQueue(self.path)
+        batch = dead.submit(scale, 2, [5])
+        self.assertIsNotNone(dead._claim())
+        dead.close()
+
+        queue = WorkQueue(self.path)
+        self.assertFalse(queue.run_one())
+        queue.lease = 0.0
+        self.assertEqual(list(queue.results(batch)), [(0, 10)])
+        queue.close()
+
+    def test_task_error_reaches_coordinator(self):
+        queue = WorkQueue(self.path)
+        with self.assertRaisesRegex(TaskError, "negative item"):
+            list(queue.map(scale, 1, [1, -1]))
+        queue.close()
+
+    def test_search_through_queue(self):
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.normal(size=(400, 3)), columns=["a", "b", "c"])
+        y = X["a"] * 2 + np.sin(X["b"]) + rng.normal(0, 0.1, 400)
+        grid = {"max_depth": [2, 4, 8], "min_samples_leaf": [1, 5]}
+        expected = BudgetedSearchCV(DecisionTreeRegressor(random_state=0), grid)
+        expected.fit(X, y)
+
+        workers = start_workers(self.path, 2)
+        search = BudgetedSearchCV(
+            DecisionTreeRegressor(random_state=0), grid, queue=self.path
+        ).fit(X, y)
+        queue = WorkQueue(self.path)
+        queue.shutdown()
+        queue.close()
+        for worker in workers:
+            worker.join(60)
+            self.assertEqual(worker.exitcode, 0)
+
+        self.assertEqual(search.n_fits_, 30)
+        np.testing.assert_allclose(
+            search.cv_results_["mean_test_score"],
+            expected.cv_results_["mean_test_score"],
+        )
+        self.assertEqual(search.best_params_, expected.best_params_)
+        # the data copied for the workers is removed
+        self.assertEqual(os.listdir(self.tmp.name), ["queue.sqlite"])
+
+    def test_workers_map_data_beside_queue(self):
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.normal(size=(300, 3)), columns=["a", "b", "c"])
+        y = X["a"] * 2 + rng.normal(0, 0.1, 300)
+        grid = {"max_depth": [2, 4]}
+        expected = BudgetedSearchCV(DecisionTreeRegressor(random_state=0), grid)
+        expected.fit(X, y)
+
+        local = tempfile.mkdtemp()
+        hidden = local + "_hidden"
+        data = SharedDataset.create(X, y, local)
+        submit = WorkQueue.submit
+        n_tasks = []
+
+        def submit_and_work(queue, func, context, items):
+            batch = submit(queue, func, context, items)
+            # data local to the coordinator's host is out of the workers'
+            # reach, as is its working directory
+            os.rename(local, hidden)
+            try:
+                with get_context("spawn").Pool(1) as pool:
+                    n_tasks.append(
+                        pool.apply(work_from, (self.tmp.name, self.path))
+                    )
+            finally:
+                os.rename(hidden, local)
+            return batch
+
+        with data, mock.patch.object(WorkQueue, "submit", submit_and_work):
+            search = BudgetedSearchCV(
+                DecisionTreeRegressor(random_state=0), grid, queue=self.path
+            ).fit(data)
+        self.assertEqual(sum(n_tasks), search.n_fits_)
+        np.testing.assert_allclose(
+            search.cv_results_["mean_test_score"],
+            expected.cv_results_["mean_test_score"],
+        )
+        self.assertEqual(os.listdir(self.tmp.name), ["queue.sqlite"])
+
+
+if __name__ == "__main__":
+    unittest.main()